@@ -0,0 +1,353 @@
+import click
+import collections
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+import numpy
+
+from pvsimulator import filewriter
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.simulations import configuration
+from pvsimulator.simulations import meter
+from pvsimulator.simulations import photovoltaic
+from pvsimulator.transports import memory
+from pvsimulator.transports import InMemoryBroker, InMemoryTransport
+
+# The stored baseline, to which the results are compared by default
+BASELINE_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A point in time at noon of the first simulated day
+NOON = 1247140800
+
+QUEUE_NAME = 'benchmark'
+
+
+def measure_call(function, minimum_seconds = 0.2, repeat = 5):
+    '''
+    Measures the time of one call of the function.
+    The calls are timed in loops of at least minimum_seconds and the fastest loop is used,
+    since slower loops are disturbed by other processes.
+
+    Returns:
+        The seconds per call.
+    '''
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(number, int(number * minimum_seconds / 0.2))
+    return min(timer.repeat(repeat = repeat, number = number)) / number
+
+def run_micro_benchmarks(quick = False):
+    '''
+    Measures the functions, that are called once per message.
+
+    Returns:
+        A dictionary of results, see result.
+    '''
+    minimum_seconds = 0.05 if quick else 0.2
+    results = {}
+    results['micro.get_normalized_meter_value'] = result(
+        measure_call(lambda: meter.get_normalized_meter_value(0.5), minimum_seconds) * 1e9, 'ns', False
+    )
+    results['micro.get_normalized_pv_value'] = result(
+        measure_call(lambda: photovoltaic.get_normalized_pv_value(0.5), minimum_seconds) * 1e9, 'ns', False
+    )
+    results['micro.construct_message_at_time'] = result(
+        measure_call(lambda: meter.construct_message_at_time(NOON, seed = 1), minimum_seconds) * 1e9, 'ns', False
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, 'output.csv')
+        row = [NOON, 1805.0, 5252.075, 7057.075]
+        results['micro.file_append'] = result(
+            measure_call(lambda: filewriter.file_append(filepath, row), minimum_seconds) * 1e9, 'ns', False
+        )
+    return results
+
+class CountingConsumer(QueueClient):
+    """
+    Counts the consumed messages and stops at the stop message.
+    """
+    consumed_count = 0
+
+    def _on_message_received_callback(self, message_body):
+        if message_body == "STOP_SIMULATION":
+            self.stop_consuming()
+            return
+        self.consumed_count += 1
+
+    def _on_message_batch_received_callback(self, message_bodies, delivery_tags):
+        stop_requested = "STOP_SIMULATION" in message_bodies
+        self.consumed_count += len(message_bodies) - stop_requested
+        self._settle_batch(delivery_tags, len(message_bodies))
+        if stop_requested:
+            self.stop_consuming()
+
+def run_component_benchmarks(quick = False):
+    '''
+    Measures the publish and consume throughput of the QueueClient on the in-process broker,
+    which stands in for RabbitMQ, so the overhead of the client itself is measured.
+
+    Returns:
+        A dictionary of results, see result.
+    '''
+    message_count = 20000 if quick else 100000
+    timestamps, meter_power_values = meter.generate_meter_range(NOON, NOON + message_count, 1, seed = 1)
+    message_bodies = meter.construct_messages(timestamps, meter_power_values)
+    results = {}
+
+    broker = InMemoryBroker()
+    publisher = QueueClient(queue_name = QUEUE_NAME, transport = InMemoryTransport(broker))
+    publisher.connect()
+    start_time = time.perf_counter()
+    for message_body in message_bodies:
+        publisher.publish_message(message_body)
+    results['component.publish_message'] = result(
+        message_count / (time.perf_counter() - start_time), 'msg/s', True
+    )
+
+    publisher.purge_queue()
+    start_time = time.perf_counter()
+    for batch_start in range(0, message_count, 1000):
+        publisher.publish_batch(message_bodies[batch_start:batch_start + 1000])
+    results['component.publish_batch'] = result(
+        message_count / (time.perf_counter() - start_time), 'msg/s', True
+    )
+
+    for consuming_mode, batch_size in (('poll', 1), ('push', 1), ('push', 100)):
+        publisher.purge_queue()
+        publisher.publish_batch(message_bodies)
+        publisher.publish_message("STOP_SIMULATION")
+        consumer = CountingConsumer(
+            queue_name = QUEUE_NAME,
+            consuming_timeout = 0,
+            consuming_mode = consuming_mode,
+            consuming_batch_size = batch_size,
+            transport = InMemoryTransport(broker)
+        )
+        consumer.connect()
+        start_time = time.perf_counter()
+        consumer.start_consuming_blocking()
+        name = 'component.consume_' + consuming_mode + ('_batch' if batch_size > 1 else '')
+        results[name] = result(
+            consumer.consumed_count / (time.perf_counter() - start_time), 'msg/s', True
+        )
+    return results
+
+class TimingBroker(InMemoryBroker):
+    """
+    Records the time, at which each message was put into a queue.
+    """
+    def __init__(self):
+        super().__init__()
+        self.put_times = collections.deque()
+
+    def put(self, queue_name, messages):
+        put_time = time.perf_counter()
+        self.put_times.extend([put_time] * len(messages))
+        super().put(queue_name, messages)
+
+class TimingPVSimulator(photovoltaic.PV_Simulator):
+    """
+    Records the time, at which each message was processed.
+    """
+    processed_times = None
+
+    def _on_message_received_callback(self, message_body):
+        super()._on_message_received_callback(message_body)
+        if message_body != "STOP_SIMULATION":
+            self.processed_times.append(time.perf_counter())
+
+    def _on_message_batch_received_callback(self, message_bodies, delivery_tags):
+        super()._on_message_batch_received_callback(message_bodies, delivery_tags)
+        processed_count = len(message_bodies) - ("STOP_SIMULATION" in message_bodies)
+        self.processed_times.extend([time.perf_counter()] * processed_count)
+
+def run_end_to_end(arguments):
+    '''
+    Runs simulate_one_day against a PV_Simulator in the current process.
+    Meant to run in its own process, so the peak memory only belongs to this run.
+
+    Returns:
+        A dictionary of results, see result.
+    '''
+    timestep, batch_size, encoding = arguments
+    # The meter reaches the broker through the configured 'memory' transport
+    broker = TimingBroker()
+    memory.DEFAULT_BROKER = broker
+    configuration.CONFIGURATION['transport'] = 'memory'
+    configuration.CONFIGURATION['queue_name'] = QUEUE_NAME
+
+    with tempfile.TemporaryDirectory() as directory:
+        pv = TimingPVSimulator(
+            queue_name = QUEUE_NAME,
+            output_filepath = os.path.join(directory, 'output.csv'),
+            consuming_timeout = 0,
+            consuming_batch_size = batch_size,
+            quiet = True,
+            transport = InMemoryTransport(broker),
+            seed = 1
+        )
+        pv.processed_times = []
+        pv.connect()
+        consumer_thread = threading.Thread(target = pv.start_consuming_blocking)
+        consumer_thread.start()
+        start_time = time.perf_counter()
+        meter.simulate_one_day(timestep, batch_size = batch_size, quiet = True, encoding = encoding)
+        consumer_thread.join()
+        elapsed = time.perf_counter() - start_time
+        pv.close_output()
+
+    # Without requeues, the messages are processed in the order they were put into the queue
+    processed_times = numpy.array(pv.processed_times)
+    put_times = numpy.array(list(broker.put_times)[:len(processed_times)])
+    latencies = processed_times - put_times
+    return {
+        'end_to_end.throughput': result(len(processed_times) / elapsed, 'msg/s', True),
+        'end_to_end.latency_p50': result(float(numpy.percentile(latencies, 50)) * 1e3, 'ms', False),
+        'end_to_end.latency_p99': result(float(numpy.percentile(latencies, 99)) * 1e3, 'ms', False),
+        # ru_maxrss is in KiB on Linux
+        'end_to_end.peak_rss': result(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 'MiB', False)
+    }
+
+def run_end_to_end_benchmark(quick = False, batch_size = 100, encoding = 'json'):
+    '''
+    Runs the end-to-end benchmark in a fresh process.
+    '''
+    timestep = 10 if quick else 1
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_end_to_end, ((timestep, batch_size, encoding),))
+
+def result(value, unit, higher_is_better):
+    return {
+        'value': value,
+        'unit': unit,
+        'higher_is_better': higher_is_better
+    }
+
+def compare_to_baseline(report, baseline, tolerance):
+    '''
+    Compares the results of a report to the ones of a baseline report.
+
+    Params:
+        report: The current report with its 'quick' flag and 'results'.
+        baseline: The baseline report.
+        tolerance: The relative change, that is tolerated in the worse direction, for example 0.2 for 20%.
+
+    Returns:
+        A list of (name, current value, baseline value, relative change, regressed) tuples
+        for all results, that are in the baseline as well.
+
+    Raises:
+        ValueError if only one of both reports was measured with --quick,
+        since the quick benchmarks measure a different amount of work.
+    '''
+    if bool(report.get('quick')) != bool(baseline.get('quick')):
+        raise ValueError(
+            "Cannot compare a " + ("quick" if report.get('quick') else "full")
+            + " run to a " + ("quick" if baseline.get('quick') else "full") + " baseline!"
+        )
+    comparisons = []
+    baseline = baseline['results']
+    for name, current in report['results'].items():
+        if name not in baseline or not baseline[name]['value']:
+            continue
+        baseline_value = baseline[name]['value']
+        change = (current['value'] - baseline_value) / baseline_value
+        if current['higher_is_better']:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+        comparisons.append((name, current['value'], baseline_value, change, regressed))
+    return comparisons
+
+def format_results(results, comparisons):
+    comparisons = {comparison[0]: comparison for comparison in comparisons}
+    lines = []
+    for name, current in results.items():
+        line = name.ljust(40) + format(current['value'], '12.2f') + ' ' + current['unit'].ljust(6)
+        if name in comparisons:
+            _, _, baseline_value, change, regressed = comparisons[name]
+            line += '  baseline ' + format(baseline_value, '12.2f') + '  ' + format(change * 100, '+7.1f') + '%'
+            if regressed:
+                line += '  REGRESSION'
+        lines.append(line)
+    return '\n'.join(lines)
+
+@click.command()
+@click.option(
+    '--layer', '-l', 'layers', multiple=True, type=click.Choice(['micro', 'component', 'end_to_end']),
+    help='Only run this layer of benchmarks. Can be given multiple times. (default: all layers)'
+)
+@click.option(
+    '--quick', is_flag=True,
+    help='Run shorter benchmarks, for example to check, that they still work.'
+)
+@click.option(
+    '--output', '-o', default=None, type=click.STRING,
+    help='The file, to which the results will be written as json. (default: \'None\')'
+)
+@click.option(
+    '--baseline', '-b', default=BASELINE_FILEPATH, type=click.STRING,
+    help='The json results, to which the results are compared. (default: \'benchmarks/baseline.json\')'
+)
+@click.option(
+    '--tolerance', '-t', default=0.2, type=click.FLOAT,
+    help='The tolerated relative change to the baseline. (default: \'0.2\')'
+)
+@click.option(
+    '--save-baseline', is_flag=True,
+    help='Store the results as the new baseline instead of comparing them.'
+)
+def main(layers, quick, output, baseline, tolerance, save_baseline):
+    layers = layers or ('micro', 'component', 'end_to_end')
+    results = {}
+    if 'micro' in layers:
+        results.update(run_micro_benchmarks(quick))
+    if 'component' in layers:
+        results.update(run_component_benchmarks(quick))
+    if 'end_to_end' in layers:
+        results.update(run_end_to_end_benchmark(quick))
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'quick': quick,
+        'results': results
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent = 2)
+        print(format_results(results, []))
+        print("Stored the results as baseline in", baseline)
+        return
+
+    comparisons = []
+    if os.path.exists(baseline):
+        with open(baseline) as f:
+            try:
+                comparisons = compare_to_baseline(report, json.load(f), tolerance)
+            except ValueError as e:
+                print(format_results(results, []))
+                print(e, "Record a matching baseline with --save-baseline and pass it with --baseline.")
+                sys.exit(2)
+    else:
+        print("Could not find the baseline", baseline)
+    print(format_results(results, comparisons))
+    regressions = [comparison[0] for comparison in comparisons if comparison[4]]
+    if regressions:
+        print(len(regressions), "benchmarks regressed by more than", format(tolerance * 100, 'g') + "%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import os
+
+import numpy
+
+from pvsimulator import filewriter
+
+# Joules per kWh, to convert Watt times seconds into kWh
+JOULES_PER_KWH = 3600000.0
+
+# The columns of an aggregate row
+AGGREGATE_COLUMNS = (
+    'window_start',
+    'sample_count',
+    'consumed_kwh',
+    'generated_kwh',
+    'net_kwh',
+    'peak_consumption_watt',
+    'peak_generation_watt',
+    'peak_net_watt'
+)
+
+
+class WindowAggregator(object):
+    """
+    The WindowAggregator sums up the energy of the samples in tumbling windows of a fixed length,
+    which are aligned to the epoch, and appends one row per window to an output file (see AGGREGATE_COLUMNS).
+    Only the window, that is currently open, is kept in memory. It is emitted, as soon as
+    a sample of a later window arrives. Samples of an already emitted window are counted as late and dropped.
+    """
+    def __init__(self, window_seconds, writer):
+        """
+        Params:
+            window_seconds: The length of each window in seconds.
+            writer: The filewriter.BufferedFileWriter, to which the aggregate rows are written.
+        """
+        if window_seconds <= 0:
+            raise ValueError(
+                "The window length has to be greater than 0!"
+            )
+        self.window_seconds = window_seconds
+        self.late_sample_count = 0
+        self.writer = writer
+        self._window_start = None
+        self._sample_count = 0
+        self._energies = numpy.zeros(3)
+        self._peaks = numpy.full(3, -numpy.inf)
+
+    def add(self, timestamps, intervals, consumption_values, generation_values):
+        """
+        Adds samples, which have to be ordered by their timestamps.
+
+        Params:
+            timestamps: An array of seconds since epoch timestamps.
+            intervals: The amount of seconds, each sample stands for.
+            consumption_values: The consumed (meter) power values in Watt.
+            generation_values: The generated (photovoltaic) power values in Watt.
+        """
+        if not len(timestamps):
+            return
+        powers = numpy.vstack([
+            consumption_values,
+            generation_values,
+            consumption_values - generation_values
+        ])
+        energies = powers * intervals / JOULES_PER_KWH
+        window_starts = (
+            numpy.floor_divide(timestamps, self.window_seconds) * self.window_seconds
+        ).astype(numpy.int64)
+
+        # The index of the first sample of each window in the ordered samples
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(window_starts)) + 1))
+        sample_counts = numpy.diff(numpy.append(starts, len(window_starts)))
+        window_energies = numpy.add.reduceat(energies, starts, axis = 1)
+        window_peaks = numpy.maximum.reduceat(powers, starts, axis = 1)
+        for index, window_start in enumerate(window_starts[starts].tolist()):
+            self._add_window(
+                window_start, int(sample_counts[index]),
+                window_energies[:, index], window_peaks[:, index]
+            )
+
+    def _add_window(self, window_start, sample_count, energies, peaks):
+        if self._window_start is not None and window_start < self._window_start:
+            self.late_sample_count += sample_count
+            return
+        if self._window_start is not None and window_start > self._window_start:
+            self.emit()
+        if self._window_start is None:
+            self._window_start = window_start
+        self._sample_count += sample_count
+        self._energies += energies
+        self._peaks = numpy.maximum(self._peaks, peaks)
+
+    def emit(self):
+        """
+        Writes the row of the open window, if there is one, and closes the window.
+        """
+        if self._window_start is None:
+            return
+        self.writer.write_row(
+            [self._window_start, self._sample_count]
+            + self._energies.tolist()
+            + self._peaks.tolist()
+        )
+        self._window_start = None
+        self._sample_count = 0
+        self._energies[:] = 0
+        self._peaks[:] = -numpy.inf
+
+class AggregationStage(object):
+    """
+    The AggregationStage feeds the samples of the PV_Simulator into one WindowAggregator per window length,
+    each writing to its own file next to the output (see aggregate_filepath).
+
+    The samples are weighted with the time until the next sample, so the energy of the windows is correct
+    for any meter timestep. Therefore the samples of the latest timestamp are held back, until a later
+    timestamp arrives. A gap in the samples, for example after a restart, is filled for at most the length
+    of the shortest window. The last samples are weighted with the interval before them.
+    """
+    def __init__(self, output_filepath, window_seconds, **writer_arguments):
+        """
+        Params:
+            output_filepath: The raw output file, next to which the aggregates are written.
+            window_seconds: A list of window lengths in seconds.
+            writer_arguments: The flush settings for the filewriter.BufferedFileWriter of each window.
+        """
+        self._max_interval = min(window_seconds)
+        self._last_interval = None
+        self._held_samples = None
+        self.aggregators = [
+            WindowAggregator(
+                seconds,
+                filewriter.BufferedFileWriter(aggregate_filepath(output_filepath, seconds), **writer_arguments)
+            )
+            for seconds in window_seconds
+        ]
+
+    def add(self, timestamps, consumption_values, generation_values):
+        """
+        Adds the samples of a message or batch, in any order.
+
+        Params:
+            timestamps: A list or array of seconds since epoch timestamps.
+            consumption_values: The consumed (meter) power values in Watt.
+            generation_values: The generated (photovoltaic) power values in Watt.
+        """
+        samples = [
+            numpy.asarray(timestamps, dtype = numpy.float64),
+            numpy.asarray(consumption_values, dtype = numpy.float64),
+            numpy.asarray(generation_values, dtype = numpy.float64)
+        ]
+        if self._held_samples is not None:
+            samples = [numpy.concatenate(pair) for pair in zip(self._held_samples, samples)]
+        order = numpy.argsort(samples[0], kind = 'stable')
+        samples = [values[order] for values in samples]
+
+        distinct_timestamps, group_starts = numpy.unique(samples[0], return_index = True)
+        if len(distinct_timestamps) < 2:
+            self._held_samples = samples
+            return
+
+        # All samples, except the ones of the latest timestamp, know their interval now
+        intervals = numpy.minimum(numpy.diff(distinct_timestamps), self._max_interval)
+        self._last_interval = intervals[-1]
+        release_count = group_starts[-1]
+        self._add_to_aggregators(
+            [values[:release_count] for values in samples],
+            numpy.repeat(intervals, numpy.diff(group_starts))
+        )
+        self._held_samples = [values[release_count:] for values in samples]
+
+    def _add_to_aggregators(self, samples, intervals):
+        timestamps, consumption_values, generation_values = samples
+        for aggregator in self.aggregators:
+            aggregator.add(timestamps, intervals, consumption_values, generation_values)
+
+    @property
+    def late_sample_count(self):
+        return max(aggregator.late_sample_count for aggregator in self.aggregators)
+
+    def flush_if_due(self):
+        for aggregator in self.aggregators:
+            aggregator.writer.flush_if_due()
+
+    def flush(self):
+        for aggregator in self.aggregators:
+            aggregator.writer.flush()
+
+    def close(self):
+        """
+        Adds the held back samples, emits the open windows and closes the files.
+        """
+        if self._held_samples is not None and len(self._held_samples[0]):
+            self._add_to_aggregators(
+                self._held_samples,
+                numpy.full(len(self._held_samples[0]), self._last_interval or 0.0)
+            )
+            self._held_samples = None
+        for aggregator in self.aggregators:
+            aggregator.emit()
+            aggregator.writer.close()
+
+def aggregate_filepath(filepath, window_seconds):
+    """
+    Returns the file of the aggregates of a window length next to the output file,
+    for example 'output-15min.csv' for 'output.csv' and 900 seconds.
+    """
+    root, extension = os.path.splitext(filepath)
+    if window_seconds % 60 == 0:
+        label = str(window_seconds // 60) + 'min'
+    else:
+        label = str(window_seconds) + 's'
+    return root + '-' + label + extension
@@ -0,0 +1,246 @@
+import asyncio
+import inspect
+
+from pvsimulator import codec
+from pvsimulator import transports
+from pvsimulator.exceptions import *
+
+class AsyncQueueClient(object):
+    """
+    The AsyncQueueClient is the asyncio counterpart of the QueueClient.
+    It connects to a single queue, to publish and/or consume messages on it.
+    Many AsyncQueueClients can run concurrently on one event loop. Over RabbitMQ they share
+    one connection with a single IO thread and each client opens its own channel on it.
+    """
+    def __init__(
+            self,
+            host = 'localhost',
+            username = 'guest',
+            password = 'guest',
+            queue_name = 'queue',
+            prefetch_count = 100,
+            transport = 'amqp'
+        ):
+        """
+        Params:
+            host: The hostname of the RabbitMQ instance.
+            username: The username, which will be used to login to the RabbitMQ instance.
+            password: The password for the user.
+            queue_name: The name of the queue, this Client will be connected to.
+            prefetch_count: The maximum amount of unacknowledged messages the broker
+                delivers in advance.
+            transport: The AsyncTransport used to reach the queue, or the name of one
+                ('amqp' for RabbitMQ, 'memory' for the in-process broker).
+        """
+        self._host = host
+        self._queue_name = queue_name
+        self._username = username
+        self._password = password
+        self.connected = False
+
+        self._should_consume = False
+        self._waiting_task = None
+        self._prefetch_count = prefetch_count
+
+        if isinstance(transport, str):
+            transport = transports.create_async_transport(
+                transport, host, username, password
+            )
+        self._transport = transport
+
+    async def connect(self):
+        """
+        Try to connect the client to its queue.
+
+        Raises:
+            PVConnectionError if the connection to the broker failed.
+            PVQueueConnectionError if the connection to the designated queue failed.
+        """
+        await self._transport.connect()
+        await self._transport.declare_queue(self._queue_name)
+        self.connected = True
+
+    async def publish_message(self, message_body, content_type = codec.JSON_CONTENT_TYPE):
+        """
+        Publish a message to the queue.
+
+        Param:
+            message_body: The message, that should be published.
+            content_type: The content type of the message body.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+            PVMessagePublishingError if the message could not be published.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "Cannot publish message! Client is not connected!"
+            )
+
+        await self._transport.publish(
+            self._queue_name,
+            message_body,
+            content_type
+        )
+
+    async def publish_batch(self, message_bodies, confirm = False, content_type = codec.JSON_CONTENT_TYPE):
+        """
+        Publish multiple messages to the queue at once.
+
+        Params:
+            message_bodies: A list of messages, that should be published.
+            confirm: If True, the broker confirms the whole batch at once,
+                before this coroutine returns.
+            content_type: The content type of all message bodies.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+            PVMessagePublishingError if the batch could not be published.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "Cannot publish batch! Client is not connected!"
+            )
+
+        await self._transport.publish_batch(
+            self._queue_name,
+            message_bodies,
+            content_type,
+            confirm = confirm
+        )
+
+    async def purge_queue(self):
+        """
+        Delete all published messages in the queue.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "The client is not properly connected to the RabbitMQ service!"
+            )
+
+        await self._transport.purge(self._queue_name)
+
+    async def iterate_messages(self):
+        """
+        Consume messages as an asynchronous iterator.
+        A message is acknowledged, once the loop body, that received it, is done.
+        After leaving the loop early, the iterator should be closed with aclose().
+        This acknowledges the last message and hands all prefetched,
+        but unprocessed messages back to the queue.
+
+        Yields:
+            The received messages. In plain text or as bytes for binary content types.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+        """
+        self._check_consuming_connection()
+        deliveries = self._transport.consume(self._queue_name, self._prefetch_count)
+        delivery_tag = None
+        try:
+            async for delivery in deliveries:
+                delivery_tag = delivery.delivery_tag
+                yield self._decode_message_body(delivery)
+                await self._transport.ack(delivery_tag)
+                delivery_tag = None
+        except GeneratorExit:
+            # The loop was left after the body of the last message was done
+            if delivery_tag is not None:
+                await self._transport.ack(delivery_tag)
+            raise
+        finally:
+            await deliveries.aclose()
+
+    async def start_consuming(self, callback = None):
+        """
+        Consume messages, until stop_consuming is called.
+        Each message is handed to the callback and acknowledged afterwards.
+
+        Params:
+            callback: A function or coroutine function, that is called with each message.
+                Defaults to _on_message_received_callback.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+        """
+        self._check_consuming_connection()
+        if callback is None:
+            callback = self._on_message_received_callback
+
+        self._should_consume = True
+        deliveries = self._transport.consume(self._queue_name, self._prefetch_count)
+        try:
+            while self._should_consume:
+                # Only the wait for the next message is cancelled by stop_consuming
+                self._waiting_task = asyncio.ensure_future(deliveries.__anext__())
+                try:
+                    delivery = await self._waiting_task
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    if self._should_consume:
+                        raise
+                    break
+                finally:
+                    self._waiting_task = None
+
+                result = callback(self._decode_message_body(delivery))
+                if inspect.isawaitable(result):
+                    await result
+                await self._transport.ack(delivery.delivery_tag)
+        finally:
+            self._should_consume = False
+            await deliveries.aclose()
+
+    def stop_consuming(self):
+        """
+        Stop consuming messages.
+        A message, that is processed right now, is still acknowledged.
+        If the consumer waits for messages, it stops right away.
+        """
+        self._should_consume = False
+        if self._waiting_task is not None:
+            self._waiting_task.cancel()
+
+    async def close(self):
+        """
+        Close the connection to the broker.
+        """
+        self.stop_consuming()
+        await self._transport.close()
+        self.connected = False
+
+    def _check_consuming_connection(self):
+        """
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "The client is not properly connected to the RabbitMQ service!"
+            )
+
+    def _decode_message_body(self, delivery):
+        """
+        Returns the body of a received message.
+        Plain text bodies are decoded to a string, binary bodies are returned as bytes.
+        """
+        if codec.is_text_content_type(delivery.content_type) and \
+                isinstance(delivery.body, bytes):
+            return delivery.body.decode('utf-8')
+        return delivery.body
+
+    def _on_message_received_callback(self, message_body):
+        """
+        This method should be implemented by child-classes,
+        that intend to consume messages with start_consuming.
+        It may be a coroutine function.
+
+        Param:
+            message_body: The message, that was received.
+                In plain text or as bytes for binary content types.
+        """
+        raise NotImplementedError(
+            "_on_message_received_callback not implemented!"
+        )
@@ -0,0 +1,112 @@
+import json
+import struct
+
+import numpy
+
+from pvsimulator.exceptions import PVMessageDecodingError
+
+# The content type of the plain text JSON messages
+JSON_CONTENT_TYPE = 'text/plain'
+# The content type of the fixed-layout binary messages
+BINARY_CONTENT_TYPE = 'application/x-pv-samples'
+
+CONTENT_TYPES = {
+    'json': JSON_CONTENT_TYPE,
+    'binary': BINARY_CONTENT_TYPE
+}
+
+# One sample is an int64 timestamp followed by a float64 power value (little endian)
+SAMPLE_DTYPE = numpy.dtype([
+    ('timestamp', '<i8'),
+    ('meter_power_value_watt', '<f8')
+])
+
+# Each binary message starts with a magic value and the amount of samples, it contains
+FRAME_HEADER = struct.Struct('<4sI')
+FRAME_MAGIC = b'PVS1'
+
+
+def encode_json_sample(t, meter_power_value):
+    """
+    Encodes a single sample as a JSON message body.
+
+    Params:
+        t: Seconds since epoch.
+        meter_power_value: The meter power value in Watt.
+    """
+    return json.dumps(
+        {
+            "timestamp": t,
+            "meter_power_value_watt": meter_power_value
+        }
+    )
+
+def encode_binary_samples(timestamps, meter_power_values):
+    """
+    Encodes many samples into one binary message body.
+    The body consists of the frame header and one 16 byte record per sample.
+
+    Params:
+        timestamps: An array of seconds since epoch timestamps.
+        meter_power_values: An array of meter power values in Watt.
+    """
+    samples = numpy.empty(len(timestamps), dtype = SAMPLE_DTYPE)
+    samples['timestamp'] = timestamps
+    samples['meter_power_value_watt'] = meter_power_values
+    return FRAME_HEADER.pack(FRAME_MAGIC, len(samples)) + samples.tobytes()
+
+def decode_binary_samples(message_body):
+    """
+    Decodes a binary message body without copying the samples.
+
+    Returns:
+        A tuple of the timestamps array and the meter power values array.
+
+    Raises:
+        PVMessageDecodingError if the body is not a valid binary message.
+    """
+    if len(message_body) < FRAME_HEADER.size:
+        raise PVMessageDecodingError(
+            "Binary message is too short!"
+        )
+    magic, sample_count = FRAME_HEADER.unpack_from(message_body)
+    if magic != FRAME_MAGIC:
+        raise PVMessageDecodingError(
+            "Binary message has an unknown format!"
+        )
+    if len(message_body) != FRAME_HEADER.size + sample_count * SAMPLE_DTYPE.itemsize:
+        raise PVMessageDecodingError(
+            "Binary message does not contain", sample_count, "samples!"
+        )
+
+    samples = numpy.frombuffer(
+        message_body,
+        dtype = SAMPLE_DTYPE,
+        count = sample_count,
+        offset = FRAME_HEADER.size
+    )
+    return samples['timestamp'], samples['meter_power_value_watt']
+
+def decode_samples(message_body):
+    """
+    Decodes a message body of either encoding.
+    Plain text bodies are decoded as JSON, binary bodies as binary samples.
+
+    Returns:
+        A tuple of the timestamps array and the meter power values array.
+    """
+    if isinstance(message_body, str):
+        # Only the single sample of a JSON message has to be turned into arrays
+        message_body_json = json.loads(message_body)
+        return (
+            numpy.array([message_body_json["timestamp"]]),
+            numpy.array([message_body_json["meter_power_value_watt"]])
+        )
+
+    return decode_binary_samples(message_body)
+
+def is_text_content_type(content_type):
+    """
+    Returns True, if message bodies of this content type are plain text.
+    """
+    return content_type != BINARY_CONTENT_TYPE
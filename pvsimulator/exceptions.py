@@ -38,3 +38,9 @@ class PVQueueClientAlreadyConsumingError(Exception):
     consuming messages is tasked to start consuming.
     """
     pass
+
+class PVMessageDecodingError(Exception):
+    """
+    Is raised, when a received message could not be decoded.
+    """
+    pass
@@ -1,5 +1,29 @@
 import csv
+import heapq
+import itertools
 import os
+import struct
+import time
+
+import numpy
+
+OUTPUT_FORMATS = ('csv', 'binary')
+
+# One output record is an int64 timestamp followed by three float64 power values (little endian)
+RECORD_DTYPE = numpy.dtype([
+    ('timestamp', '<i8'),
+    ('meter_power_value_watt', '<f8'),
+    ('pv_power_value_watt', '<f8'),
+    ('combined_power_value_watt', '<f8')
+])
+
+# Each binary output file starts with a magic value, the format version and the record size
+FILE_HEADER = struct.Struct('<4sII4x')
+FILE_MAGIC = b'PVO1'
+FILE_VERSION = 1
+
+# The amount of records, that are read from each file per step of a merge
+MERGE_CHUNK_RECORDS = 65536
 
 def file_append(filepath, content):
     """
@@ -14,3 +38,361 @@ def file_append(filepath, content):
     with open(filepath, "a") as f:
         writer = csv.writer(f)
         writer.writerow(content)
+
+def file_append_rows(filepath, rows):
+    """
+    This method will take a list of rows and appends all of them
+    to a csv file at once.
+    If the file does not exist, it will be created.
+
+    Params:
+        filepath: The path to the file that should be written to.
+        rows: A list of rows, each being a list of values.
+    """
+    with open(filepath, "a") as f:
+        writer = csv.writer(f)
+        writer.writerows(rows)
+
+class BufferedFileWriter(object):
+    """
+    The BufferedFileWriter keeps a csv file open and buffers the appended rows.
+    The buffered rows are flushed to the file every flush_rows rows,
+    every flush_interval seconds and when the writer is closed.
+    """
+    def __init__(
+            self,
+            filepath,
+            flush_rows = 1000,
+            flush_interval = 1.0,
+            fsync = False,
+            buffer_size = 1024 * 1024,
+            on_flush = None
+        ):
+        """
+        Params:
+            filepath: The path to the file that should be written to.
+                If the file does not exist, it will be created.
+            flush_rows: The amount of rows, after which the buffer is flushed. Disabled if None.
+            flush_interval: The time in seconds, after which the buffer is flushed. Disabled if None.
+            fsync: If True, each flush also waits until the file is written to disk.
+            buffer_size: The size of the write buffer in bytes.
+            on_flush: An optional function, that is called without arguments after each flush.
+                With fsync, all rows written so far are on disk, once it is called.
+        """
+        self._filepath = filepath
+        self._flush_rows = flush_rows
+        self._flush_interval = flush_interval
+        self._fsync = fsync
+        self._on_flush = on_flush
+
+        self._open(filepath, buffer_size)
+        self._unflushed_rows = 0
+        self._last_flush_time = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def _open(self, filepath, buffer_size):
+        self._file = open(filepath, "a", buffering = buffer_size)
+        self._writer = csv.writer(self._file)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    @property
+    def size(self):
+        """
+        The size of the file in bytes, including the buffered rows.
+        """
+        return self._file.tell()
+
+    def write_row(self, row):
+        """
+        Appends a row to the file.
+
+        Params:
+            row: A list of values.
+        """
+        self._writer.writerow(row)
+        self._unflushed_rows += 1
+        self.flush_if_due()
+
+    def write_rows(self, rows):
+        """
+        Appends multiple rows to the file.
+
+        Params:
+            rows: A list of rows, each being a list of values.
+        """
+        rows = list(rows)
+        self._writer.writerows(rows)
+        self._unflushed_rows += len(rows)
+        self.flush_if_due()
+
+    def write_columns(self, *columns):
+        """
+        Appends the rows of equally long column arrays to the file.
+
+        Params:
+            columns: One array per column, for example the timestamps and the power values.
+        """
+        self.write_rows(zip(*[numpy.asarray(column).tolist() for column in columns]))
+
+    def flush_if_due(self):
+        """
+        Flushes the buffer, if enough rows were written
+        or enough time has passed since the last flush.
+        """
+        if self._unflushed_rows == 0:
+            return
+        if self._flush_rows and self._unflushed_rows >= self._flush_rows:
+            self.flush()
+        elif self._flush_interval is not None and \
+                time.monotonic() - self._last_flush_time >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows to the file.
+        """
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self._unflushed_rows = 0
+        self._last_flush_time = time.monotonic()
+        if self._on_flush:
+            self._on_flush()
+
+    def close(self):
+        """
+        Flushes all buffered rows and closes the file.
+        """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+class BinaryRecordWriter(BufferedFileWriter):
+    """
+    The BinaryRecordWriter appends the output rows as fixed-width binary records
+    (see RECORD_DTYPE) instead of csv text. The file starts with a small header (see FILE_HEADER)
+    and can be opened without parsing by read_binary_output.
+    It offers the same methods as the BufferedFileWriter.
+    """
+    def _open(self, filepath, buffer_size):
+        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+            with open(filepath, "rb") as f:
+                _check_file_header(f.read(FILE_HEADER.size), filepath)
+        self._file = open(filepath, "ab", buffering = buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, RECORD_DTYPE.itemsize))
+
+    def write_row(self, row):
+        self.write_rows([row])
+
+    def write_rows(self, rows):
+        self.write_records(numpy.array([tuple(row) for row in rows], dtype = RECORD_DTYPE))
+
+    def write_columns(self, *columns):
+        records = numpy.empty(len(columns[0]), dtype = RECORD_DTYPE)
+        for name, column in zip(RECORD_DTYPE.names, columns):
+            records[name] = column
+        self.write_records(records)
+
+    def write_records(self, records):
+        """
+        Appends an array of records to the file as they are, without converting them.
+
+        Params:
+            records: A NumPy structured array of the RECORD_DTYPE, for example read by read_binary_output.
+        """
+        self._file.write(records.tobytes())
+        self._unflushed_rows += len(records)
+        self.flush_if_due()
+
+def create_writer(filepath, output_format = 'csv', **kwargs):
+    """
+    Creates a BufferedFileWriter for the csv or a BinaryRecordWriter for the binary output format.
+    The keyword arguments are passed on to the writer.
+    """
+    if output_format == 'csv':
+        return BufferedFileWriter(filepath, **kwargs)
+    if output_format == 'binary':
+        return BinaryRecordWriter(filepath, **kwargs)
+    raise ValueError(
+        "Unknown output format: '" + str(output_format) + "'!"
+    )
+
+def _check_file_header(header, filepath):
+    """
+    Raises:
+        ValueError if the header does not belong to a binary output file.
+    """
+    if len(header) < FILE_HEADER.size:
+        raise ValueError(filepath + " is not a binary output file!")
+    magic, version, record_size = FILE_HEADER.unpack(header[:FILE_HEADER.size])
+    if magic != FILE_MAGIC or version != FILE_VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(filepath + " is not a binary output file of version " + str(FILE_VERSION) + "!")
+
+def read_binary_output(filepath):
+    """
+    Opens a binary output file as a memory-mapped NumPy structured array (see RECORD_DTYPE).
+    Nothing is read or copied up front, so even a year of 1-second data opens instantly.
+    The columns are views, for example records['pv_power_value_watt'].
+
+    Raises:
+        ValueError if the file is not a binary output file.
+    """
+    with open(filepath, "rb") as f:
+        _check_file_header(f.read(FILE_HEADER.size), filepath)
+    record_count = (os.path.getsize(filepath) - FILE_HEADER.size) // RECORD_DTYPE.itemsize
+    if record_count == 0:
+        return numpy.empty(0, dtype = RECORD_DTYPE)
+    return numpy.memmap(
+        filepath, dtype = RECORD_DTYPE, mode = 'r',
+        offset = FILE_HEADER.size, shape = (record_count,)
+    )
+
+def slice_by_time(records, start, stop):
+    """
+    Returns the view of the records with a timestamp in [start, stop).
+    The records have to be ordered by their timestamps.
+    """
+    timestamps = records['timestamp']
+    return records[
+        numpy.searchsorted(timestamps, start, side = 'left'):
+        numpy.searchsorted(timestamps, stop, side = 'left')
+    ]
+
+def iterate_merged_records(filepaths, chunk_records = MERGE_CHUNK_RECORDS):
+    """
+    Merges binary output files, whose records are ordered by their timestamps, with a k-way merge.
+    The files are memory-mapped and read in chunks, so at most one chunk per file is held in memory.
+
+    Yields:
+        Arrays of records (see RECORD_DTYPE), which together are in timestamp order.
+    """
+    records = [read_binary_output(filepath) for filepath in filepaths]
+    positions = [0] * len(records)
+    while True:
+        chunks = []
+        # No record after the chunks can be earlier than the last record of a chunk, that is followed by more
+        bound = None
+        for file_records, position in zip(records, positions):
+            chunk = file_records[position:position + chunk_records]
+            chunks.append(chunk)
+            if position + chunk_records < len(file_records):
+                last_timestamp = chunk['timestamp'][-1]
+                bound = last_timestamp if bound is None else min(bound, last_timestamp)
+        if not any(len(chunk) for chunk in chunks):
+            return
+
+        pieces = []
+        for index, chunk in enumerate(chunks):
+            if bound is not None:
+                chunk = chunk[:numpy.searchsorted(chunk['timestamp'], bound, side = 'right')]
+            pieces.append(chunk)
+            positions[index] += len(chunk)
+        merged_records = numpy.concatenate(pieces)
+        yield merged_records[numpy.argsort(merged_records['timestamp'], kind = 'stable')]
+
+def sort_file_by_timestamp(filepath, output_format = 'csv'):
+    """
+    Sorts the rows of an output file by their timestamps, if they are not ordered yet.
+    A consumer writes its rows in the order of its deliveries, so a redelivered message
+    leaves its rows behind the later rows. An ordered file is only read, not rewritten.
+    Otherwise the file is sorted in memory with a stable sort and replaced at once.
+
+    Params:
+        filepath: The path to the csv or binary output file.
+        output_format: Either 'csv' or 'binary'.
+
+    Returns:
+        True, if the file had to be sorted.
+    """
+    part_filepath = filepath + ".part"
+    if output_format == 'binary':
+        records = read_binary_output(filepath)
+        timestamps = records['timestamp']
+        if numpy.all(timestamps[1:] >= timestamps[:-1]):
+            return False
+        with open(part_filepath, "wb") as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, RECORD_DTYPE.itemsize))
+            f.write(records[numpy.argsort(timestamps, kind = 'stable')].tobytes())
+        del records, timestamps
+    else:
+        with open(filepath, "r", newline = "") as f:
+            lines = f.readlines()
+        timestamps = [float(line.split(",", 1)[0]) for line in lines]
+        if all(a <= b for a, b in zip(timestamps, timestamps[1:])):
+            return False
+        order = sorted(range(len(lines)), key = timestamps.__getitem__)
+        with open(part_filepath, "w", newline = "") as f:
+            f.writelines(lines[index] for index in order)
+    os.replace(part_filepath, filepath)
+    return True
+
+def merge_binary_files_by_timestamp(filepaths, output_filepath):
+    """
+    Merges binary output files, whose records are ordered by their timestamps,
+    and appends the records to the binary output file in timestamp order.
+    The records are streamed, so the files do not have to fit into memory.
+    """
+    with BinaryRecordWriter(output_filepath, flush_rows = None, flush_interval = None) as writer:
+        for records in iterate_merged_records(filepaths):
+            writer.write_records(records)
+
+def merge_files_by_timestamp(filepaths, output_filepath):
+    """
+    Merges csv files, whose rows are ordered by the timestamp in their first column,
+    and appends the rows to the output file in timestamp order.
+    The rows are streamed, so the files do not have to fit into memory.
+
+    Params:
+        filepaths: The paths of the files that should be merged.
+        output_filepath: The path to the file that should be written to.
+    """
+    files = [open(filepath, "r", newline = "") for filepath in filepaths]
+    try:
+        merged_lines = heapq.merge(
+            *files,
+            key = lambda line: float(line.split(",", 1)[0])
+        )
+        with open(output_filepath, "a", newline = "") as output_file:
+            output_file.writelines(merged_lines)
+    finally:
+        for f in files:
+            f.close()
+
+def iterate_merged_columns(filepaths, output_format = 'csv', chunk_rows = MERGE_CHUNK_RECORDS):
+    """
+    Merges output files, whose rows are ordered by their timestamps, like the merge functions,
+    but yields the merged rows in chunks of columns instead of writing them.
+
+    Yields:
+        Tuples of the timestamp, meter, pv and combined power value arrays, which together are in timestamp order.
+    """
+    if output_format == 'binary':
+        for records in iterate_merged_records(filepaths, chunk_rows):
+            yield tuple(records[name] for name in RECORD_DTYPE.names)
+        return
+
+    files = [open(filepath, "r", newline = "") for filepath in filepaths]
+    try:
+        merged_lines = heapq.merge(
+            *files,
+            key = lambda line: float(line.split(",", 1)[0])
+        )
+        while True:
+            lines = list(itertools.islice(merged_lines, chunk_rows))
+            if not lines:
+                return
+            rows = numpy.loadtxt(lines, delimiter = ",", ndmin = 2)
+            yield tuple(rows[:, index] for index in range(4))
+    finally:
+        for f in files:
+            f.close()
@@ -0,0 +1,163 @@
+import time
+
+
+class FlowController(object):
+    """
+    The FlowController pauses a publisher, while its queue holds too many messages.
+    Once the depth of the queue reaches the high watermark, publishing pauses, until the
+    consumers have drained the queue to the low watermark. The gap between both watermarks
+    keeps the publisher from pausing and resuming on every check.
+
+    Asking the broker for the depth costs a round trip, so it is only checked every check_interval
+    seconds, or earlier, if the messages published since the last check could have filled the queue
+    up to the high watermark. So the queue holds at most the high watermark plus one batch.
+    """
+    def __init__(
+            self, get_depth, high_watermark, low_watermark = None, check_interval = 0.5,
+            clock = time.monotonic, sleep = time.sleep
+        ):
+        """
+        Params:
+            get_depth: The function, which returns the amount of messages in the queue.
+            high_watermark: The depth, at which publishing pauses.
+            low_watermark: The depth, at which publishing resumes. Defaults to half the high watermark.
+            check_interval: The time in seconds between two depth checks,
+                and between two checks while publishing is paused.
+            clock: A monotonic clock in seconds.
+            sleep: The function to sleep a given amount of seconds.
+        """
+        if high_watermark <= 0:
+            raise ValueError(
+                "The high watermark has to be greater than 0!"
+            )
+        if low_watermark is None:
+            low_watermark = high_watermark // 2
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError(
+                "The low watermark has to be at least 0 and below the high watermark!"
+            )
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self._get_depth = get_depth
+        self._check_interval = check_interval
+        self._clock = clock
+        self._sleep = sleep
+        self._next_check_time = None
+        self._unchecked_count = 0
+
+        self.depth = 0
+        self.paused = False
+        self.pause_count = 0
+        self.paused_seconds = 0.0
+
+    def wait(self, message_count = 1):
+        """
+        Waits, until message_count messages may be published.
+        Checks the depth of the queue, if the check is due, and blocks while publishing is paused.
+        """
+        now = self._clock()
+        headroom = self.high_watermark - self.depth
+        if self._next_check_time is None or now >= self._next_check_time or \
+                self._unchecked_count + message_count > headroom:
+            self._check_depth(now)
+
+        if self.paused:
+            pause_start_time = now
+            self.pause_count += 1
+            while self.paused:
+                self._sleep(self._check_interval)
+                self._check_depth(self._clock())
+            self.paused_seconds += self._clock() - pause_start_time
+        self._unchecked_count += message_count
+
+    def _check_depth(self, now):
+        self.depth = self._get_depth()
+        self._unchecked_count = 0
+        self._next_check_time = now + self._check_interval
+        if self.depth >= self.high_watermark:
+            self.paused = True
+        elif self.depth <= self.low_watermark:
+            self.paused = False
+
+    def format_report(self):
+        """
+        Returns a line with the last depth and the pauses so far.
+        """
+        return (
+            "Queue depth: " + str(self.depth)
+            + " (high: " + str(self.high_watermark) + ", low: " + str(self.low_watermark) + ")"
+            + " | paused: " + str(self.pause_count) + " times"
+            + " for " + format(self.paused_seconds, '.1f') + " s"
+        )
+
+
+class LagReporter(object):
+    """
+    The LagReporter tells, how far a consumer is behind its publisher.
+    Every interval seconds, it reports the depth of the queue, the rate at which
+    the consumer processed messages since the last report and the time it needs
+    at this rate to drain the queue. If the timestamps of the samples are observed as well,
+    the time since the latest processed sample is reported too.
+    """
+    def __init__(self, get_depth, interval = 10.0, clock = time.monotonic, log = print):
+        """
+        Params:
+            get_depth: The function, which returns the amount of messages in the queue.
+            interval: The time in seconds between two reports.
+            clock: A monotonic clock in seconds.
+            log: The function, to which each report line is passed.
+        """
+        self._get_depth = get_depth
+        self._interval = interval
+        self._clock = clock
+        self._log = log
+        self._last_report_time = None
+        self._consumed_count = 0
+        self.latest_timestamp = None
+
+    def observe(self, message_count, latest_timestamp = None):
+        """
+        Counts processed messages.
+
+        Params:
+            message_count: The amount of processed messages.
+            latest_timestamp: The latest seconds since epoch timestamp of their samples, if known.
+        """
+        self._consumed_count += message_count
+        if latest_timestamp is not None:
+            self.latest_timestamp = max(latest_timestamp, self.latest_timestamp or latest_timestamp)
+
+    def report_if_due(self):
+        """
+        Reports the lag, if the interval has passed since the last report.
+        """
+        now = self._clock()
+        if self._last_report_time is None:
+            self._last_report_time = now
+            return
+        elapsed = now - self._last_report_time
+        if elapsed < self._interval:
+            return
+        self._log(self.format_report(self._get_depth(), elapsed))
+        self._last_report_time = now
+        self._consumed_count = 0
+
+    def format_report(self, depth, elapsed):
+        """
+        Returns the report line for the depth of the queue
+        and the messages consumed in the elapsed seconds.
+        """
+        consumed_rate = self._consumed_count / elapsed if elapsed else 0.0
+        line = (
+            "Consumer lag: " + str(depth) + " messages queued"
+            + " | consumed: " + format(consumed_rate, '.1f') + " msg/s"
+        )
+        if depth == 0:
+            line += " | drained"
+        elif consumed_rate > 0:
+            line += " | drained in " + format(depth / consumed_rate, '.1f') + " s"
+        else:
+            line += " | not draining"
+        if self.latest_timestamp is not None:
+            line += " | behind by " + format(time.time() - self.latest_timestamp, '.1f') + " s"
+        return line
@@ -0,0 +1,332 @@
+import bisect
+import os
+import threading
+import time
+
+import numpy
+
+# The upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0
+)
+# The upper bounds in seconds of the end-to-end lag histogram buckets
+LAG_BUCKETS = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0
+)
+
+# The prefix of all exported metric names
+METRIC_PREFIX = 'pvsimulator_'
+
+COUNTERS = {
+    'messages_published': "Messages published to the queue.",
+    'messages_consumed': "Messages received from the queue.",
+    'messages_acked': "Messages acknowledged to the broker.",
+    'messages_failed': "Messages, that could not be published or processed.",
+    'publish_pauses': "Times publishing was paused, because the queue reached its high watermark."
+}
+
+HISTOGRAMS = {
+    'publish_seconds': ("Time to publish a message or batch.", LATENCY_BUCKETS),
+    'decode_seconds': ("Time to decode a message or batch.", LATENCY_BUCKETS),
+    'compute_seconds': ("Time to compute the simulated values of a message or batch.", LATENCY_BUCKETS),
+    'write_seconds': ("Time to write the output of a message or batch.", LATENCY_BUCKETS),
+    'ack_seconds': ("Time to acknowledge a message or batch.", LATENCY_BUCKETS),
+    'lag_seconds': ("Time between the timestamp of a sample and its processing.", LAG_BUCKETS)
+}
+
+
+class Histogram(object):
+    """
+    The Histogram counts observed values in fixed buckets, like a Prometheus histogram.
+    """
+    def __init__(self, buckets):
+        """
+        Params:
+            buckets: The ascending upper bounds of the buckets. A last bucket for all
+                larger values is added automatically.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def observe_many(self, values):
+        """
+        Observes a whole array of values at once.
+        """
+        values = numpy.asarray(values, dtype = numpy.float64)
+        if not len(values):
+            return
+        bucket_counts = numpy.bincount(
+            numpy.searchsorted(self.buckets, values, side = 'left'),
+            minlength = len(self.counts)
+        )
+        for index, bucket_count in enumerate(bucket_counts.tolist()):
+            self.counts[index] += bucket_count
+        self.count += len(values)
+        self.sum += float(values.sum())
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket, which contains the q-quantile.
+        Values in the last bucket are reported as infinite.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative_count = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative_count += bucket_count
+            if cumulative_count >= rank:
+                return bound
+        return float('inf')
+
+class MetricsRegistry(object):
+    """
+    The MetricsRegistry holds the counters and histograms of the current process.
+    It is thread-safe, so the publishing and consuming threads can share it.
+    """
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._histograms = {
+            name: Histogram(buckets) for name, (_, buckets) in HISTOGRAMS.items()
+        }
+
+    def increment(self, name, amount = 1):
+        """
+        Increments the counter with the name by amount.
+        """
+        with self._lock:
+            self._counters[name] += amount
+
+    def start_timer(self):
+        """
+        Returns a start time for observe_since.
+        """
+        return time.perf_counter()
+
+    def observe_since(self, name, start_time):
+        """
+        Observes the seconds since start_time in the histogram with the name.
+        """
+        duration = time.perf_counter() - start_time
+        with self._lock:
+            self._histograms[name].observe(duration)
+
+    def observe_many(self, name, values):
+        """
+        Observes an array of values in the histogram with the name.
+        """
+        with self._lock:
+            self._histograms[name].observe_many(values)
+
+    def snapshot(self):
+        """
+        Returns copies of the counters and histograms,
+        as a dictionary of counter values and a dictionary of Histograms.
+        """
+        with self._lock:
+            histograms = {}
+            for name, histogram in self._histograms.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count = histogram.count
+                copy.sum = histogram.sum
+                histograms[name] = copy
+            return dict(self._counters), histograms
+
+    def render_prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        counters, histograms = self.snapshot()
+        lines = []
+        for name, value in counters.items():
+            metric_name = METRIC_PREFIX + name + '_total'
+            lines.append('# HELP ' + metric_name + ' ' + COUNTERS[name])
+            lines.append('# TYPE ' + metric_name + ' counter')
+            lines.append(metric_name + ' ' + str(value))
+        for name, histogram in histograms.items():
+            metric_name = METRIC_PREFIX + name
+            lines.append('# HELP ' + metric_name + ' ' + HISTOGRAMS[name][0])
+            lines.append('# TYPE ' + metric_name + ' histogram')
+            cumulative_count = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative_count += bucket_count
+                lines.append(
+                    metric_name + '_bucket{le="' + repr(bound) + '"} ' + str(cumulative_count)
+                )
+            lines.append(metric_name + '_bucket{le="+Inf"} ' + str(histogram.count))
+            lines.append(metric_name + '_sum ' + repr(histogram.sum))
+            lines.append(metric_name + '_count ' + str(histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, filepath):
+        """
+        Writes all metrics in the Prometheus text format to the file,
+        for example for the textfile collector of the node exporter.
+        The file is replaced at once, so a collector never reads a half written file.
+        """
+        temporary_filepath = filepath + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filepath, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(temporary_filepath, filepath)
+
+class DisabledMetricsRegistry(object):
+    """
+    The DisabledMetricsRegistry offers the methods of the MetricsRegistry, but records nothing.
+    It is used while the metrics are disabled, so the instrumentation costs
+    one empty method call per measurement.
+    """
+    enabled = False
+
+    def increment(self, name, amount = 1):
+        pass
+
+    def start_timer(self):
+        return None
+
+    def observe_since(self, name, start_time):
+        pass
+
+    def observe_many(self, name, values):
+        pass
+
+# The registry of the current process. Disabled until enable is called.
+REGISTRY = DisabledMetricsRegistry()
+
+def get_registry():
+    """
+    Returns the registry of the current process.
+    """
+    return REGISTRY
+
+def enable():
+    """
+    Enables the metrics of the current process.
+    Clients, that were created before, keep recording to the disabled registry.
+
+    Returns:
+        The enabled MetricsRegistry.
+    """
+    global REGISTRY
+    if not REGISTRY.enabled:
+        REGISTRY = MetricsRegistry()
+    return REGISTRY
+
+def format_stats_line(counters, histograms, previous_counters = None, elapsed = None):
+    """
+    Formats the metrics as one log line.
+    If the counters of the previous line and the elapsed seconds are given,
+    the rates of the counters are included as well.
+    """
+    parts = []
+    for name, value in counters.items():
+        part = name + '=' + str(value)
+        if previous_counters is not None and elapsed:
+            part += ' (' + format((value - previous_counters[name]) / elapsed, '.1f') + '/s)'
+        parts.append(part)
+    for name, histogram in histograms.items():
+        if not histogram.count:
+            continue
+        p99 = histogram.quantile(0.99)
+        if p99 == float('inf'):
+            p99_text = ' p99>' + format(histogram.buckets[-1] * 1000, 'g') + 'ms'
+        else:
+            p99_text = ' p99<=' + format(p99 * 1000, 'g') + 'ms'
+        parts.append(
+            name[:-len('_seconds')]
+            + ' mean=' + format(histogram.sum / histogram.count * 1000, '.3f') + 'ms'
+            + p99_text
+        )
+    return ' | '.join(parts)
+
+class StatsReporter(object):
+    """
+    The StatsReporter periodically prints a stats line and/or writes
+    a Prometheus text file with the metrics of a registry.
+    """
+    def __init__(self, registry, interval = 10.0, textfile_path = None, log = True):
+        """
+        Params:
+            registry: The enabled MetricsRegistry.
+            interval: The time in seconds between two reports.
+            textfile_path: The file, to which the metrics are written in the Prometheus
+                text format. Disabled if empty or None.
+            log: If True, a stats line is printed with each report.
+        """
+        self._registry = registry
+        self._interval = interval
+        self._textfile_path = textfile_path
+        self._log = log
+        self._previous_counters = None
+        self._previous_time = time.monotonic()
+        self._stopped = threading.Event()
+        self._reporter_thread = threading.Thread(
+            target = self._report_periodically,
+            daemon = True
+        )
+
+    def start(self):
+        self._reporter_thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the periodic reports and writes a last one.
+        """
+        self._stopped.set()
+        if self._reporter_thread.is_alive():
+            self._reporter_thread.join()
+        self.report()
+
+    def report(self):
+        """
+        Prints the stats line and writes the text file once.
+        """
+        if self._log:
+            counters, histograms = self._registry.snapshot()
+            now = time.monotonic()
+            print("Stats:", format_stats_line(
+                counters, histograms, self._previous_counters, now - self._previous_time
+            ))
+            self._previous_counters = counters
+            self._previous_time = now
+        if self._textfile_path:
+            try:
+                self._registry.write_textfile(self._textfile_path)
+            except OSError as e:
+                print("Could not write metrics file", self._textfile_path, ":", e)
+
+    def _report_periodically(self):
+        while not self._stopped.wait(self._interval):
+            self.report()
+
+def start_reporting(interval = 10.0, textfile_path = None):
+    """
+    Enables the metrics of the current process and starts a StatsReporter for them.
+    Does nothing, if interval is not positive and no textfile_path is given.
+
+    Params:
+        interval: The time in seconds between two stats lines. Disabled if 0.
+        textfile_path: The Prometheus text file. Disabled if empty or None.
+
+    Returns:
+        The started StatsReporter or None.
+    """
+    if (not interval or interval <= 0) and not textfile_path:
+        return None
+    return StatsReporter(
+        enable(),
+        interval if interval and interval > 0 else 10.0,
+        textfile_path,
+        log = bool(interval and interval > 0)
+    ).start()
@@ -1,13 +1,22 @@
-import amqpstorm
 import threading
 import time
 
+from pvsimulator import codec
+from pvsimulator import metrics
+from pvsimulator.flowcontrol import FlowController, LagReporter
+from pvsimulator import transports
 from pvsimulator.exceptions import *
 
+CONSUMING_MODES = ('poll', 'push')
+
+# The time in seconds to wait, when there was no message to consume.
+IDLE_WAIT = 0.01
+
 class QueueClient(object):
     """
-    The QueueClient represents a Client, which connects to a single RabbitMQ queue.
+    The QueueClient represents a Client, which connects to a single queue.
     It can be used to publish and/or consume messages on this queue.
+    The queue is reached through a Transport, by default a RabbitMQ instance.
     """
     def __init__(
             self, 
@@ -15,7 +24,17 @@ class QueueClient(object):
             username = 'guest', 
             password = 'guest', 
             queue_name = 'queue',
-            consuming_timeout = 0.25
+            consuming_timeout = 0.25,
+            consuming_mode = 'poll',
+            prefetch_count = 100,
+            consuming_batch_size = 1,
+            transport = 'amqp',
+            metrics_registry = None,
+            group_commit = False,
+            high_watermark = None,
+            low_watermark = None,
+            depth_check_interval = 0.5,
+            lag_report_interval = 0
         ):
         """
         Params:
@@ -23,7 +42,35 @@ class QueueClient(object):
             username: The username, which will be used to login to the RabbitMQ instance.
             password: The password for the user.
             queue_name: The name of the queue, this Client will be connected to.
+            consuming_timeout: The time in seconds to idle between each queue access.
+                Only used in the 'poll' consuming mode.
+            consuming_mode: How messages are consumed. Either 'poll', which fetches
+                one message per broker round trip, or 'push', which lets the broker
+                deliver messages to a subscribed consumer.
+            prefetch_count: The maximum amount of unacknowledged messages the broker
+                delivers in advance. Only used in the 'push' consuming mode.
+            consuming_batch_size: If greater than 1, received messages are collected
+                and handed to _on_message_batch_received_callback in batches of up to this size.
+            transport: The Transport used to reach the queue, or the name of one
+                ('amqp' for RabbitMQ, 'memory' for the in-process broker, 'shm' for a shared memory ring).
+            metrics_registry: The registry, to which the client reports its metrics.
+                Defaults to the registry of the process, see pvsimulator.metrics.
+            group_commit: If True, processed messages are not acknowledged right away.
+                They are acknowledged together with one cumulative acknowledgement,
+                once a child-class calls _commit_acknowledgements, for example after its output is on disk.
+            high_watermark: If given, publishing pauses, once the queue holds this many messages.
+                See pvsimulator.flowcontrol.FlowController.
+            low_watermark: The depth of the queue, at which paused publishing resumes.
+                Defaults to half the high watermark.
+            depth_check_interval: The time in seconds between two checks of the depth of the queue.
+            lag_report_interval: If greater than 0, the consumer reports every this many seconds,
+                how far it is behind. See pvsimulator.flowcontrol.LagReporter.
         """
+        if consuming_mode not in CONSUMING_MODES:
+            raise ValueError(
+                "Unknown consuming mode: '" + str(consuming_mode) + "'!"
+            )
+
         self._host = host
         self._queue_name = queue_name
         self._username = username
@@ -34,47 +81,58 @@ class QueueClient(object):
         self._should_consume = False
         self._consumer_thread = None
         self._consuming_timeout = consuming_timeout
-        
+        self._consuming_mode = consuming_mode
+        self._prefetch_count = prefetch_count
+        self._consuming_batch_size = consuming_batch_size
+        self._pending_message_bodies = []
+        self._pending_delivery_tags = []
+        self._group_commit = group_commit
+        self._uncommitted_delivery_tag = None
+        self._uncommitted_count = 0
+
+        if isinstance(transport, str):
+            transport = transports.create_transport(
+                transport, host, username, password
+            )
+        self._transport = transport
+        self._metrics = metrics_registry or metrics.get_registry()
+
+        self.flow_controller = None
+        if high_watermark:
+            self.flow_controller = FlowController(
+                self.queue_depth,
+                high_watermark,
+                low_watermark,
+                depth_check_interval
+            )
+        self.lag_reporter = None
+        if lag_report_interval > 0:
+            self.lag_reporter = LagReporter(
+                self.queue_depth,
+                lag_report_interval
+            )
+
     def connect(self):
         """
         Try to connect the client to its queue.
 
         Raises:
-            PVConnectionError if the connection to the RabbitMQ instance failed.
+            PVConnectionError if the connection to the broker failed.
             PVQueueConnectionError if the connection to the designated queue failed.
         """
-        try:
-            self._connection = amqpstorm.Connection(
-                self._host,
-                self._username,
-                self._password
-            )
-        except amqpstorm.AMQPConnectionError as e:
-            print(e)
-            raise PVConnectionError(
-                "Could not connect to RabbitMQ Service"
-            )
-
-        try:
-            self._channel = self._connection.channel()
-            self._channel.queue.declare(
-                self._queue_name
-            )
-        except amqpstorm.AMQPConnectionError as e:
-            print(e)
-            raise PVQueueConnectionError(
-                "Could not connect to Queue: ", self._queue_name
-            )
-        
+        self._transport.connect()
+        self._transport.declare_queue(self._queue_name)
         self.connected = True
 
         
-    def publish_message(self, message_body):
+    def publish_message(self, message_body, content_type = codec.JSON_CONTENT_TYPE):
         """
         Publish a message to the queue.
 
         Param:
-            message_body: The message, that should be published as plain text.
+            message_body: The message, that should be published.
+            content_type: The content type of the message body.
+                Plain text by default, see pvsimulator.codec for the binary encoding.
 
         Raises:
             PVNotConnectedError if the Client is not connected properly.
@@ -84,21 +142,55 @@ class QueueClient(object):
             raise PVNotConnectedError(
                 "Cannot publish message! Client is not connected!"
             )
-        
-        message = amqpstorm.Message.create(
-            self._channel,
-            message_body,
-            properties = {
-                'content_type': 'text/plain'
-            }
-        )
+        self._wait_for_flow_control(1)
+
+        start_time = self._metrics.start_timer()
         try:
-            message.publish(self._queue_name)
-        except amqpstorm.exception.AMQPInvalidArgument as e:
-            print(e)
-            raise PVMessagePublishingError(
-                "Could not publish message: '", message_body, "'!"
+            self._transport.publish(
+                self._queue_name,
+                message_body,
+                content_type
             )
+        except Exception:
+            self._metrics.increment('messages_failed')
+            raise
+        self._metrics.observe_since('publish_seconds', start_time)
+        self._metrics.increment('messages_published')
+
+    def publish_batch(self, message_bodies, confirm = False, content_type = codec.JSON_CONTENT_TYPE):
+        """
+        Publish multiple messages to the queue at once.
+        The messages are written to the channel without waiting for the broker in between.
+
+        Params:
+            message_bodies: A list of messages, that should be published.
+            confirm: If True, the broker confirms the whole batch at once,
+                before this method returns.
+            content_type: The content type of all message bodies.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+            PVMessagePublishingError if the batch could not be published.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "Cannot publish batch! Client is not connected!"
+            )
+        self._wait_for_flow_control(len(message_bodies))
+
+        start_time = self._metrics.start_timer()
+        try:
+            self._transport.publish_batch(
+                self._queue_name,
+                message_bodies,
+                content_type,
+                confirm = confirm
+            )
+        except Exception:
+            self._metrics.increment('messages_failed', len(message_bodies))
+            raise
+        self._metrics.observe_since('publish_seconds', start_time)
+        self._metrics.increment('messages_published', len(message_bodies))
 
     def purge_queue(self):
         """
@@ -112,8 +204,45 @@ class QueueClient(object):
                 "The client is not properly connected to the RabbitMQ service!"
             )
         
-        self._channel.queue.purge(self._queue_name)
-    
+        self._transport.purge(self._queue_name)
+
+    def queue_depth(self):
+        """
+        Returns the amount of messages, that are waiting in the queue.
+        On RabbitMQ, the depth is checked with a passive queue.declare.
+
+        Raises:
+            PVNotConnectedError if the Client is not connected properly.
+            PVQueueConnectionError if the depth could not be checked.
+        """
+        if not self.connected:
+            raise PVNotConnectedError(
+                "The client is not properly connected to the RabbitMQ service!"
+            )
+
+        return self._transport.queue_depth(self._queue_name)
+
+    def _wait_for_flow_control(self, message_count):
+        """
+        Blocks, while publishing is paused by the flow controller.
+        """
+        if self.flow_controller is None:
+            return
+        pause_count = self.flow_controller.pause_count
+        self.flow_controller.wait(message_count)
+        if self.flow_controller.pause_count > pause_count:
+            self._metrics.increment('publish_pauses')
+
+    def close(self):
+        """
+        Close the connection to the broker.
+        Delivered, but unacknowledged messages are handed back to the queue.
+        """
+        if not self.connected:
+            return
+        self._transport.close()
+        self.connected = False
+
     def start_consuming_blocking(self):
         """
         Start to consume messages while blocking the thread doing it.
@@ -169,8 +298,9 @@ class QueueClient(object):
             return False
         
         self._should_consume = False
-        if self._consumer_thread:
-            if self._consumer_thread.is_alive:
+        # The consumer itself may stop consuming from within a callback
+        if self._consumer_thread and self._consumer_thread is not threading.current_thread():
+            if self._consumer_thread.is_alive():
                 self._consumer_thread.join()
         
         return True
@@ -181,20 +311,253 @@ class QueueClient(object):
         Runs, while the value of self._should_consume is true.
         """
         self._consuming = True
-        while self._should_consume:
-            result = self._channel.basic.get(
-                queue = self._queue_name, 
-                no_ack = False
-            )
-            if result:
+        try:
+            if self._consuming_mode == 'push':
+                self._consume_push()
+            else:
+                self._consume_poll()
+        finally:
+            self._consuming = False
+
+    def _consume_poll(self):
+        """
+        Fetches one message per broker round trip with basic.get.
+        """
+        try:
+            while self._should_consume:
+                delivery = self._transport.get(self._queue_name)
+                if delivery:
+                    self._on_message_fetched(
+                        self._decode_message_body(delivery),
+                        delivery.delivery_tag
+                    )
+                    if self._pending_message_bodies:
+                        # Keep on fetching until the batch is full
+                        continue
+                    self._report_lag_if_due()
+                    time.sleep(self._consuming_timeout)
+                else:
+                    self._process_pending_messages()
+                    self._on_idle()
+                    self._report_lag_if_due()
+                    time.sleep(max(self._consuming_timeout, IDLE_WAIT))
+        finally:
+            self._on_consuming_stopped()
+            self._requeue_pending_messages()
+
+    def _consume_push(self):
+        """
+        Subscribes to the queue and lets the broker push
+        up to prefetch_count unacknowledged messages in advance.
+        """
+        consumer_tag = self._transport.consume(
+            self._queue_name,
+            self._on_message_delivered,
+            self._prefetch_count
+        )
+        try:
+            while self._should_consume:
+                # Returns, once all delivered messages were processed.
+                # Idles for a short time, if there were none.
+                self._transport.process_events()
+                # Do not let an incomplete batch wait for more messages
+                self._process_pending_messages()
+                self._on_idle()
+                self._report_lag_if_due()
+        finally:
+            self._on_consuming_stopped()
+            self._requeue_pending_messages()
+            # Hands prefetched but unprocessed messages back to the queue
+            self._transport.cancel(consumer_tag)
+
+    def _on_message_delivered(self, delivery):
+        """
+        Gets called by the transport for each message pushed by the broker.
+        """
+        if not self._should_consume:
+            self._transport.nack(delivery.delivery_tag, requeue = True)
+            return
+
+        self._on_message_fetched(
+            self._decode_message_body(delivery),
+            delivery.delivery_tag
+        )
+
+    def _decode_message_body(self, delivery):
+        """
+        Returns the body of a received message.
+        Plain text bodies are decoded to a string, binary bodies are returned as bytes.
+        """
+        if codec.is_text_content_type(delivery.content_type) and \
+                isinstance(delivery.body, bytes):
+            return delivery.body.decode('utf-8')
+        return delivery.body
+
+    def _on_message_fetched(self, message_body, delivery_tag):
+        """
+        Hands a received message to the consumer callbacks.
+        Single messages are acknowledged right away, batched messages
+        are collected, until the batch is full.
+        """
+        self._metrics.increment('messages_consumed')
+        if self.lag_reporter:
+            self.lag_reporter.observe(1)
+        if self._consuming_batch_size <= 1:
+            try:
                 self._on_message_received_callback(
-                    result.body
-                )
-                self._channel.basic.ack(
-                    result.method['delivery_tag']
+                    message_body
                 )
-                time.sleep(self._consuming_timeout)
-        self._consuming = False
+            except Exception:
+                self._metrics.increment('messages_failed')
+                raise
+            self._acknowledge(delivery_tag)
+            return
+
+        self._pending_message_bodies.append(message_body)
+        self._pending_delivery_tags.append(delivery_tag)
+        if len(self._pending_message_bodies) >= self._consuming_batch_size:
+            self._process_pending_messages()
+
+    def _process_pending_messages(self):
+        """
+        Hands all collected messages as one batch to the consumer.
+        """
+        if not self._pending_message_bodies:
+            return
+        message_bodies = self._pending_message_bodies
+        delivery_tags = self._pending_delivery_tags
+        self._pending_message_bodies = []
+        self._pending_delivery_tags = []
+        try:
+            self._on_message_batch_received_callback(
+                message_bodies,
+                delivery_tags
+            )
+        except Exception:
+            self._metrics.increment('messages_failed', len(message_bodies))
+            raise
+
+    def _report_lag_if_due(self):
+        """
+        Lets the lag reporter report, between the processing of messages.
+        """
+        if self.lag_reporter:
+            self.lag_reporter.report_if_due()
+
+    def _requeue_pending_messages(self):
+        """
+        Hands collected, but not yet processed messages back to the queue.
+        """
+        if not self._pending_delivery_tags:
+            return
+        self._requeue(self._pending_delivery_tags)
+        self._pending_message_bodies = []
+        self._pending_delivery_tags = []
+
+    def _acknowledge(self, delivery_tag, multiple = False, message_count = 1):
+        """
+        Acknowledges a message.
+        If multiple is True, all unacknowledged messages up to the delivery tag are acknowledged as well.
+        The message_count is the amount of acknowledged messages, as reported to the metrics.
+        With group_commit, the acknowledgement is deferred until _commit_acknowledgements is called.
+        """
+        if self._group_commit:
+            self._uncommitted_delivery_tag = delivery_tag
+            self._uncommitted_count += message_count
+            return
+        start_time = self._metrics.start_timer()
+        self._transport.ack(
+            delivery_tag,
+            multiple = multiple
+        )
+        self._metrics.observe_since('ack_seconds', start_time)
+        self._metrics.increment('messages_acked', message_count)
+
+    def _settle_batch(self, delivery_tags, processed_count):
+        """
+        Acknowledges the first processed_count messages of a batch with
+        one cumulative acknowledgement and hands the rest back to the queue.
+
+        Params:
+            delivery_tags: The delivery tags of the batch.
+            processed_count: The amount of messages, that were processed.
+        """
+        if processed_count > 0:
+            self._acknowledge(
+                delivery_tags[processed_count - 1],
+                multiple = True,
+                message_count = processed_count
+            )
+        if processed_count < len(delivery_tags):
+            self._requeue(delivery_tags[processed_count:])
+
+    def _requeue(self, delivery_tags):
+        """
+        Hands the messages with the delivery tags back to the queue.
+        The delivery tags have to be the latest, unsettled ones.
+        """
+        if not self._group_commit:
+            # One cumulative rejection covers all of them
+            self._transport.nack(delivery_tags[-1], multiple = True, requeue = True)
+            return
+        # A cumulative rejection would also cover the processed, but uncommitted messages
+        for delivery_tag in delivery_tags:
+            self._transport.nack(delivery_tag, requeue = True)
+
+    def _commit_acknowledgements(self):
+        """
+        Acknowledges all processed messages, whose acknowledgement was deferred by group_commit,
+        with one cumulative acknowledgement.
+        """
+        if self._uncommitted_delivery_tag is None:
+            return
+        delivery_tag = self._uncommitted_delivery_tag
+        message_count = self._uncommitted_count
+        self._uncommitted_delivery_tag = None
+        self._uncommitted_count = 0
+
+        start_time = self._metrics.start_timer()
+        self._transport.ack(delivery_tag, multiple = True)
+        self._metrics.observe_since('ack_seconds', start_time)
+        self._metrics.increment('messages_acked', message_count)
+
+    def _on_message_batch_received_callback(self, message_bodies, delivery_tags):
+        """
+        Gets called with a batch of received messages, if consuming_batch_size is greater than 1.
+        Child-classes can implement it to process many messages at once.
+        Implementations are responsible for settling the batch, for example with
+        self._settle_batch(delivery_tags, len(delivery_tags)).
+
+        The default implementation passes the messages one by one
+        to _on_message_received_callback and acknowledges them once.
+
+        Params:
+            message_bodies: The list of messages, that were received.
+                In plain text or as bytes for binary content types.
+            delivery_tags: The delivery tags of the messages.
+        """
+        processed_count = 0
+        for message_body in message_bodies:
+            if not self._should_consume:
+                break
+            self._on_message_received_callback(message_body)
+            processed_count += 1
+        self._settle_batch(delivery_tags, processed_count)
+
+    def _on_idle(self):
+        """
+        Gets called while consuming, whenever no more messages are waiting to be processed.
+        Child-classes can implement it to do periodic work, like flushing their output.
+        """
+        pass
+
+    def _on_consuming_stopped(self):
+        """
+        Gets called once the consumption stops, before unprocessed messages are handed back to the queue.
+        Child-classes, that use group_commit, can implement it to make their output durable
+        and call _commit_acknowledgements one last time.
+        """
+        pass
 
     def _on_message_received_callback(self, message_body):
         """
@@ -203,8 +566,109 @@ class QueueClient(object):
         It gets called when a message was received.
 
         Param:
-            message_body: The message, that was received. In plain text.
+            message_body: The message, that was received.
+                In plain text or as bytes for binary content types.
         """
         raise NotImplementedError(
             "_on_message_received_callback not implemented!"
         )
+
+
+class BufferedPublisher(object):
+    """
+    The BufferedPublisher collects messages and publishes them in batches
+    through a connected QueueClient.
+    It offers the same publish_message method as the QueueClient, so both can be used interchangeably.
+    A batch is published, once it contains max_batch_size messages,
+    and in any case every max_delay seconds.
+    """
+    def __init__(
+            self,
+            queue_client,
+            max_batch_size = 1000,
+            max_delay = 0.5,
+            confirm = False,
+            content_type = codec.JSON_CONTENT_TYPE
+        ):
+        """
+        Params:
+            queue_client: The connected QueueClient, which publishes the batches.
+            max_batch_size: The amount of messages, after which a batch gets published.
+            max_delay: The time in seconds, after which a batch gets published,
+                even if it is not full yet. Disabled if None.
+            confirm: If True, each batch is confirmed by the broker as a whole.
+            content_type: The content type of all published messages.
+        """
+        self._queue_client = queue_client
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._confirm = confirm
+        self._content_type = content_type
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher_thread = None
+
+        if self._max_delay:
+            self._flusher_thread = threading.Thread(
+                target = self._flush_periodically,
+                daemon = True
+            )
+            self._flusher_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    def publish_message(self, message_body):
+        """
+        Add a message to the current batch.
+        Publishes the batch, if it is full.
+
+        Param:
+            message_body: The message, that should be published.
+        """
+        with self._buffer_lock:
+            self._buffer.append(message_body)
+            if len(self._buffer) >= self._max_batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """
+        Publish all buffered messages.
+        """
+        with self._buffer_lock:
+            self._flush_locked()
+
+    def close(self):
+        """
+        Publish all buffered messages and stop the time-based flushing.
+        """
+        self._closed.set()
+        if self._flusher_thread:
+            self._flusher_thread.join()
+        self.flush()
+
+    def _flush_locked(self):
+        """
+        Publish the buffered messages. Expects the buffer lock to be held.
+        """
+        if not self._buffer:
+            return
+        batch = self._buffer
+        self._buffer = []
+        self._queue_client.publish_batch(
+            batch,
+            confirm = self._confirm,
+            content_type = self._content_type
+        )
+
+    def _flush_periodically(self):
+        """
+        Flushes the buffer every max_delay seconds, until the publisher is closed.
+        """
+        while not self._closed.wait(self._max_delay):
+            self.flush()
@@ -0,0 +1,88 @@
+import time
+
+
+class RateController(object):
+    """
+    The RateController paces a loop to a target rate of messages per second.
+    Each message has a fixed deadline (start + index / rate), so the time spent between
+    two waits never adds up to a drift. If the loop falls behind, all overdue
+    messages are released at once, so it catches up without sleeping.
+    """
+    def __init__(self, rate, max_burst = 1000, clock = time.perf_counter, sleep = time.sleep):
+        """
+        Params:
+            rate: The target amount of messages per second. May be fractional.
+            max_burst: The maximum amount of messages, that are released by one call of wait.
+            clock: A monotonic clock in seconds.
+            sleep: The function to sleep a given amount of seconds.
+        """
+        if rate <= 0:
+            raise ValueError(
+                "The rate has to be greater than 0!"
+            )
+        self.rate = rate
+        self._max_burst = max(int(max_burst), 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._start_time = None
+        self.released_count = 0
+
+    def wait(self):
+        """
+        Waits until the next message is due.
+
+        Returns:
+            The amount of messages, that are due now. At least 1.
+        """
+        if self._start_time is None:
+            self._start_time = self._clock()
+            self.released_count = 1
+            return 1
+
+        next_deadline = self._start_time + self.released_count / self.rate
+        now = self._clock()
+        if now < next_deadline:
+            self._sleep(next_deadline - now)
+            now = self._clock()
+
+        # All messages, whose deadline has passed
+        due_count = int((now - self._start_time) * self.rate) + 1 - self.released_count
+        due_count = min(max(due_count, 1), self._max_burst)
+        self.released_count += due_count
+        return due_count
+
+    def elapsed(self):
+        """
+        Returns the seconds since the first message was released.
+        """
+        if self._start_time is None:
+            return 0.0
+        return self._clock() - self._start_time
+
+    def achieved_rate(self):
+        """
+        Returns the average rate of the released messages so far.
+        """
+        elapsed = self.elapsed()
+        if not elapsed:
+            return 0.0
+        return self.released_count / elapsed
+
+    def backlog(self):
+        """
+        Returns the amount of messages, whose deadline has passed, but which were not released yet.
+        """
+        if self._start_time is None:
+            return 0
+        return max(int(self.elapsed() * self.rate) + 1 - self.released_count, 0)
+
+    def format_report(self):
+        """
+        Returns a line, that compares the achieved with the target rate.
+        """
+        return (
+            "Target rate: " + format(self.rate, '.1f') + " msg/s"
+            + " | achieved: " + format(self.achieved_rate(), '.1f') + " msg/s"
+            + " | released: " + str(self.released_count)
+            + " | behind: " + str(self.backlog())
+        )
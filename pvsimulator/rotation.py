@@ -0,0 +1,412 @@
+import concurrent.futures
+import gzip
+import json
+import lzma
+import os
+import shutil
+import threading
+import time
+
+import numpy
+
+from pvsimulator import filewriter
+
+# The compressions of closed segments and the file extension, each of them adds
+COMPRESSIONS = {
+    'gzip': '.gz',
+    'lzma': '.xz'
+}
+
+# The named rotation intervals in seconds
+ROTATION_INTERVALS = {
+    'hour': 3600,
+    'day': 86400
+}
+
+# The amount of bytes, that are compressed at once
+COMPRESSION_CHUNK_SIZE = 1024 * 1024
+
+
+class RotatingWriter(object):
+    """
+    The RotatingWriter splits the output into segments next to the output file,
+    for example 'output-20090709.csv' for 'output.csv' and daily segments.
+    A new segment is started, once a sample of a later time window arrives (rotate_seconds,
+    aligned to the epoch by the sample timestamps) or the segment reached rotate_bytes.
+    Samples of a window, whose segment was already closed, go to the current segment.
+
+    Closed segments are compressed on a background thread, so the compression never stalls the writer.
+    The manifest next to the output file (see manifest_filepath) lists all segments
+    with their actual time ranges, see read_manifest and find_segments.
+    It offers the same methods as the BufferedFileWriter.
+    """
+    def __init__(
+            self,
+            filepath,
+            output_format = 'csv',
+            rotate_seconds = None,
+            rotate_bytes = None,
+            compression = None,
+            **writer_arguments
+        ):
+        """
+        Params:
+            filepath: The output file, after which the segments and the manifest are named.
+                The file itself is not written.
+            output_format: Either 'csv' or 'binary', see filewriter.create_writer.
+            rotate_seconds: The length of the time window of a segment in seconds. Disabled if None.
+            rotate_bytes: The size in bytes, after which a segment is closed. Disabled if None.
+            compression: Either 'gzip' or 'lzma' to compress closed segments, or None to keep them as they are.
+            writer_arguments: Passed on to the writer of each segment, for example flush_rows or on_flush.
+        """
+        if not rotate_seconds and not rotate_bytes:
+            raise ValueError(
+                "Either the time window or the size of a segment is required!"
+            )
+        if output_format not in filewriter.OUTPUT_FORMATS:
+            raise ValueError(
+                "Unknown output format: '" + str(output_format) + "'!"
+            )
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(
+                "Unknown compression: '" + str(compression) + "'!"
+            )
+        self._root, self._extension = os.path.splitext(filepath)
+        self._directory = os.path.dirname(os.path.abspath(filepath))
+        self._manifest_filepath = manifest_filepath(filepath)
+        self._output_format = output_format
+        self._rotate_seconds = rotate_seconds
+        self._rotate_bytes = rotate_bytes
+        self._compression = compression
+        self._writer_arguments = writer_arguments
+
+        self._writer = None
+        self._segment = None
+        self._window = None
+        self._closed = False
+        # Guards the segments, since the compression thread updates them as well
+        self._lock = threading.Lock()
+        self._compressor = None
+        self._compression_futures = []
+        if compression:
+            self._compressor = concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix = 'segment-compression'
+            )
+        self.segments = read_manifest(filepath)
+        self._recover_segments()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def write_row(self, row):
+        self.write_rows([row])
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self._write(
+            [row[0] for row in rows],
+            lambda start, stop: self._writer.write_rows(rows[start:stop])
+        )
+
+    def write_columns(self, *columns):
+        columns = [numpy.asarray(column) for column in columns]
+        if not len(columns[0]):
+            return
+        self._write(
+            columns[0],
+            lambda start, stop: self._writer.write_columns(*[column[start:stop] for column in columns])
+        )
+
+    def flush_if_due(self):
+        if self._writer:
+            self._writer.flush_if_due()
+
+    def flush(self):
+        if self._writer:
+            self._writer.flush()
+
+    def close(self):
+        """
+        Closes the current segment and waits, until all closed segments are compressed.
+
+        Raises:
+            The first error of a failed compression. The failed segments are kept uncompressed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._close_segment()
+        if self._compressor:
+            self._compressor.shutdown(wait = True)
+            for future in self._compression_futures:
+                future.result()
+
+    def _write(self, timestamps, write_range):
+        """
+        Writes the rows in runs of the same time window and rotates the segment in between.
+
+        Params:
+            timestamps: The timestamps of the rows.
+            write_range: A function, which writes the rows from start to stop to self._writer.
+        """
+        timestamps = numpy.asarray(timestamps)
+        starts = [0]
+        if self._rotate_seconds:
+            windows = numpy.floor_divide(timestamps, self._rotate_seconds).astype(numpy.int64)
+            starts += (numpy.flatnonzero(numpy.diff(windows)) + 1).tolist()
+        stops = starts[1:] + [len(timestamps)]
+
+        for start, stop in zip(starts, stops):
+            if self._writer is not None and self._rotate_seconds and windows[start] > self._window:
+                self._close_segment()
+            if self._writer is None:
+                self._open_segment(timestamps[start].item())
+            write_range(start, stop)
+
+            run_timestamps = timestamps[start:stop]
+            first_timestamp = run_timestamps.min().item()
+            last_timestamp = run_timestamps.max().item()
+            if self._segment['first_timestamp'] is None or first_timestamp < self._segment['first_timestamp']:
+                self._segment['first_timestamp'] = first_timestamp
+            if self._segment['last_timestamp'] is None or last_timestamp > self._segment['last_timestamp']:
+                self._segment['last_timestamp'] = last_timestamp
+            self._segment['row_count'] += stop - start
+
+            if self._rotate_bytes and self._writer.size >= self._rotate_bytes:
+                self._close_segment()
+
+    def _open_segment(self, timestamp):
+        """
+        Starts a new segment with the sample at the timestamp.
+        """
+        if self._rotate_seconds:
+            self._window = int(timestamp // self._rotate_seconds)
+            label = segment_label(self._window * self._rotate_seconds, self._rotate_seconds)
+        else:
+            label = segment_label(int(timestamp), 1)
+
+        # A restart or a size rotation may start a segment with an already used label
+        used_filepaths = set(_uncompressed_filepath(segment) for segment in self.segments)
+        filename = os.path.basename(self._root) + '-' + label
+        part = 0
+        while _part_filename(filename, part, self._extension) in used_filepaths:
+            part += 1
+        segment_filename = _part_filename(filename, part, self._extension)
+
+        self._writer = filewriter.create_writer(
+            os.path.join(self._directory, segment_filename),
+            self._output_format,
+            **self._writer_arguments
+        )
+        self._segment = {
+            'filepath': segment_filename,
+            'first_timestamp': None,
+            'last_timestamp': None,
+            'row_count': 0,
+            'closed': False,
+            'compression': None
+        }
+        with self._lock:
+            self.segments.append(self._segment)
+            self._write_manifest_locked()
+
+    def _close_segment(self):
+        """
+        Closes the current segment and hands it to the compression thread.
+        """
+        if self._writer is None:
+            return
+        self._writer.close()
+        segment = self._segment
+        self._writer = None
+        self._segment = None
+        with self._lock:
+            segment['closed'] = True
+            self._write_manifest_locked()
+        if self._compressor:
+            self._submit_compression(segment)
+
+    def _submit_compression(self, segment):
+        """
+        Hands a closed segment to the compression thread.
+        The errors of the compressions are raised by close.
+        """
+        self._compression_futures.append(
+            self._compressor.submit(self._compress_segment, segment)
+        )
+
+    def _compress_segment(self, segment):
+        """
+        Compresses a closed segment. Runs on the compression thread.
+        If the compression fails, the segment is kept uncompressed and the error is raised.
+        The manifest lists the compressed file, before the uncompressed one is removed,
+        so it never lists a removed file. The recovery removes an uncompressed file left behind.
+        """
+        segment_filepath = os.path.join(self._directory, segment['filepath'])
+        compressed_filepath = compress_file(segment_filepath, self._compression, remove_original = False)
+        with self._lock:
+            segment['filepath'] = os.path.basename(compressed_filepath)
+            segment['compression'] = self._compression
+            self._write_manifest_locked()
+        os.remove(segment_filepath)
+
+    def _recover_segments(self):
+        """
+        Repairs the segments, that a previous run left behind, when it stopped without closing them.
+        Segments, that were still open, are closed. Their time range is read from the segment,
+        since it was only recorded once they were closed.
+        Of a compressed segment, the uncompressed file is removed, if it is still there.
+        Uncompressed segments are compressed, if a compression is configured.
+        """
+        for segment in self.segments:
+            segment_filepath = os.path.join(self._directory, _uncompressed_filepath(segment))
+            for extension in COMPRESSIONS.values():
+                # A compression, that was interrupted, left its temporary file behind
+                if os.path.exists(segment_filepath + extension + '.tmp'):
+                    os.remove(segment_filepath + extension + '.tmp')
+            if segment['closed']:
+                if segment['compression'] is not None and os.path.exists(segment_filepath):
+                    os.remove(segment_filepath)
+                elif self._compressor and segment['compression'] is None and os.path.exists(segment_filepath):
+                    self._submit_compression(segment)
+                continue
+            if os.path.exists(segment_filepath):
+                timestamps = read_segment_timestamps(segment_filepath, self._output_format)
+                segment['row_count'] = len(timestamps)
+                if len(timestamps):
+                    segment['first_timestamp'] = timestamps.min().item()
+                    segment['last_timestamp'] = timestamps.max().item()
+            segment['closed'] = True
+            if self._compressor and os.path.exists(segment_filepath):
+                self._submit_compression(segment)
+        with self._lock:
+            self._write_manifest_locked()
+
+    def _write_manifest_locked(self):
+        """
+        Replaces the manifest at once, so a reader never reads a half written one.
+        Expects the lock to be held.
+        """
+        temporary_filepath = self._manifest_filepath + '.tmp'
+        with open(temporary_filepath, 'w') as f:
+            json.dump({'output_format': self._output_format, 'segments': self.segments}, f, indent = 2)
+        os.replace(temporary_filepath, self._manifest_filepath)
+
+def _uncompressed_filepath(segment):
+    if segment['compression'] is None:
+        return segment['filepath']
+    return segment['filepath'][:-len(COMPRESSIONS[segment['compression']])]
+
+def _part_filename(filename, part, extension):
+    if part == 0:
+        return filename + extension
+    return filename + '-' + str(part) + extension
+
+def segment_label(window_start, rotate_seconds):
+    """
+    Returns the label of a segment, that starts at a timestamp, in UTC.
+    It is as precise as the rotation interval requires, for example '20090709' for daily segments.
+    """
+    if rotate_seconds % 86400 == 0:
+        time_format = '%Y%m%d'
+    elif rotate_seconds % 3600 == 0:
+        time_format = '%Y%m%dT%H'
+    elif rotate_seconds % 60 == 0:
+        time_format = '%Y%m%dT%H%M'
+    else:
+        time_format = '%Y%m%dT%H%M%S'
+    return time.strftime(time_format, time.gmtime(window_start))
+
+def manifest_filepath(filepath):
+    """
+    Returns the manifest of the segments of an output file, for example 'output-manifest.json' for 'output.csv'.
+    """
+    return os.path.splitext(filepath)[0] + '-manifest.json'
+
+def read_manifest(filepath):
+    """
+    Returns the segments of an output file as listed in its manifest,
+    or an empty list, if there is none.
+    Each segment is a dictionary with the 'filepath' relative to the output file,
+    the 'first_timestamp' and 'last_timestamp' of its rows, the 'row_count',
+    whether it is 'closed' and its 'compression' (None if uncompressed).
+    """
+    try:
+        with open(manifest_filepath(filepath)) as f:
+            return json.load(f)['segments']
+    except FileNotFoundError:
+        return []
+
+def find_segments(filepath, start, stop):
+    """
+    Returns the paths of the segments of an output file, that contain rows with a timestamp in [start, stop).
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    return [
+        os.path.join(directory, segment['filepath'])
+        for segment in read_manifest(filepath)
+        if segment['row_count'] and segment['first_timestamp'] < stop and segment['last_timestamp'] >= start
+    ]
+
+def compress_file(filepath, compression, remove_original = True):
+    """
+    Compresses a file with 'gzip' or 'lzma' and deletes the original,
+    once the compressed file is on disk.
+    The compressed file only appears, once it is complete.
+
+    Params:
+        filepath: The path of the file to compress.
+        compression: Either 'gzip' or 'lzma'.
+        remove_original: If False, the original is kept and has to be removed by the caller.
+
+    Returns:
+        The path of the compressed file, for example 'output-20090709.csv.gz'.
+    """
+    compressed_filepath = filepath + COMPRESSIONS[compression]
+    temporary_filepath = compressed_filepath + '.tmp'
+    try:
+        with open(filepath, 'rb') as source, open(temporary_filepath, 'wb') as target:
+            if compression == 'gzip':
+                compressed_target = gzip.GzipFile(fileobj = target, mode = 'wb', compresslevel = 6)
+            else:
+                compressed_target = lzma.LZMAFile(target, 'wb')
+            with compressed_target:
+                shutil.copyfileobj(source, compressed_target, COMPRESSION_CHUNK_SIZE)
+            target.flush()
+            os.fsync(target.fileno())
+    except BaseException:
+        if os.path.exists(temporary_filepath):
+            os.remove(temporary_filepath)
+        raise
+    os.replace(temporary_filepath, compressed_filepath)
+    if remove_original:
+        os.remove(filepath)
+    return compressed_filepath
+
+def open_segment(filepath):
+    """
+    Opens a segment for reading in binary mode, compressed or not.
+    """
+    if filepath.endswith(COMPRESSIONS['gzip']):
+        return gzip.open(filepath, 'rb')
+    if filepath.endswith(COMPRESSIONS['lzma']):
+        return lzma.open(filepath, 'rb')
+    return open(filepath, 'rb')
+
+def read_segment_timestamps(filepath, output_format = 'csv'):
+    """
+    Returns the timestamps of the rows of an uncompressed segment.
+    """
+    if output_format == 'binary':
+        return numpy.array(filewriter.read_binary_output(filepath)['timestamp'])
+    with open(filepath) as f:
+        return numpy.array([float(line.split(',', 1)[0]) for line in f if line.strip()])
@@ -0,0 +1,226 @@
+import click
+import concurrent.futures
+import os
+import sys
+import time
+
+from pvsimulator.simulations import configuration
+from pvsimulator.simulations import noise
+from pvsimulator.simulations import pipeline
+
+SECONDS_PER_DAY = 86400
+
+# The file extension of the partitions per output format
+PARTITION_EXTENSIONS = {
+    'csv': '.csv',
+    'binary': '.bin'
+}
+
+# The file in the output directory, which holds the seed of its partitions
+SEED_FILENAME = 'seed'
+
+
+def split_into_days(start, stop):
+    '''
+    Splits the time range [start, stop) at each UTC midnight.
+
+    Returns:
+        A list of (chunk_start, chunk_stop) tuples, one per touched day.
+    '''
+    chunks = []
+    chunk_start = start
+    while chunk_start < stop:
+        next_midnight = chunk_start - chunk_start % SECONDS_PER_DAY + SECONDS_PER_DAY
+        chunk_stop = min(next_midnight, stop)
+        chunks.append((chunk_start, chunk_stop))
+        chunk_start = chunk_stop
+    return chunks
+
+def resolve_seed(output_directory, seed = None):
+    '''
+    Returns the seed of the partitions in the output directory.
+    The seed of the first backfill is written to the SEED_FILENAME file of the directory,
+    so a restart continues the same noise, even if it picks no seed.
+
+    Params:
+        output_directory: The directory of the partitions.
+        seed: An optional seed. Defaults to the stored, then to the configured seed, see noise.get_seed.
+
+    Raises:
+        ValueError if the given or configured seed does not match the stored one.
+    '''
+    seed_filepath = os.path.join(output_directory, SEED_FILENAME)
+    if seed is None or seed == '':
+        seed = configuration.CONFIGURATION.get('seed')
+
+    if os.path.exists(seed_filepath):
+        with open(seed_filepath) as f:
+            stored_seed = int(f.read())
+        if seed is not None and seed != '' and int(seed) != stored_seed:
+            raise ValueError(
+                "The partitions in '" + output_directory + "' use the seed " + str(stored_seed) +
+                ", restart the backfill with it instead of " + str(seed) + "!"
+            )
+        return stored_seed
+
+    seed = noise.get_seed(seed)
+    os.makedirs(output_directory, exist_ok = True)
+    with open(seed_filepath + '.part', 'w') as f:
+        f.write(str(seed) + '\n')
+    os.replace(seed_filepath + '.part', seed_filepath)
+    return seed
+
+def partition_filepath(output_directory, chunk_start, chunk_stop, output_format = 'csv'):
+    '''
+    Returns the path of the output partition for a chunk.
+    Whole days are named after their date, for example '2009-07-09.csv'.
+    Partial days also contain their time range, for example '2009-07-09T060000-120000.csv'.
+    '''
+    name = time.strftime('%Y-%m-%d', time.gmtime(chunk_start))
+    if chunk_start % SECONDS_PER_DAY != 0 or chunk_stop - chunk_start != SECONDS_PER_DAY:
+        name += time.strftime('T%H%M%S', time.gmtime(chunk_start))
+        name += '-' + time.strftime('%H%M%S', time.gmtime(chunk_stop - 1))
+    return os.path.join(output_directory, name + PARTITION_EXTENSIONS[output_format])
+
+def backfill_chunk(
+        chunk_start, chunk_stop, first_timestamp, timestep, output_directory, seed,
+        output_format = 'csv', profile_settings = None
+    ):
+    '''
+    Computes the output partition for one chunk, unless it already exists.
+    The samples of the chunk start at first_timestamp, to continue the timestep grid of the previous chunks.
+    The noise only depends on the seed and the profiles only depend on the profile_settings
+    (see configuration.PROFILE_SETTINGS), so the partition is the same on any worker.
+    The profile_settings are applied to the configuration of the worker, if they are given.
+    The partition is written to a temporary file first and renamed once it is complete,
+    so a cancelled backfill never leaves an incomplete partition behind.
+
+    Returns:
+        A tuple of the partition path and the amount of written rows.
+        The amount is None, if the partition already existed.
+    '''
+    filepath = partition_filepath(output_directory, chunk_start, chunk_stop, output_format)
+    if os.path.exists(filepath):
+        return filepath, None
+
+    if profile_settings:
+        configuration.CONFIGURATION.update(profile_settings)
+
+    temporary_filepath = filepath + '.part'
+    if os.path.exists(temporary_filepath):
+        os.remove(temporary_filepath)
+    row_count = pipeline.run_pipeline(
+        first_timestamp, chunk_stop, timestep, temporary_filepath, seed = seed,
+        output_format = output_format
+    )
+    os.replace(temporary_filepath, filepath)
+    return filepath, row_count
+
+def backfill(
+        start, stop, timestep, output_directory, workers = None, quiet = False, seed = None,
+        output_format = 'csv'
+    ):
+    '''
+    Computes the meter and photovoltaic values for the time range [start, stop)
+    in a pool of processes and writes one output partition per day.
+    Partitions, that already exist, are skipped. So a cancelled backfill can simply be restarted.
+
+    Params:
+        start: The first timestamp in seconds since epoch.
+        stop: The timestamp in seconds since epoch, at which to stop (exclusive).
+        timestep: The amount of seconds between two samples.
+        output_directory: The directory, to which the partitions are written.
+        workers: The amount of worker processes. Defaults to the amount of cores.
+        quiet: If True, the finished partitions are not printed.
+        seed: The seed of the noise. Defaults to the seed of the output directory, see resolve_seed.
+            A restarted backfill has to use the same seed, to continue the same data.
+        output_format: Either 'csv' or 'binary', see filewriter.BinaryRecordWriter.
+
+    Returns:
+        A list of (partition path, written rows) tuples, ordered by time.
+    '''
+    os.makedirs(output_directory, exist_ok = True)
+    seed = resolve_seed(output_directory, seed)
+    # Passed to the workers, so they do not depend on inheriting the configuration
+    profile_settings = configuration.get_profile_settings()
+
+    chunks = []
+    for chunk_start, chunk_stop in split_into_days(start, stop):
+        # Continue the timestep grid of the previous chunks
+        offset = (timestep - (chunk_start - start) % timestep) % timestep
+        if chunk_start + offset < chunk_stop:
+            chunks.append((chunk_start, chunk_stop, offset))
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [
+            executor.submit(
+                backfill_chunk,
+                chunk_start, chunk_stop, chunk_start + offset, timestep, output_directory, seed,
+                output_format, profile_settings
+            )
+            for chunk_start, chunk_stop, offset in chunks
+        ]
+        for future in futures:
+            filepath, row_count = future.result()
+            if not quiet:
+                if row_count is None:
+                    print("Skipped existing partition", filepath)
+                else:
+                    print("Wrote", row_count, "rows to", filepath)
+            results.append((filepath, row_count))
+    return results
+
+@click.command()
+@click.option(
+    '--start', '-s', required=True, type=click.DateTime(pipeline.DATE_FORMATS),
+    help='The first simulated point in time in UTC.'
+)
+@click.option(
+    '--end', '-e', required=True, type=click.DateTime(pipeline.DATE_FORMATS),
+    help='The simulated point in time in UTC, at which to stop.'
+)
+@click.option(
+    '--timestep', '-t', default=1, type=click.INT,
+    help='The amount of simulated seconds between each sample. (default: \'1\')'
+)
+@click.option(
+    '--output-dir', '-o', default='output', type=click.STRING,
+    help='The directory, to which one partition per day will be written to (default: \'output\')'
+)
+@click.option(
+    '--workers', '-w', default=None, type=click.INT,
+    help='The amount of worker processes. (default: the amount of cores)'
+)
+@click.option(
+    '--seed', default=None, type=click.INT,
+    help='The seed of the noise. Use the same seed to restart a backfill. (default: the seed of the output directory, the configured seed or a random one)'
+)
+@click.option(
+    '--output-format', '-f', default='csv', type=click.Choice(['csv', 'binary']),
+    help='The format of the partitions. (default: \'csv\')'
+)
+@click.option(
+    '--config', '-c', default=None, type=click.STRING,
+    help='The filepath to an optional configuration file. (default: \'None\')'
+)
+def main(start, end, timestep, output_dir, workers, seed, output_format, config):
+    # If the config filepath was passed, try to load it
+    if config:
+        configuration.read_config_file(config)
+
+    try:
+        seed = resolve_seed(output_dir, seed)
+        print("Using the noise seed", seed)
+        backfill(
+            pipeline.to_timestamp(start), pipeline.to_timestamp(end),
+            timestep, output_dir, workers, seed = seed, output_format = output_format
+        )
+    except KeyboardInterrupt:
+        print("Execution was cancelled by user!")
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
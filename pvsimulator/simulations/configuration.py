@@ -4,9 +4,33 @@ CONFIGURATION = {
     'host': 'localhost',
     'username': 'guest',
     'password': 'guest',
-    'queue_name': 'pv_simulation'
+    'queue_name': 'pv_simulation',
+    'transport': 'amqp',
+    'profile_cache_directory': '',
+    'seed': '',
+    'pv_model': 'curve',
+    'latitude': '48.14',
+    'longitude': '11.58',
+    'tilt': '30',
+    'azimuth': '180'
 }
 
+# The values, that determine the simulated profiles. Worker processes have to use the same ones.
+PROFILE_SETTINGS = (
+    'profile_cache_directory',
+    'pv_model',
+    'latitude',
+    'longitude',
+    'tilt',
+    'azimuth'
+)
+
+def get_profile_settings():
+    '''
+    Returns the configured values of the PROFILE_SETTINGS as dictionary.
+    '''
+    return {name: CONFIGURATION[name] for name in PROFILE_SETTINGS}
+
 def read_config_file(filepath):
     '''
     Tries to load a simulation configuration from the filepath.
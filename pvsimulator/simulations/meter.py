@@ -2,14 +2,19 @@ import calendar
 import click
 import json
 import math
-import random
+import numpy
 import sys
 import time
 from datetime import datetime
 
-from pvsimulator.queueclient import QueueClient
+from pvsimulator import codec
+from pvsimulator import metrics
+from pvsimulator.queueclient import BufferedPublisher, QueueClient
+from pvsimulator.ratecontrol import RateController
 from pvsimulator.timemath import *
 from pvsimulator.simulations import configuration
+from pvsimulator.simulations import noise
+from pvsimulator.simulations import profiles
 
 
 def get_normalized_meter_value(t):
@@ -31,44 +36,235 @@ def get_normalized_meter_value(t):
     normalized_meter_value = meter_value / 5.0
     return normalized_meter_value
 
-def construct_message_at_time(t):
+def get_normalized_meter_values(t):
+    '''
+    Vectorized version of get_normalized_meter_value.
+    Expects an array of values between 0 and 1 and returns an array
+    with the normalized simulated household consumption at each of them.
+    '''
+    x = numpy.asarray(t, dtype = numpy.float64) * math.pi * 4
+    meter_values = numpy.sin(x) + (x/2.5) * (-numpy.exp(x / 12.0) + 2.85) + 1
+    normalized_meter_values = meter_values / 5.0
+    return normalized_meter_values
+
+def generate_meter_values(timestamps, seed = None, household = 0):
+    '''
+    Computes the pseudo random meter values for a whole array of timestamps in one pass.
+
+    Params:
+        timestamps: An array of seconds since epoch timestamps.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+        household: The index of the household, whose noise is drawn.
+
+    Returns:
+        An array with the meter power values in Watt.
+    '''
+    timestamps = numpy.asarray(timestamps)
+
+    normalized_meter_power_values = profiles.get_meter_profile().lookup(timestamps)
+    meter_noise = noise.integers(
+        noise.get_seed(seed), noise.METER_STREAM, household, timestamps, -50, 50
+    )
+    return normalized_meter_power_values * 8500 + meter_noise
+
+def generate_meter_range(start, stop, timestep, seed = None):
+    '''
+    Computes the pseudo random meter values for all timestamps in [start, stop).
+
+    Params:
+        start: The first timestamp in seconds since epoch.
+        stop: The timestamp in seconds since epoch, at which to stop (exclusive).
+        timestep: The amount of seconds between two values.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+
+    Returns:
+        A tuple of the timestamps array and the meter power values array.
+    '''
+    timestamps = numpy.arange(start, stop, timestep, dtype = numpy.int64)
+    return timestamps, generate_meter_values(timestamps, seed)
+
+def iterate_meter_range(start, stop, timestep, chunk_size = 86400, seed = None):
+    '''
+    Like generate_meter_range, but yields the values in chunks of at most chunk_size values.
+    This allows to generate long time ranges, like a whole year, with constant memory.
+    The values do not depend on the chunk_size.
+    '''
+    seed = noise.get_seed(seed)
+    chunk_span = chunk_size * timestep
+    for chunk_start in range(start, stop, chunk_span):
+        yield generate_meter_range(
+            chunk_start, min(chunk_start + chunk_span, stop), timestep, seed
+        )
+
+def construct_message(t, meter_power_value):
+    '''
+    Constructs the message body for a meter value at the time t.
+
+    Params:
+        t: Seconds since epoch.
+        meter_power_value: The meter power value in Watt.
+    '''
+    return codec.encode_json_sample(t, meter_power_value)
+
+def construct_messages(timestamps, meter_power_values):
+    '''
+    Constructs the message bodies for arrays of timestamps and meter values.
+    '''
+    return [
+        construct_message(t, meter_power_value)
+        for t, meter_power_value in zip(
+            timestamps.tolist(), meter_power_values.tolist()
+        )
+    ]
+
+def construct_binary_messages(timestamps, meter_power_values, samples_per_message = 1):
+    '''
+    Constructs binary message bodies for arrays of timestamps and meter values.
+    Each message body contains up to samples_per_message samples.
+    '''
+    return [
+        codec.encode_binary_samples(
+            timestamps[i:i + samples_per_message],
+            meter_power_values[i:i + samples_per_message]
+        )
+        for i in range(0, len(timestamps), samples_per_message)
+    ]
+
+def construct_message_at_time(t, encoding = 'json', seed = None):
     '''
     Constructs the message body at the time t.
     The value is based on the simulated output + a random value.
 
     Params:
         t: Seconds since epoch.
+        encoding: Either 'json' or 'binary'.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
     '''
     # Generate the pseudo random meter value
-    normalized_daytime = get_normalized_daytime(t)
-    normalized_meter_power_value = get_normalized_meter_value(
-        normalized_daytime
-    )
-    random_absolute_meter_power_value = normalized_meter_power_value * 8500 + random.randint(-50, 50)
-
-    # Pack all values in one dict. Ready to be published.
-    message_body = json.dumps(
-        {
-            "timestamp": t,
-            "meter_power_value_watt": random_absolute_meter_power_value
-        }
-    )
-    return message_body
+    normalized_meter_power_value = profiles.get_meter_profile().value_at(t)
+    meter_noise = int(noise.integers(noise.get_seed(seed), noise.METER_STREAM, 0, t, -50, 50))
+    random_absolute_meter_power_value = normalized_meter_power_value * 8500 + meter_noise
+
+    if encoding == 'binary':
+        return codec.encode_binary_samples([t], [random_absolute_meter_power_value])
+    return construct_message(t, random_absolute_meter_power_value)
+
+class Fleet(object):
+    """
+    The Fleet simulates the meters of many households at once.
+    Each household follows the daily consumption curve, scaled by its own factor
+    and shifted by its own phase. The values of all households for one tick are
+    computed as one array.
+    """
+    def __init__(self, household_count, scale_variation = 0.2, phase_variation = 1800, seed = None):
+        """
+        Params:
+            household_count: The amount of simulated households.
+            scale_variation: The relative variation of the consumption between households.
+                Each household's consumption is scaled by a factor in [1 - variation, 1 + variation].
+            phase_variation: The maximum amount of seconds, by which the daily curve
+                of a household is shifted back or forth.
+            seed: The seed of the household variations and the noise.
+                Defaults to the configured seed, see noise.get_seed.
+                A household keeps its variations, regardless of the size of the fleet.
+        """
+        if household_count < 1:
+            raise ValueError(
+                "A fleet needs at least one household!"
+            )
+        self._seed = noise.get_seed(seed)
+        self.household_count = household_count
+        self._households = numpy.arange(household_count)
+        self._scales = noise.uniform(
+            self._seed, noise.FLEET_STREAM, self._households, 0,
+            1 - scale_variation, 1 + scale_variation
+        ) * 8500
+        self._phases = noise.integers(
+            self._seed, noise.FLEET_STREAM, self._households, 1,
+            -phase_variation, phase_variation
+        )
+
+    def values_at(self, t):
+        """
+        Computes the pseudo random meter values of all households at the time t.
+
+        Params:
+            t: Seconds since epoch.
 
-def simulate_one_day(timestep):
+        Returns:
+            An array with one meter power value in Watt per household, ordered by household.
+        """
+        normalized_meter_power_values = profiles.get_meter_profile().lookup(t + self._phases)
+        meter_noise = noise.integers(
+            self._seed, noise.METER_STREAM, self._households, t, -50, 50
+        )
+        return normalized_meter_power_values * self._scales + meter_noise
+
+    def construct_message_at_time(self, t):
+        """
+        Constructs one binary message body with the values of all households at the time t.
+        The position of a sample in the message is the index of its household.
+
+        Params:
+            t: Seconds since epoch.
+        """
+        registry = metrics.get_registry()
+        start_time = registry.start_timer()
+        message_body = codec.encode_binary_samples(
+            numpy.full(self.household_count, t, dtype = numpy.int64),
+            self.values_at(t)
+        )
+        registry.observe_since('compute_seconds', start_time)
+        return message_body
+
+def create_meter_client(high_watermark = None, low_watermark = None, depth_check_interval = 0.5):
     '''
-    Runs the meter simulation for one simulated day.
-    After finishing it, it will send the stop message and exit.
+    Creates the QueueClient of the meter from the configuration.
 
     Params:
-        timestep: The amount of seconds to wait between each message.
+        high_watermark: If given, publishing pauses, once the queue holds this many messages.
+        low_watermark: The depth of the queue, at which paused publishing resumes.
+            Defaults to half the high watermark.
+        depth_check_interval: The time in seconds between two checks of the depth of the queue.
     '''
-    meter = QueueClient(
+    return QueueClient(
         host = configuration.CONFIGURATION['host'],
         username = configuration.CONFIGURATION['username'],
         password = configuration.CONFIGURATION['password'],
-        queue_name = configuration.CONFIGURATION['queue_name']
+        queue_name = configuration.CONFIGURATION['queue_name'],
+        transport = configuration.CONFIGURATION['transport'],
+        high_watermark = high_watermark,
+        low_watermark = low_watermark,
+        depth_check_interval = depth_check_interval
     )
+
+def simulate_one_day(
+        timestep, batch_size = 0, confirm = False, quiet = False,
+        encoding = 'json', samples_per_message = 1, fleet = None,
+        high_watermark = None, low_watermark = None, depth_check_interval = 0.5
+    ):
+    '''
+    Runs the meter simulation for one simulated day.
+    After finishing it, it will send the stop message and exit.
+
+    Params:
+        timestep: The amount of seconds to wait between each message.
+        batch_size: If greater than 0, the messages are published in batches of this size.
+        confirm: If True, each batch is confirmed by the broker.
+        quiet: If True, the published messages are not printed.
+        encoding: The message encoding. Either 'json' or 'binary'.
+        samples_per_message: The amount of samples per message in the binary encoding.
+        fleet: An optional Fleet. If given, one binary message with the values
+            of all households is published per tick, regardless of the encoding.
+        high_watermark: If given, publishing pauses, once the queue holds this many messages,
+            until it is drained to the low_watermark. See create_meter_client.
+        low_watermark: The depth of the queue, at which paused publishing resumes.
+        depth_check_interval: The time in seconds between two checks of the depth of the queue.
+    '''
+    if fleet is not None:
+        encoding = 'binary'
+
+    meter = create_meter_client(high_watermark, low_watermark, depth_check_interval)
     meter.connect()
     meter.purge_queue()
 
@@ -77,78 +273,353 @@ def simulate_one_day(timestep):
     )
     seconds_in_a_day = 86400
 
-    for deltasecond in range(0, seconds_in_a_day, timestep):
-        t_now = t0 + deltasecond
-        message_body = construct_message_at_time(t_now)
+    # Without batching, every message is published on its own
+    publisher = BufferedPublisher(
+        meter,
+        max_batch_size = max(batch_size, 1),
+        max_delay = 0.5 if batch_size > 1 else None,
+        confirm = confirm,
+        content_type = codec.CONTENT_TYPES[encoding]
+    )
 
-        meter.publish_message(
+    if fleet is not None:
+        # Computed tick by tick, so only one tick of the fleet is held in memory
+        message_bodies = (
+            fleet.construct_message_at_time(t)
+            for t in range(t0, t0 + seconds_in_a_day, timestep)
+        )
+    else:
+        registry = metrics.get_registry()
+        start_time = registry.start_timer()
+        timestamps, meter_power_values = generate_meter_range(
+            t0, t0 + seconds_in_a_day, timestep
+        )
+        if encoding == 'binary':
+            message_bodies = construct_binary_messages(
+                timestamps, meter_power_values, samples_per_message
+            )
+        else:
+            message_bodies = construct_messages(timestamps, meter_power_values)
+        registry.observe_since('compute_seconds', start_time)
+
+    for message_body in message_bodies:
+        publisher.publish_message(
             message_body
         )
-        print("Published: ", message_body)
+        if not quiet:
+            print_published_message(message_body, fleet)
 
+    publisher.close()
     meter.publish_message("STOP_SIMULATION")
+    if meter.flow_controller and not quiet:
+        print(meter.flow_controller.format_report())
 
-def simulate_normal_operation(timestep):
+def print_published_message(message_body, fleet = None):
+    '''
+    Prints a published message. Fleet messages are summarized instead of printed as a whole.
+    '''
+    if fleet is None:
+        print("Published: ", message_body)
+        return
+    timestamps, meter_power_values = codec.decode_binary_samples(message_body)
+    print(
+        "Published: ", fleet.household_count, "households at", int(timestamps[0]),
+        "with a total of", float(meter_power_values.sum()), "Watt"
+    )
+
+def simulate_normal_operation(
+        timestep, quiet = False, encoding = 'json', fleet = None,
+        high_watermark = None, low_watermark = None, depth_check_interval = 0.5, confirm = False
+    ):
     '''
     Runs the simulation in a 'live' mode, using the current time.
     It will run, until it is stopped by the user.
 
     Params:
         timestep: The amount of seconds to wait between each message.
+        quiet: If True, the published messages are not printed.
+        encoding: The message encoding. Either 'json' or 'binary'.
+        fleet: An optional Fleet. If given, one binary message with the values
+            of all households is published per tick, regardless of the encoding.
+        high_watermark: If given, publishing pauses, once the queue holds this many messages,
+            until it is drained to the low_watermark. See create_meter_client.
+        low_watermark: The depth of the queue, at which paused publishing resumes.
+        depth_check_interval: The time in seconds between two checks of the depth of the queue.
+        confirm: If True, each message is confirmed by the broker.
     '''
-    meter = QueueClient(
-        host = configuration.CONFIGURATION['host'],
-        username = configuration.CONFIGURATION['username'],
-        password = configuration.CONFIGURATION['password'],
-        queue_name = configuration.CONFIGURATION['queue_name']
-    )
+    if fleet is not None:
+        encoding = 'binary'
+
+    meter = create_meter_client(high_watermark, low_watermark, depth_check_interval)
     meter.connect()
     meter.purge_queue()
+    registry = metrics.get_registry()
+    # Each message has a fixed deadline, so the publishing time does not add up
+    rate_controller = RateController(1.0 / timestep, max_burst = 1)
+    t_start = None
 
     try:
         while True:
-            t_now = int(time.time())
+            rate_controller.wait()
+            if t_start is None:
+                t_start = int(time.time())
+            # The sample is stamped with its deadline, so a late message keeps its place on the timestep grid
+            t_now = t_start + (rate_controller.released_count - 1) * timestep
 
-            message_body = construct_message_at_time(t_now)
+            if fleet is not None:
+                message_body = fleet.construct_message_at_time(t_now)
+            else:
+                start_time = registry.start_timer()
+                message_body = construct_message_at_time(t_now, encoding)
+                registry.observe_since('compute_seconds', start_time)
 
-            meter.publish_message(
-                message_body
-            )
-            print("Published: ", message_body)
-            time.sleep(timestep)
+            if confirm:
+                meter.publish_batch(
+                    [message_body],
+                    confirm = True,
+                    content_type = codec.CONTENT_TYPES[encoding]
+                )
+            else:
+                meter.publish_message(
+                    message_body,
+                    codec.CONTENT_TYPES[encoding]
+                )
+            if not quiet:
+                print_published_message(message_body, fleet)
 
     except KeyboardInterrupt:
         meter.publish_message("STOP_SIMULATION")
         print("Execution was cancelled by user!")
         return
 
+def simulate_load(
+        rate, speedup = 1.0, quiet = False, encoding = 'json',
+        report_interval = 5.0, max_batch_size = 1000,
+        high_watermark = None, low_watermark = None, depth_check_interval = 0.5,
+        confirm = False, fleet = None
+    ):
+    '''
+    Runs the meter as a load generator, which publishes the simulated day (Jul 9, 2009)
+    at a target rate of messages per second. The simulated time advances by
+    speedup simulated seconds per second, so the timestep between two samples is speedup / rate.
+    After the simulated day, it will send the stop message and exit.
+
+    Params:
+        rate: The target amount of messages per second. May be fractional.
+        speedup: The amount of simulated seconds per second. For example 60 replays a day in 24 minutes.
+        quiet: If True, the published messages are not printed.
+        encoding: The message encoding. Either 'json' or 'binary'.
+            The binary encoding truncates the timestamps to full seconds.
+        report_interval: The time in seconds between two reports of the achieved rate.
+        max_batch_size: The maximum amount of overdue messages, that are published as one batch.
+        high_watermark: If given, publishing pauses, once the queue holds this many messages,
+            until it is drained to the low_watermark. See create_meter_client.
+        low_watermark: The depth of the queue, at which paused publishing resumes.
+        depth_check_interval: The time in seconds between two checks of the depth of the queue.
+        confirm: If True, each published message or batch is confirmed by the broker.
+        fleet: An optional Fleet. If given, each message is one tick of all households
+            in the binary encoding, regardless of the encoding.
+    '''
+    if fleet is not None:
+        encoding = 'binary'
+
+    meter = create_meter_client(high_watermark, low_watermark, depth_check_interval)
+    meter.connect()
+    meter.purge_queue()
+
+    t0 = calendar.timegm(
+        time.strptime('Jul 9, 2009 @ 00:00:00 UTC', '%b %d, %Y @ %H:%M:%S UTC')
+    )
+    seconds_in_a_day = 86400
+    simulated_timestep = speedup / rate
+    message_count = int(math.ceil(seconds_in_a_day / simulated_timestep))
+    content_type = codec.CONTENT_TYPES[encoding]
+
+    registry = metrics.get_registry()
+    rate_controller = RateController(rate, max_burst = max_batch_size)
+    next_report_time = time.monotonic() + report_interval
+    published_count = 0
+    try:
+        while published_count < message_count:
+            due_count = min(rate_controller.wait(), message_count - published_count)
+
+            start_time = registry.start_timer()
+            timestamps = t0 + numpy.arange(
+                published_count, published_count + due_count
+            ) * simulated_timestep
+            if float(simulated_timestep).is_integer():
+                timestamps = timestamps.astype(numpy.int64)
+            if fleet is not None:
+                message_bodies = [
+                    fleet.construct_message_at_time(t)
+                    for t in timestamps.astype(numpy.int64).tolist()
+                ]
+            else:
+                meter_power_values = generate_meter_values(timestamps)
+                if encoding == 'binary':
+                    message_bodies = construct_binary_messages(
+                        timestamps.astype(numpy.int64), meter_power_values
+                    )
+                else:
+                    message_bodies = construct_messages(timestamps, meter_power_values)
+            registry.observe_since('compute_seconds', start_time)
+
+            if due_count == 1 and not confirm:
+                meter.publish_message(message_bodies[0], content_type)
+            else:
+                meter.publish_batch(message_bodies, confirm = confirm, content_type = content_type)
+            published_count += due_count
+
+            if not quiet:
+                for message_body in message_bodies:
+                    print_published_message(message_body, fleet)
+            if time.monotonic() >= next_report_time:
+                print_load_report(rate_controller, meter)
+                next_report_time += report_interval
+    except KeyboardInterrupt:
+        print("Execution was cancelled by user!")
+    finally:
+        print_load_report(rate_controller, meter)
+        meter.publish_message("STOP_SIMULATION")
+
+def print_load_report(rate_controller, meter):
+    '''
+    Prints the achieved rate and, with flow control, the depth of the queue and the pauses.
+    While publishing was paused, the rate falls behind the target rate.
+    '''
+    print(rate_controller.format_report())
+    if meter.flow_controller:
+        print(meter.flow_controller.format_report())
 
 @click.command()
 @click.option(
-    '--mode', '-m', default='oneday', type=click.Choice(['oneday', 'endless']), 
+    '--mode', '-m', default='oneday', type=click.Choice(['oneday', 'endless', 'load']), 
     help='The kind of simulation that should be run. (default: \'oneday\')'
 )
 @click.option(
     '--timestep', '-t', default=1, type=click.INT,
     help='The amount of seconds to wait between each message. (default: \'1\')'
 )
+@click.option(
+    '--rate', '-r', default=1.0, type=click.FLOAT,
+    help='The target amount of messages per second of the load mode. (default: \'1.0\')'
+)
+@click.option(
+    '--speedup', default=1.0, type=click.FLOAT,
+    help='The amount of simulated seconds per second of the load mode. (default: \'1.0\')'
+)
+@click.option(
+    '--report-interval', default=5.0, type=click.FLOAT,
+    help='The time in seconds between two reports of the achieved rate in the load mode. (default: \'5.0\')'
+)
+@click.option(
+    '--batch-size', '-b', default=0, type=click.INT,
+    help='Publish the messages of the oneday mode in batches of this size or at most this many overdue messages at once in the load mode. (default: \'0\' = unbatched, 1000 in the load mode)'
+)
+@click.option(
+    '--confirm', is_flag=True,
+    help='Let the broker confirm each published batch or message.'
+)
+@click.option(
+    '--quiet', '-q', is_flag=True,
+    help='Do not print each published message.'
+)
+@click.option(
+    '--encoding', '-e', default='json', type=click.Choice(['json', 'binary']),
+    help='The encoding of the published messages. (default: \'json\')'
+)
+@click.option(
+    '--samples-per-message', '-s', default=1, type=click.INT,
+    help='The amount of samples per message of the oneday mode in the binary encoding. (default: \'1\')'
+)
+@click.option(
+    '--households', '-n', default=0, type=click.INT,
+    help='Simulate a fleet of this many households, published as one binary message per tick. (default: \'0\' = a single meter)'
+)
+@click.option(
+    '--scale-variation', default=0.2, type=click.FLOAT,
+    help='The relative variation of the consumption between the households of a fleet. (default: \'0.2\')'
+)
+@click.option(
+    '--phase-variation', default=1800, type=click.INT,
+    help='The maximum amount of seconds, by which the daily curve of a household is shifted. (default: \'1800\')'
+)
+@click.option(
+    '--seed', default=None, type=click.INT,
+    help='The seed of the noise, to reproduce a run. (default: the configured seed or a random one)'
+)
+@click.option(
+    '--high-watermark', default=0, type=click.INT,
+    help='Pause publishing, while the queue holds this many messages. (default: \'0\' = disabled)'
+)
+@click.option(
+    '--low-watermark', default=None, type=click.INT,
+    help='Resume publishing, once the queue was drained to this many messages. (default: half the high watermark)'
+)
+@click.option(
+    '--depth-check-interval', default=0.5, type=click.FLOAT,
+    help='The time in seconds between two checks of the queue depth. (default: \'0.5\')'
+)
+@click.option(
+    '--metrics-interval', default=0, type=click.FLOAT,
+    help='Print a stats line with the metrics every this many seconds. (default: \'0\' = disabled)'
+)
+@click.option(
+    '--metrics-file', default=None, type=click.STRING,
+    help='Write the metrics in the Prometheus text format to this file. (default: \'None\')'
+)
 @click.option(
     '--config', '-c', default=None, type=click.STRING,
     help='The filepath to an optional configuration file. (default: \'None\')'
 )
-def main(mode, timestep, config):
+def main(
+        mode, timestep, rate, speedup, report_interval, batch_size, confirm, quiet, encoding, samples_per_message,
+        households, scale_variation, phase_variation, seed,
+        high_watermark, low_watermark, depth_check_interval,
+        metrics_interval, metrics_file, config
+    ):
+    # Options, that a mode cannot honor, are rejected instead of ignored
+    if batch_size > 0 and mode == 'endless':
+        raise click.UsageError("--batch-size is not supported by the endless mode, which publishes each tick on its own!")
+    if samples_per_message > 1 and mode != 'oneday':
+        raise click.UsageError("--samples-per-message is only supported by the oneday mode!")
+
     if config:
         configuration.read_config_file(config)
+    seed = noise.get_seed(seed)
+    configuration.CONFIGURATION['seed'] = str(seed)
+    if not quiet:
+        print("Using the noise seed", seed)
 
+    stats_reporter = metrics.start_reporting(metrics_interval, metrics_file)
     try:
-        if mode is 'oneday':
-            simulate_one_day(timestep)
-        elif mode is 'endless':
-            simulate_normal_operation(timestep)
+        fleet = None
+        if households > 0:
+            fleet = Fleet(households, scale_variation, phase_variation)
+        flow_control = dict(
+            high_watermark = high_watermark or None,
+            low_watermark = low_watermark,
+            depth_check_interval = depth_check_interval
+        )
+        if mode == 'oneday':
+            simulate_one_day(
+                timestep, batch_size, confirm, quiet, encoding, samples_per_message, fleet,
+                **flow_control
+            )
+        elif mode == 'endless':
+            simulate_normal_operation(timestep, quiet, encoding, fleet, confirm = confirm, **flow_control)
+        elif mode == 'load':
+            simulate_load(
+                rate, speedup, quiet, encoding, report_interval, batch_size or 1000,
+                confirm = confirm, fleet = fleet, **flow_control
+            )
     except KeyboardInterrupt:
         print("Execution was cancelled by user!")
     except Exception as e:
         print(e)
+    finally:
+        if stats_reporter:
+            stats_reporter.stop()
 
 if __name__ == "__main__":
     main()
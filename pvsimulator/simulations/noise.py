@@ -0,0 +1,137 @@
+import math
+import secrets
+import struct
+
+import numpy
+
+from pvsimulator.simulations import configuration
+
+# The streams keep the noise of the different simulations independent of each other
+METER_STREAM = 1
+PV_STREAM = 2
+FLEET_STREAM = 3
+
+_GOLDEN_GAMMA = numpy.uint64(0x9E3779B97F4A7C15)
+_MIX_MULTIPLIER_1 = numpy.uint64(0xBF58476D1CE4E5B9)
+_MIX_MULTIPLIER_2 = numpy.uint64(0x94D049BB133111EB)
+
+# The same constants for the integer arithmetic of single keys, which wraps with this mask
+_UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+_GOLDEN_GAMMA_INT = int(_GOLDEN_GAMMA)
+_MIX_MULTIPLIER_1_INT = int(_MIX_MULTIPLIER_1)
+_MIX_MULTIPLIER_2_INT = int(_MIX_MULTIPLIER_2)
+
+# Keys of these types are drawn with plain integers, since a 0-d numpy draw costs about 20 µs
+_SCALAR_TYPES = (int, float, numpy.integer, numpy.floating)
+
+
+def get_seed(seed = None):
+    '''
+    Returns the seed of the noise streams.
+    If no seed is given, the seed of the configuration is used.
+    If it is empty as well, a random seed is chosen once and stored in the configuration,
+    so the whole process uses the same seed.
+
+    Params:
+        seed: An optional seed as integer or numeric string.
+    '''
+    if seed is None or seed == '':
+        seed = configuration.CONFIGURATION.get('seed')
+    if seed is None or seed == '':
+        seed = secrets.randbits(63)
+        configuration.CONFIGURATION['seed'] = str(seed)
+    return int(seed)
+
+def _mix(x):
+    '''
+    The finalizer of splitmix64. Maps each uint64 to a statistically independent uint64.
+    '''
+    x = (x ^ (x >> numpy.uint64(30))) * _MIX_MULTIPLIER_1
+    x = (x ^ (x >> numpy.uint64(27))) * _MIX_MULTIPLIER_2
+    return x ^ (x >> numpy.uint64(31))
+
+def _mix_int(x):
+    '''
+    The finalizer of splitmix64 on a Python integer, see _mix.
+    '''
+    x = ((x ^ (x >> 30)) * _MIX_MULTIPLIER_1_INT) & _UINT64_MASK
+    x = ((x ^ (x >> 27)) * _MIX_MULTIPLIER_2_INT) & _UINT64_MASK
+    return x ^ (x >> 31)
+
+def _random_bits_int(seed, stream, household, timestamp):
+    '''
+    Returns the same bits as random_bits for a single key, as Python integer.
+    '''
+    key = _mix_int((int(seed) + stream * _GOLDEN_GAMMA_INT) & _UINT64_MASK)
+    key = _mix_int((key + (int(household) & _UINT64_MASK) * _GOLDEN_GAMMA_INT) & _UINT64_MASK)
+    full_second = math.floor(timestamp)
+    bits = _mix_int((key + (full_second & _UINT64_MASK) * _GOLDEN_GAMMA_INT) & _UINT64_MASK)
+    if timestamp != full_second:
+        fraction_bits, = struct.unpack('<Q', struct.pack('<d', timestamp - full_second))
+        bits = _mix_int((bits + fraction_bits * _GOLDEN_GAMMA_INT) & _UINT64_MASK)
+    return bits
+
+def _is_scalar_key(households, timestamps):
+    return isinstance(households, _SCALAR_TYPES) and isinstance(timestamps, _SCALAR_TYPES)
+
+def random_bits(seed, stream, households, timestamps):
+    '''
+    Returns 64 pseudo random bits for each (seed, stream, household, timestamp) key.
+    The bits only depend on the key, not on the order or the chunks in which they are drawn.
+    So any range of any day can be regenerated bit-identically on any worker.
+
+    Params:
+        seed: The seed of the run.
+        stream: The stream of the simulation, for example METER_STREAM.
+        households: A household index or an array of them.
+        timestamps: A seconds since epoch timestamp or an array of them.
+            Sub-second timestamps are keyed by their full second and their fraction,
+            so the samples within one second get their own noise.
+            Whole second timestamps are not affected by the fraction.
+
+    Returns:
+        An uint64 array in the broadcast shape of households and timestamps,
+        or a Python integer, if both are single values.
+    '''
+    if _is_scalar_key(households, timestamps):
+        return _random_bits_int(seed & _UINT64_MASK, stream, households, timestamps)
+    households = numpy.asarray(households, dtype = numpy.int64).view(numpy.uint64)
+    timestamps = numpy.asarray(timestamps)
+    full_seconds = numpy.floor(timestamps)
+    seed = numpy.array(seed & 0xFFFFFFFFFFFFFFFF, dtype = numpy.uint64)
+    # The arithmetic is meant to wrap around
+    with numpy.errstate(over = 'ignore'):
+        key = _mix(seed + numpy.uint64(stream) * _GOLDEN_GAMMA)
+        key = _mix(key + households * _GOLDEN_GAMMA)
+        bits = _mix(key + full_seconds.astype(numpy.int64).view(numpy.uint64) * _GOLDEN_GAMMA)
+        if timestamps.dtype.kind != 'f':
+            return bits
+        fractions = timestamps - full_seconds
+        has_fraction = fractions != 0
+        if not has_fraction.any():
+            return bits
+        fraction_bits = fractions.astype(numpy.float64).view(numpy.uint64)
+        return numpy.where(has_fraction, _mix(bits + fraction_bits * _GOLDEN_GAMMA), bits)
+
+def integers(seed, stream, households, timestamps, low, high):
+    '''
+    Returns pseudo random integers in [low, high] for each key, see random_bits.
+    '''
+    if _is_scalar_key(households, timestamps):
+        bits = _random_bits_int(seed & _UINT64_MASK, stream, households, timestamps)
+        return ((bits >> 32) * (high - low + 1) >> 32) + low
+    span = numpy.uint64(high - low + 1)
+    bits = random_bits(seed, stream, households, timestamps)
+    # Scale the upper 32 bits to the span, instead of using the biased modulo
+    return ((bits >> numpy.uint64(32)) * span >> numpy.uint64(32)).astype(numpy.int64) + low
+
+def uniform(seed, stream, households, timestamps, low, high):
+    '''
+    Returns pseudo random floats in [low, high) for each key, see random_bits.
+    '''
+    if _is_scalar_key(households, timestamps):
+        bits = _random_bits_int(seed & _UINT64_MASK, stream, households, timestamps)
+        return low + (bits >> 11) * (2.0 ** -53) * (high - low)
+    bits = random_bits(seed, stream, households, timestamps)
+    # 53 bits fill the mantissa of a float64
+    return low + (bits >> numpy.uint64(11)) * (2.0 ** -53) * (high - low)
@@ -1,15 +1,23 @@
 import click
 import json
 import math
-import random
+import multiprocessing
+import numpy
+import os
 import sys
 import time
 from datetime import datetime
 
+from pvsimulator import aggregation
+from pvsimulator import codec
 from pvsimulator import filewriter
+from pvsimulator import metrics
+from pvsimulator import rotation
 from pvsimulator.queueclient import QueueClient
 from pvsimulator.timemath import *
 from pvsimulator.simulations import configuration
+from pvsimulator.simulations import noise
+from pvsimulator.simulations import profiles
 
 
 def get_normalized_pv_value(t):
@@ -36,6 +44,65 @@ def get_normalized_pv_value(t):
     )
     return normalized_photovoltaic_value
 
+def get_normalized_pv_values(t):
+    """
+    Vectorized version of get_normalized_pv_value.
+    Expects an array of values between 0 and 1 and returns an array
+    with the normalized simulated photovoltaic output at each of them.
+    """
+    x = numpy.asarray(t, dtype = numpy.float64) * math.pi * 4
+    normalized_photovoltaic_values = numpy.maximum(
+        -((x - 7  ) ** 2 / 10 ) + 1,
+        -((x - 6.3) ** 2 / 100) + 2
+    )
+    return numpy.maximum(normalized_photovoltaic_values, 0)
+
+def generate_pv_values(timestamps, seed = None, household = 0):
+    """
+    Computes the pseudo random photovoltaic values for a whole array of timestamps in one pass.
+
+    Params:
+        timestamps: An array of seconds since epoch timestamps.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+        household: The index of the household, whose noise is drawn.
+
+    Returns:
+        An array with the photovoltaic power values in Watt, which are never negative.
+    """
+    timestamps = numpy.asarray(timestamps)
+
+    normalized_pv_power_values = profiles.get_pv_profile().lookup(timestamps)
+    pv_noise = noise.integers(
+        noise.get_seed(seed), noise.PV_STREAM, household, timestamps, -50, 50
+    )
+    # The noise must not turn the night of the solar model into consumption
+    return numpy.maximum(normalized_pv_power_values * 3250 + pv_noise, 0)
+
+class StopGroup(object):
+    """
+    The StopGroup lets a group of PV_Simulator processes, which consume the same queue,
+    stop together. The meter only publishes one STOP_SIMULATION message, so each
+    consumer, that receives it, passes it on to the queue, until all consumers have stopped.
+    """
+    def __init__(self, worker_count):
+        """
+        Params:
+            worker_count: The amount of consumers in the group.
+        """
+        self._worker_count = worker_count
+        self._stopped_workers = multiprocessing.Value('i', 0)
+
+    def stop_received(self):
+        """
+        Registers, that a consumer received the stop message.
+
+        Returns:
+            True, if the stop message has to be passed on to the other consumers.
+        """
+        with self._stopped_workers.get_lock():
+            self._stopped_workers.value += 1
+            return self._stopped_workers.value < self._worker_count
+
 class PV_Simulator(QueueClient):
     def __init__(
             self, 
@@ -44,25 +111,112 @@ class PV_Simulator(QueueClient):
             password = 'guest', 
             queue_name = 'queue',
             consuming_timeout = 0.25,
-            output_filepath = 'output.csv'
+            output_filepath = 'output.csv',
+            consuming_mode = 'push',
+            prefetch_count = 100,
+            consuming_batch_size = 1,
+            quiet = False,
+            flush_rows = 1000,
+            flush_interval = 1.0,
+            fsync = False,
+            transport = 'amqp',
+            stop_group = None,
+            seed = None,
+            measure_lag = False,
+            group_commit = False,
+            output_format = 'csv',
+            aggregate_windows = None,
+            drop_raw_rows = False,
+            lag_report_interval = 0,
+            rotate_seconds = None,
+            rotate_bytes = None,
+            compression = None
         ):
+        if drop_raw_rows and not aggregate_windows:
+            raise ValueError(
+                "The raw rows can only be dropped, if they are aggregated!"
+            )
+        if drop_raw_rows and group_commit:
+            raise ValueError(
+                "Group commit requires the raw rows, the open windows are not on disk!"
+            )
         self._output_filepath = output_filepath
-        super().__init__(host, username, password, queue_name, consuming_timeout)
+        self._measure_lag = measure_lag
+        self._stop_group = stop_group
+        if drop_raw_rows and (rotate_seconds or rotate_bytes):
+            raise ValueError(
+                "The raw rows can only be rotated, if they are written!"
+            )
+        self._output_writer = None
+        if not drop_raw_rows:
+            # With group commit, messages are only acknowledged, once their rows are on disk
+            writer_arguments = dict(
+                flush_rows = flush_rows,
+                flush_interval = flush_interval,
+                fsync = fsync or group_commit,
+                on_flush = self._commit_acknowledgements if group_commit else None
+            )
+            if rotate_seconds or rotate_bytes:
+                self._output_writer = rotation.RotatingWriter(
+                    output_filepath,
+                    output_format,
+                    rotate_seconds,
+                    rotate_bytes,
+                    compression,
+                    **writer_arguments
+                )
+            else:
+                self._output_writer = filewriter.create_writer(
+                    output_filepath,
+                    output_format,
+                    **writer_arguments
+                )
+        self._aggregation = None
+        if aggregate_windows:
+            self._aggregation = aggregation.AggregationStage(
+                output_filepath,
+                aggregate_windows,
+                flush_rows = flush_rows,
+                flush_interval = flush_interval,
+                fsync = fsync
+            )
+        self._quiet = quiet
+        self._seed = noise.get_seed(seed)
+        super().__init__(
+            host, username, password, queue_name, consuming_timeout,
+            consuming_mode, prefetch_count, consuming_batch_size, transport,
+            group_commit = group_commit,
+            lag_report_interval = lag_report_interval
+        )
     
     def _on_message_received_callback(self, message_body):
         # Check, if the simulation should be stopped
         if message_body == "STOP_SIMULATION":
-            self.stop_consuming()
+            self._stop()
             return
         
-        print("Received: ", message_body)
+        # Binary messages can contain many samples at once
+        if isinstance(message_body, bytes):
+            start_time = self._metrics.start_timer()
+            timestamps, meter_power_values = codec.decode_samples(message_body)
+            self._metrics.observe_since('decode_seconds', start_time)
+            if not self._quiet:
+                print("Received", len(timestamps), "binary samples")
+            self._process_samples(timestamps, meter_power_values)
+            return
+
+        if not self._quiet:
+            print("Received: ", message_body)
+        start_time = self._metrics.start_timer()
         message_body_json = json.loads(message_body)
+        self._metrics.observe_since('decode_seconds', start_time)
 
         # Generate the pseudo random photovoltaic power value
-        timestamp_value = int(message_body_json["timestamp"])
-        normalized_daytime = get_normalized_daytime(timestamp_value)
-        normalized_pv_power_value = get_normalized_pv_value(normalized_daytime)
-        random_absolute_pv_power_value = normalized_pv_power_value * 3250 + random.randint(-50, 50)
+        start_time = self._metrics.start_timer()
+        timestamp_value = message_body_json["timestamp"]
+        normalized_pv_power_value = profiles.get_pv_profile().value_at(timestamp_value)
+        pv_noise = int(noise.integers(self._seed, noise.PV_STREAM, 0, timestamp_value, -50, 50))
+        random_absolute_pv_power_value = max(normalized_pv_power_value * 3250 + pv_noise, 0)
         
         # Calculate the combined power value
         combined_power_value = random_absolute_pv_power_value + message_body_json["meter_power_value_watt"]
@@ -74,23 +228,327 @@ class PV_Simulator(QueueClient):
             random_absolute_pv_power_value,
             combined_power_value,
         ]
+        self._metrics.observe_since('compute_seconds', start_time)
+
         # Append the row to the output file
-        filewriter.file_append(self._output_filepath, output)
+        start_time = self._metrics.start_timer()
+        if self._output_writer:
+            self._output_writer.write_row(output)
+        if self._aggregation:
+            self._aggregation.add(
+                [timestamp_value],
+                [message_body_json["meter_power_value_watt"]],
+                [random_absolute_pv_power_value]
+            )
+        self._metrics.observe_since('write_seconds', start_time)
+        self._observe_lag([timestamp_value])
+
+    def _on_message_batch_received_callback(self, message_bodies, delivery_tags):
+        # Only process the messages in front of a stop message
+        stop_requested = "STOP_SIMULATION" in message_bodies
+        if stop_requested:
+            message_bodies = message_bodies[:message_bodies.index("STOP_SIMULATION")]
+
+        if not self._quiet:
+            print("Received batch of", len(message_bodies), "messages")
+        start_time = self._metrics.start_timer()
+        if message_bodies:
+            decoded_messages = [codec.decode_samples(message_body) for message_body in message_bodies]
+            timestamps = numpy.concatenate([message_timestamps for message_timestamps, _ in decoded_messages])
+            meter_power_values = numpy.concatenate([values for _, values in decoded_messages])
+        else:
+            timestamps = numpy.empty(0, dtype = codec.SAMPLE_DTYPE['timestamp'])
+            meter_power_values = numpy.empty(0, dtype = codec.SAMPLE_DTYPE['meter_power_value_watt'])
+        self._metrics.observe_since('decode_seconds', start_time)
+        self._process_samples(timestamps, meter_power_values)
+
+        if stop_requested:
+            self._stop()
+            # The stop message was processed as well
+            self._settle_batch(delivery_tags, len(message_bodies) + 1)
+        else:
+            self._settle_batch(delivery_tags, len(message_bodies))
+
+    def _process_samples(self, timestamps, meter_power_values):
+        """
+        Computes the photovoltaic values for many samples at once
+        and appends all of their rows to the output and/or the aggregates.
+
+        Params:
+            timestamps: An array of seconds since epoch timestamps.
+            meter_power_values: An array of the meter power values in Watt.
+        """
+        # Generate the pseudo random photovoltaic power values for all samples
+        start_time = self._metrics.start_timer()
+        random_absolute_pv_power_values = generate_pv_values(
+            numpy.asarray(timestamps),
+            self._seed
+        )
+        combined_power_values = random_absolute_pv_power_values + meter_power_values
+        self._metrics.observe_since('compute_seconds', start_time)
 
-def simulate_photovoltaic_consumer(output, idletime):
+        # Append all rows to the output file at once
+        start_time = self._metrics.start_timer()
+        if self._output_writer:
+            self._output_writer.write_columns(
+                timestamps,
+                meter_power_values,
+                random_absolute_pv_power_values,
+                combined_power_values
+            )
+        if self._aggregation:
+            self._aggregation.add(timestamps, meter_power_values, random_absolute_pv_power_values)
+        self._metrics.observe_since('write_seconds', start_time)
+        self._observe_lag(timestamps)
+
+    def _observe_lag(self, timestamps):
+        """
+        Records the end-to-end lag between the timestamps of the samples and now,
+        if measure_lag is enabled. Only meaningful for live timestamps, like in the endless mode of the meter.
+        """
+        if self._measure_lag:
+            timestamps = numpy.asarray(timestamps, dtype = numpy.float64)
+            self._metrics.observe_many('lag_seconds', time.time() - timestamps)
+            if self.lag_reporter:
+                self.lag_reporter.observe(0, float(timestamps.max()))
+
+    def _stop(self):
+        """
+        Stops the simulation after a STOP_SIMULATION message.
+        """
+        self._flush_outputs()
+        if self._stop_group and self._stop_group.stop_received():
+            self.publish_message("STOP_SIMULATION")
+        self.stop_consuming()
+
+    def _on_idle(self):
+        if self._group_commit and self._consuming_mode == 'push' and \
+                self._uncommitted_count >= self._prefetch_count:
+            # The broker delivers no more messages, until these are acknowledged
+            self._output_writer.flush()
+            return
+        if self._output_writer:
+            self._output_writer.flush_if_due()
+        if self._aggregation:
+            self._aggregation.flush_if_due()
+
+    def _flush_outputs(self):
+        if self._output_writer:
+            self._output_writer.flush()
+        if self._aggregation:
+            self._aggregation.flush()
+
+    def _on_consuming_stopped(self):
+        if self._group_commit:
+            # Acknowledges the messages since the last flush, including the stop message
+            self._output_writer.flush()
+
+    def close_output(self):
+        """
+        Flushes all buffered output rows and closes the output file.
+        The open windows of the aggregates are written as well.
+        """
+        if self._output_writer:
+            self._output_writer.close()
+        if self._aggregation:
+            self._aggregation.close()
+            if self._aggregation.late_sample_count and not self._quiet:
+                print("Dropped", self._aggregation.late_sample_count, "late samples from the aggregates")
+
+def simulate_photovoltaic_consumer(
+        output, idletime, consuming_mode = 'push', prefetch = 100,
+        batch_size = 1, quiet = False, flush_rows = 1000, flush_interval = 1.0,
+        fsync = False, workers = 1, measure_lag = False, metrics_interval = 0,
+        metrics_file = None, group_commit = False, output_format = 'csv',
+        aggregate_windows = None, drop_raw_rows = False, lag_report_interval = 0,
+        rotate_seconds = None, rotate_bytes = None, compression = None
+    ):
     '''
     Start the photovoltaic simulation while blocking the Thread.
+
+    Params:
+        output: The file, to which the output will be written to.
+        idletime: The time in seconds to idle between each queue access in 'poll' mode.
+        consuming_mode: Either 'push' (broker delivers messages) or 'poll' (basic.get).
+        prefetch: The amount of messages the broker delivers in advance in 'push' mode.
+        batch_size: If greater than 1, the messages are processed in batches of up to this size.
+        quiet: If True, the received messages are not printed.
+        flush_rows: The amount of output rows, after which the output is flushed.
+        flush_interval: The time in seconds, after which the output is flushed.
+        fsync: If True, each flush waits until the output is written to disk.
+        workers: The amount of consumer processes. See simulate_photovoltaic_consumer_group.
+        measure_lag: If True, the lag between the sample timestamps and their processing is recorded.
+        metrics_interval: The time in seconds between two stats lines. Disabled if 0.
+        metrics_file: The file, to which the metrics are written in the Prometheus text format.
+            Each worker of a group writes its own file, named after its index.
+        group_commit: If True, messages are acknowledged once per flush, after their rows were fsynced.
+        output_format: Either 'csv' or 'binary', see filewriter.BinaryRecordWriter.
+        aggregate_windows: A list of window lengths in seconds, in which the samples are aggregated.
+            See aggregation.AggregationStage.
+        drop_raw_rows: If True, only the aggregates are written.
+        lag_report_interval: The time in seconds between two reports of the consumer lag. Disabled if 0.
+        rotate_seconds: If given, the output is split into segments of this many seconds of sample time.
+            See rotation.RotatingWriter.
+        rotate_bytes: If given, the output is split into segments of about this many bytes.
+        compression: Either 'gzip', 'lzma' or None. Closed segments are compressed in the background.
     '''
-    pv = PV_Simulator(
+    if workers > 1 and configuration.CONFIGURATION['transport'] == 'shm':
+        raise ValueError(
+            "The shm transport only allows one consumer per queue, use the amqp transport for --workers!"
+        )
+    if workers > 1 and (rotate_seconds or rotate_bytes):
+        raise ValueError(
+            "The output of a consumer group cannot be rotated, it is merged from the workers at the end!"
+        )
+    pv_arguments = dict(
         host = configuration.CONFIGURATION['host'],
         username = configuration.CONFIGURATION['username'],
         password = configuration.CONFIGURATION['password'],
         queue_name = configuration.CONFIGURATION['queue_name'], 
+        transport = configuration.CONFIGURATION['transport'],
         consuming_timeout = idletime,
-        output_filepath = output
+        output_filepath = output,
+        consuming_mode = consuming_mode,
+        prefetch_count = prefetch,
+        consuming_batch_size = batch_size,
+        quiet = quiet,
+        flush_rows = flush_rows,
+        flush_interval = flush_interval,
+        fsync = fsync,
+        # All workers of a group draw the same noise
+        seed = noise.get_seed(),
+        measure_lag = measure_lag,
+        group_commit = group_commit,
+        output_format = output_format,
+        aggregate_windows = aggregate_windows,
+        drop_raw_rows = drop_raw_rows,
+        lag_report_interval = lag_report_interval,
+        rotate_seconds = rotate_seconds,
+        rotate_bytes = rotate_bytes,
+        compression = compression
     )
+    metrics_settings = dict(
+        metrics_interval = metrics_interval,
+        metrics_file = metrics_file
+    )
+    if workers > 1:
+        simulate_photovoltaic_consumer_group(output, workers, pv_arguments, metrics_settings)
+    else:
+        _run_pv_simulator(pv_arguments, **metrics_settings)
+
+def simulate_photovoltaic_consumer_group(output, workers, pv_arguments, metrics_settings = None):
+    '''
+    Start a group of photovoltaic simulation processes, which consume the same queue.
+    Each process writes to its own output segment. Once all processes stopped,
+    the segments are merged into one output, ordered by the timestamps.
+
+    The workers do not aggregate, since each of them only sees some of the samples
+    and could not tell the interval to the next sample. Instead, the merged samples are aggregated once.
+    With drop_raw_rows, the workers still write their raw segments, but only the aggregates are kept.
+
+    Params:
+        output: The file, to which the merged output will be written to.
+        workers: The amount of consumer processes.
+        pv_arguments: The arguments for the PV_Simulator of each process.
+        metrics_settings: The metrics_interval and metrics_file for each process.
+    '''
+    metrics_settings = dict(metrics_settings or {})
+    metrics_file = metrics_settings.pop('metrics_file', None)
+    stop_group = StopGroup(workers)
+    segment_filepaths = [
+        output + '.segment-' + str(worker) for worker in range(workers)
+    ]
+    def worker_arguments(segment_filepath):
+        return dict(
+            pv_arguments,
+            output_filepath = segment_filepath,
+            aggregate_windows = None,
+            drop_raw_rows = False
+        )
+    processes = [
+        multiprocessing.Process(
+            target = _run_pv_simulator,
+            args = (worker_arguments(segment_filepath), stop_group),
+            kwargs = dict(
+                metrics_settings,
+                metrics_file = _worker_filepath(metrics_file, worker)
+            )
+        )
+        for worker, segment_filepath in enumerate(segment_filepaths)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        # A cancellation reaches the workers as well, wait for them to close their segments
+        for process in processes:
+            process.join()
+        existing_segment_filepaths = [
+            segment_filepath for segment_filepath in segment_filepaths
+            if os.path.exists(segment_filepath)
+        ]
+        output_format = pv_arguments.get('output_format', 'csv')
+        # The merge expects ordered segments, but a redelivered message lands behind the later ones
+        for segment_filepath in existing_segment_filepaths:
+            filewriter.sort_file_by_timestamp(segment_filepath, output_format)
+        if pv_arguments.get('aggregate_windows'):
+            _aggregate_segments(output, existing_segment_filepaths, pv_arguments)
+        if not pv_arguments.get('drop_raw_rows'):
+            if output_format == 'binary':
+                filewriter.merge_binary_files_by_timestamp(existing_segment_filepaths, output)
+            else:
+                filewriter.merge_files_by_timestamp(existing_segment_filepaths, output)
+        for segment_filepath in existing_segment_filepaths:
+            os.remove(segment_filepath)
+
+def _aggregate_segments(output, segment_filepaths, pv_arguments):
+    '''
+    Aggregates the samples of the raw segments of a group in timestamp order,
+    so each sample is weighted with the interval to the next sample of any worker.
+    '''
+    stage = aggregation.AggregationStage(
+        output,
+        pv_arguments['aggregate_windows'],
+        flush_rows = pv_arguments.get('flush_rows', 1000),
+        flush_interval = pv_arguments.get('flush_interval', 1.0),
+        fsync = pv_arguments.get('fsync', False)
+    )
+    try:
+        for timestamps, meter_power_values, pv_power_values, _ in filewriter.iterate_merged_columns(
+                segment_filepaths, pv_arguments.get('output_format', 'csv')):
+            stage.add(timestamps, meter_power_values, pv_power_values)
+    finally:
+        stage.close()
+    if stage.late_sample_count and not pv_arguments.get('quiet'):
+        print("Dropped", stage.late_sample_count, "late samples from the aggregates")
+
+def _worker_filepath(filepath, worker):
+    '''
+    Returns the filepath with the index of the worker in front of the extension,
+    for example 'metrics-worker-0.prom' for 'metrics.prom'. Returns None, if filepath is empty.
+    '''
+    if not filepath:
+        return None
+    root, extension = os.path.splitext(filepath)
+    return root + '-worker-' + str(worker) + extension
+
+def _run_pv_simulator(pv_arguments, stop_group = None, metrics_interval = 0, metrics_file = None):
+    '''
+    Runs a single PV_Simulator, until it is stopped.
+    The metrics are reported from within the process, that runs it.
+    '''
+    stats_reporter = metrics.start_reporting(metrics_interval, metrics_file)
+    pv = PV_Simulator(stop_group = stop_group, **pv_arguments)
     pv.connect()
-    pv.start_consuming_blocking()
+    try:
+        pv.start_consuming_blocking()
+    finally:
+        pv.close_output()
+        if stats_reporter:
+            stats_reporter.stop()
 
 @click.command()
 @click.option(
@@ -99,20 +557,116 @@ def simulate_photovoltaic_consumer(output, idletime):
 )
 @click.option(
     '--idletime', '-i', default=0, type=click.FLOAT,
-    help='The time in seconds, the consumer should idle between each queue access (default: \'0.0\')'
+    help='The time in seconds, the consumer should idle between each queue access in poll mode (default: \'0.0\')'
+)
+@click.option(
+    '--consuming-mode', '-m', default='push', type=click.Choice(['push', 'poll']),
+    help='Let the broker push messages or poll them one by one. (default: \'push\')'
+)
+@click.option(
+    '--prefetch', '-p', default=100, type=click.INT,
+    help='The amount of messages the broker delivers in advance in push mode (default: \'100\')'
+)
+@click.option(
+    '--batch-size', '-b', default=100, type=click.INT,
+    help='The maximum amount of messages, that are processed at once (default: \'100\')'
+)
+@click.option(
+    '--quiet', '-q', is_flag=True,
+    help='Do not print the received messages.'
+)
+@click.option(
+    '--flush-rows', default=1000, type=click.INT,
+    help='Flush the output after this amount of rows (default: \'1000\', 0 = disabled)'
+)
+@click.option(
+    '--flush-interval', default=1.0, type=click.FLOAT,
+    help='Flush the output after this amount of seconds (default: \'1.0\')'
+)
+@click.option(
+    '--fsync/--no-fsync', default=False,
+    help='Wait until the output is written to disk on each flush (default: \'no-fsync\')'
+)
+@click.option(
+    '--workers', '-w', default=1, type=click.INT,
+    help='The amount of consumer processes, whose outputs are merged at the end (default: \'1\')'
+)
+@click.option(
+    '--seed', default=None, type=click.INT,
+    help='The seed of the noise, to reproduce a run. (default: the configured seed or a random one)'
+)
+@click.option(
+    '--output-format', '-f', default='csv', type=click.Choice(['csv', 'binary']),
+    help='The format of the output file. (default: \'csv\')'
+)
+@click.option(
+    '--aggregate', '-a', 'aggregate_minutes', multiple=True, type=click.INT,
+    help='Aggregate the energy in tumbling windows of this many minutes, for example \'-a 1 -a 15 -a 60\'.'
+)
+@click.option(
+    '--drop-raw', is_flag=True,
+    help='Only write the aggregates, not one row per sample.'
+)
+@click.option(
+    '--rotate', default=None, type=click.Choice(sorted(rotation.ROTATION_INTERVALS)),
+    help='Split the output into one segment per hour or day of the sample timestamps. (default: \'None\')'
+)
+@click.option(
+    '--rotate-size', default=0, type=click.INT,
+    help='Split the output into segments of about this many MiB. (default: \'0\' = disabled)'
+)
+@click.option(
+    '--compression', default='gzip', type=click.Choice(['none'] + sorted(rotation.COMPRESSIONS)),
+    help='The compression of closed segments, applied in the background. (default: \'gzip\')'
+)
+@click.option(
+    '--group-commit', is_flag=True,
+    help='Acknowledge messages once per flush, after their rows were fsynced.'
+)
+@click.option(
+    '--measure-lag', is_flag=True,
+    help='Record the lag between the sample timestamps and their processing. Meant for the endless meter mode.'
+)
+@click.option(
+    '--lag-report-interval', default=0, type=click.FLOAT,
+    help='Report the queue depth and how long the consumer needs to drain it every this many seconds. (default: \'0\' = disabled)'
+)
+@click.option(
+    '--metrics-interval', default=0, type=click.FLOAT,
+    help='Print a stats line with the metrics every this many seconds. (default: \'0\' = disabled)'
+)
+@click.option(
+    '--metrics-file', default=None, type=click.STRING,
+    help='Write the metrics in the Prometheus text format to this file. (default: \'None\')'
 )
 @click.option(
     '--config', '-c', default=None, type=click.STRING,
     help='The filepath to an optional configuration file. (default: \'None\')'
 )
-def main(output, idletime, config):
+def main(
+        output, idletime, consuming_mode, prefetch, batch_size, quiet,
+        flush_rows, flush_interval, fsync, workers, seed,
+        output_format, aggregate_minutes, drop_raw, rotate, rotate_size, compression, group_commit, measure_lag,
+        lag_report_interval, metrics_interval, metrics_file, config
+    ):
     # If the config filepath was passed, try to load it
     if config:
         configuration.read_config_file(config)
+    seed = noise.get_seed(seed)
+    configuration.CONFIGURATION['seed'] = str(seed)
+    if not quiet:
+        print("Using the noise seed", seed)
 
     # Run the simulation until it stops or is cancelled
     try:
-        simulate_photovoltaic_consumer(output, idletime)
+        simulate_photovoltaic_consumer(
+            output, idletime, consuming_mode, prefetch, batch_size, quiet,
+            flush_rows, flush_interval, fsync, workers, measure_lag,
+            metrics_interval, metrics_file, group_commit, output_format,
+            [minutes * 60 for minutes in aggregate_minutes], drop_raw, lag_report_interval,
+            rotation.ROTATION_INTERVALS.get(rotate), rotate_size * 1024 * 1024 or None,
+            None if compression == 'none' else compression
+        )
     except KeyboardInterrupt:
         print("Execution was cancelled by user!")
         exit(0)
@@ -0,0 +1,154 @@
+import calendar
+import click
+import sys
+
+from pvsimulator import filewriter
+from pvsimulator.simulations import configuration
+from pvsimulator.simulations import meter
+from pvsimulator.simulations import noise
+from pvsimulator.simulations import photovoltaic
+
+
+def meter_samples(start, stop, timestep, chunk_size = 86400, seed = None):
+    '''
+    Lazily generates the meter samples for all timestamps in [start, stop).
+
+    Params:
+        start: The first timestamp in seconds since epoch.
+        stop: The timestamp in seconds since epoch, at which to stop (exclusive).
+        timestep: The amount of seconds between two samples.
+        chunk_size: The maximum amount of samples per chunk.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+
+    Yields:
+        Tuples of a timestamps array and a meter power values array.
+    '''
+    return meter.iterate_meter_range(start, stop, timestep, chunk_size, seed)
+
+def pv_rows(samples, seed = None):
+    '''
+    Lazily computes the photovoltaic values for chunks of meter samples.
+
+    Params:
+        samples: An iterable of (timestamps, meter power values) array tuples.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+
+    Yields:
+        Tuples of the timestamps, meter power, photovoltaic power
+        and combined power arrays. The same columns the PV_Simulator writes.
+    '''
+    seed = noise.get_seed(seed)
+    for timestamps, meter_power_values in samples:
+        random_absolute_pv_power_values = photovoltaic.generate_pv_values(timestamps, seed)
+        combined_power_values = random_absolute_pv_power_values + meter_power_values
+        yield (
+            timestamps,
+            meter_power_values,
+            random_absolute_pv_power_values,
+            combined_power_values
+        )
+
+def write_rows(rows, writer):
+    '''
+    Writes chunks of output columns to a writer.
+
+    Params:
+        rows: An iterable of column array tuples, as yielded by pv_rows.
+        writer: A filewriter.BufferedFileWriter or filewriter.BinaryRecordWriter.
+
+    Returns:
+        The amount of written rows.
+    '''
+    row_count = 0
+    for columns in rows:
+        writer.write_columns(*columns)
+        row_count += len(columns[0])
+    return row_count
+
+def run_pipeline(
+        start, stop, timestep, output_filepath, chunk_size = 86400, seed = None,
+        output_format = 'csv'
+    ):
+    '''
+    Runs the meter, the photovoltaic computation and the output writer
+    as one streaming pipeline, without any broker in between.
+    Only one chunk of samples is held in memory at a time.
+
+    Params:
+        start: The first timestamp in seconds since epoch.
+        stop: The timestamp in seconds since epoch, at which to stop (exclusive).
+        timestep: The amount of seconds between two samples.
+        output_filepath: The file, to which the output will be appended.
+        chunk_size: The maximum amount of samples per chunk.
+        seed: The seed of the noise. Defaults to the configured seed, see noise.get_seed.
+            The output only depends on the seed, not on the chunk_size.
+        output_format: Either 'csv' or 'binary', see filewriter.BinaryRecordWriter.
+
+    Returns:
+        The amount of written rows.
+    '''
+    with filewriter.create_writer(
+            output_filepath, output_format, flush_rows = None, flush_interval = None
+        ) as writer:
+        samples = meter_samples(start, stop, timestep, chunk_size, seed)
+        return write_rows(pv_rows(samples, seed), writer)
+
+def to_timestamp(date_time):
+    '''
+    Converts a naive datetime, interpreted as UTC, to seconds since epoch.
+    '''
+    return calendar.timegm(date_time.utctimetuple())
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+@click.command()
+@click.option(
+    '--start', '-s', default='2009-07-09', type=click.DateTime(DATE_FORMATS),
+    help='The first simulated point in time in UTC. (default: \'2009-07-09\')'
+)
+@click.option(
+    '--end', '-e', default='2009-07-10', type=click.DateTime(DATE_FORMATS),
+    help='The simulated point in time in UTC, at which to stop. (default: \'2009-07-10\')'
+)
+@click.option(
+    '--timestep', '-t', default=1, type=click.INT,
+    help='The amount of simulated seconds between each sample. (default: \'1\')'
+)
+@click.option(
+    '--output', '-o', default='output.csv', type=click.STRING,
+    help='The file, to which the output will be written to (default: \'output.csv\')'
+)
+@click.option(
+    '--chunk-size', default=86400, type=click.INT,
+    help='The amount of samples, that are computed at once. (default: \'86400\')'
+)
+@click.option(
+    '--seed', default=None, type=click.INT,
+    help='The seed of the noise, to reproduce a run. (default: the configured seed or a random one)'
+)
+@click.option(
+    '--output-format', '-f', default='csv', type=click.Choice(['csv', 'binary']),
+    help='The format of the output file. (default: \'csv\')'
+)
+@click.option(
+    '--config', '-c', default=None, type=click.STRING,
+    help='The filepath to an optional configuration file. (default: \'None\')'
+)
+def main(start, end, timestep, output, chunk_size, seed, output_format, config):
+    # If the config filepath was passed, try to load it
+    if config:
+        configuration.read_config_file(config)
+
+    try:
+        seed = noise.get_seed(seed)
+        print("Using the noise seed", seed)
+        row_count = run_pipeline(
+            to_timestamp(start), to_timestamp(end), timestep, output, chunk_size, seed,
+            output_format
+        )
+        print("Wrote", row_count, "rows to", output)
+    except KeyboardInterrupt:
+        print("Execution was cancelled by user!")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import collections
+import hashlib
+import os
+import threading
+
+import numpy
+
+from pvsimulator.simulations import configuration
+from pvsimulator.simulations import solar
+
+SECONDS_PER_DAY = 86400
+
+# The amount of days, whose tables a DailyProfile keeps
+DAILY_CACHE_SIZE = 4
+
+PV_MODELS = ('curve', 'solar')
+
+
+class ProfileTable(object):
+    """
+    The ProfileTable holds a normalized daily curve, precomputed once per second of the day.
+    Looking values up in it replaces the evaluation of the curve formula on the hot paths.
+    """
+    def __init__(self, values):
+        """
+        Params:
+            values: The curve values at the seconds 0 to 86400 of a day (86401 values).
+                The last value is only used to interpolate within the last second.
+        """
+        if len(values) != SECONDS_PER_DAY + 1:
+            raise ValueError(
+                "A profile table needs " + str(SECONDS_PER_DAY + 1) + " values!"
+            )
+        self._values = numpy.ascontiguousarray(values, dtype = numpy.float64)
+        # Indexing a list is faster than indexing an array for single values
+        self._value_list = self._values.tolist()
+
+    @classmethod
+    def from_function(cls, function):
+        """
+        Builds a table by evaluating a vectorized curve function, which expects
+        the normalized daytime (0 -> 00:00:00 || 1 -> 24:00:00), once per second.
+        """
+        return cls(function(numpy.arange(SECONDS_PER_DAY + 1) / SECONDS_PER_DAY))
+
+    @property
+    def values(self):
+        return self._values
+
+    def value_at(self, t):
+        """
+        Returns the curve value at a single seconds since epoch timestamp.
+        Sub-second timestamps are interpolated linearly.
+        """
+        second_of_day = t % SECONDS_PER_DAY
+        index = int(second_of_day)
+        fraction = second_of_day - index
+        if not fraction:
+            return self._value_list[index]
+        lower = self._value_list[index]
+        return lower + (self._value_list[index + 1] - lower) * fraction
+
+    def lookup(self, timestamps, interpolate = True):
+        """
+        Returns the curve values for an array of seconds since epoch timestamps.
+
+        Params:
+            timestamps: An array of timestamps.
+            interpolate: If True, sub-second timestamps are interpolated linearly.
+                Otherwise they are truncated to the full second.
+        """
+        timestamps = numpy.asarray(timestamps)
+        if numpy.issubdtype(timestamps.dtype, numpy.integer):
+            return self._values[timestamps % SECONDS_PER_DAY]
+
+        seconds_of_day = timestamps % SECONDS_PER_DAY
+        indices = seconds_of_day.astype(numpy.int64)
+        if not interpolate:
+            return self._values[indices]
+        fractions = seconds_of_day - indices
+        lower = self._values[indices]
+        return lower + (self._values[indices + 1] - lower) * fractions
+
+class DailyProfile(object):
+    """
+    The DailyProfile is the counterpart of the ProfileTable for curves, that change from day to day.
+    It builds one ProfileTable per day from a function of the timestamps, once the day is looked up first.
+    The tables of the latest used days are kept, so consecutive lookups of a day cost the same as with a ProfileTable.
+    """
+    def __init__(self, function, cache_size = DAILY_CACHE_SIZE):
+        """
+        Params:
+            function: A vectorized function, which expects an array of seconds since epoch timestamps.
+            cache_size: The amount of days, whose tables are kept.
+        """
+        self._function = function
+        self._cache_size = cache_size
+        self._tables = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # The latest looked up day, which is checked without the lock
+        self._latest = (None, None)
+
+    def table_of_day(self, day):
+        """
+        Returns the ProfileTable of a day, counted in days since epoch.
+        """
+        latest_day, latest_table = self._latest
+        if day == latest_day:
+            return latest_table
+        table = self._table_of_day(day)
+        self._latest = (day, table)
+        return table
+
+    def _table_of_day(self, day):
+        with self._lock:
+            table = self._tables.get(day)
+            if table is not None:
+                self._tables.move_to_end(day)
+                return table
+        # Built outside of the lock, a concurrent build of the same day is harmless
+        table = ProfileTable(self._function(day * SECONDS_PER_DAY + numpy.arange(SECONDS_PER_DAY + 1)))
+        with self._lock:
+            self._tables[day] = table
+            while len(self._tables) > self._cache_size:
+                self._tables.popitem(last = False)
+        return table
+
+    def value_at(self, t):
+        """
+        Returns the curve value at a single seconds since epoch timestamp.
+        """
+        return self.table_of_day(int(t // SECONDS_PER_DAY)).value_at(t)
+
+    def lookup(self, timestamps, interpolate = True):
+        """
+        Returns the curve values for an array of seconds since epoch timestamps, see ProfileTable.lookup.
+        """
+        timestamps = numpy.asarray(timestamps)
+        if not len(timestamps):
+            return numpy.empty(0)
+        days = timestamps // SECONDS_PER_DAY
+        first_day = int(days.min())
+        last_day = int(days.max())
+        if first_day == last_day:
+            return self.table_of_day(first_day).lookup(timestamps, interpolate)
+
+        values = numpy.empty(len(timestamps))
+        for day in range(first_day, last_day + 1):
+            in_day = days == day
+            if in_day.any():
+                values[in_day] = self.table_of_day(day).lookup(timestamps[in_day], interpolate)
+        return values
+
+def _function_fingerprint(function):
+    """
+    Returns a short hash of the code of a function.
+    It is part of the cache file name, so changed formulas never use outdated tables.
+    """
+    code = function.__code__
+    fingerprint = hashlib.sha1(code.co_code)
+    fingerprint.update(repr(code.co_consts).encode('utf-8'))
+    return fingerprint.hexdigest()[:12]
+
+def load_or_build(name, function, cache_directory = None):
+    """
+    Loads a profile table from the cache directory or builds it from the function.
+    A newly built table is written to the cache directory for the next run.
+
+    Params:
+        name: The name of the profile, used for the cache file name.
+        function: The vectorized curve function, see ProfileTable.from_function.
+        cache_directory: The directory of the cache files. Disabled if empty or None.
+    """
+    if not cache_directory:
+        return ProfileTable.from_function(function)
+
+    cache_filepath = os.path.join(
+        cache_directory,
+        name + '-' + _function_fingerprint(function) + '.npy'
+    )
+    try:
+        return ProfileTable(numpy.load(cache_filepath))
+    except (OSError, ValueError):
+        pass
+
+    table = ProfileTable.from_function(function)
+    try:
+        os.makedirs(cache_directory, exist_ok = True)
+        # Write to a temporary file first, so other processes never read a half written table
+        temporary_filepath = cache_filepath + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filepath, 'wb') as f:
+            numpy.save(f, table.values)
+        os.replace(temporary_filepath, cache_filepath)
+    except OSError as e:
+        print("Could not write profile cache file", cache_filepath, ":", e)
+    return table
+
+_PROFILES = {}
+_PROFILES_LOCK = threading.Lock()
+
+def _get_profile(name, function_loader):
+    """
+    Returns the profile table with the name, building it on first use.
+    """
+    table = _PROFILES.get(name)
+    if table is None:
+        with _PROFILES_LOCK:
+            table = _PROFILES.get(name)
+            if table is None:
+                table = load_or_build(
+                    name,
+                    function_loader(),
+                    configuration.CONFIGURATION.get('profile_cache_directory')
+                )
+                _PROFILES[name] = table
+    return table
+
+def get_meter_profile():
+    """
+    Returns the profile table of the normalized household consumption.
+    """
+    def load_function():
+        from pvsimulator.simulations.meter import get_normalized_meter_values
+        return get_normalized_meter_values
+    return _get_profile('meter', load_function)
+
+def get_pv_profile():
+    """
+    Returns the profile of the normalized photovoltaic output of the configured pv_model:
+    A ProfileTable of the daily curve for 'curve' or a DailyProfile of the configured site for 'solar'.
+
+    Raises:
+        ValueError if the pv_model is unknown.
+    """
+    pv_model = configuration.CONFIGURATION.get('pv_model') or 'curve'
+    if pv_model == 'solar':
+        return _get_solar_profile()
+    if pv_model != 'curve':
+        raise ValueError(
+            "Unknown pv model: '" + str(pv_model) + "'!"
+        )
+    def load_function():
+        from pvsimulator.simulations.photovoltaic import get_normalized_pv_values
+        return get_normalized_pv_values
+    return _get_profile('pv', load_function)
+
+def _get_solar_profile():
+    """
+    Returns the DailyProfile of the solar model for the configured site, building it on first use.
+    """
+    # Keyed by the configured values, so they are only parsed once per site
+    name = (
+        'pv-solar',
+        configuration.CONFIGURATION['latitude'],
+        configuration.CONFIGURATION['longitude'],
+        configuration.CONFIGURATION['tilt'],
+        configuration.CONFIGURATION['azimuth']
+    )
+    profile = _PROFILES.get(name)
+    if profile is None:
+        site = solar.get_site()
+        with _PROFILES_LOCK:
+            profile = _PROFILES.setdefault(
+                name,
+                DailyProfile(lambda timestamps: solar.get_normalized_pv_values(timestamps, site))
+            )
+    return profile
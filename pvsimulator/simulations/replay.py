@@ -0,0 +1,337 @@
+import click
+import mmap
+import os
+import sys
+import time
+
+import numpy
+
+from pvsimulator import codec
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.simulations import configuration
+from pvsimulator.simulations.meter import construct_binary_messages
+
+# The amount of bytes, that are read from a file at once
+CHUNK_BYTES = 8 * 1024 * 1024
+
+JSON_MESSAGE_TEMPLATE = b'{"timestamp": %s, "meter_power_value_watt": %s}'
+
+
+def find_csv_files(paths):
+    '''
+    Returns the csv files of the paths.
+    Directories are replaced by the csv files they contain, ordered by their name,
+    so the daily partitions of a backfill are replayed in order.
+    '''
+    filepaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            filepaths.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith('.csv')
+            )
+        else:
+            filepaths.append(path)
+    return filepaths
+
+def iterate_chunks(filepath, chunk_bytes = CHUNK_BYTES):
+    '''
+    Reads a file through a memory map in chunks of about chunk_bytes bytes.
+    Each chunk ends at a line break, so no line is split between two chunks.
+
+    Yields:
+        The chunks as bytes.
+    '''
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped_file:
+            start = 0
+            size = len(mapped_file)
+            while start < size:
+                stop = min(start + chunk_bytes, size)
+                if stop < size:
+                    line_end = mapped_file.rfind(b'\n', start, stop)
+                    if line_end == -1:
+                        # A single line is longer than a chunk
+                        line_end = mapped_file.find(b'\n', stop)
+                        if line_end == -1:
+                            line_end = size - 1
+                    stop = line_end + 1
+                yield mapped_file[start:stop]
+                start = stop
+
+def _iterate_rows(chunk, first_chunk = False):
+    '''
+    Splits the lines of a chunk into the raw timestamp and meter power value fields, see split_columns.
+
+    Yields:
+        Tuples of the index of the line in the chunk, the timestamp field and the meter power value field.
+    '''
+    lines = chunk.splitlines()
+    first_index = 0
+    if first_chunk and lines:
+        try:
+            float(lines[0].split(b',', 1)[0])
+        except ValueError:
+            first_index = 1
+
+    for index in range(first_index, len(lines)):
+        fields = lines[index].split(b',', 2)
+        if len(fields) < 2:
+            continue
+        yield index, fields[0], fields[1].strip()
+
+def split_columns(chunk, first_chunk = False):
+    '''
+    Splits the lines of a chunk into the raw timestamp and meter power value fields.
+    The values are not parsed. Empty lines are skipped.
+
+    Params:
+        chunk: The lines as bytes.
+        first_chunk: If True, the chunk is the start of a file and its first line is skipped,
+            if it is a header, whose first field is not a number.
+
+    Returns:
+        A tuple of a list of timestamp fields and a list of meter power value fields, as bytes.
+    '''
+    timestamp_fields = []
+    meter_power_fields = []
+    for _, timestamp_field, meter_power_field in _iterate_rows(chunk, first_chunk):
+        timestamp_fields.append(timestamp_field)
+        meter_power_fields.append(meter_power_field)
+    return timestamp_fields, meter_power_fields
+
+def parse_columns(timestamp_fields, meter_power_fields):
+    '''
+    Parses the raw fields of a chunk at once, instead of line by line.
+
+    Returns:
+        A tuple of the timestamps array and the meter power values array.
+
+    Raises:
+        ValueError if a field is not a finite number.
+    '''
+    timestamps = numpy.array(timestamp_fields).astype(numpy.float64)
+    meter_power_values = numpy.array(meter_power_fields).astype(numpy.float64)
+    if not (numpy.isfinite(timestamps).all() and numpy.isfinite(meter_power_values).all()):
+        raise ValueError("A field is not a finite number!")
+    return timestamps, meter_power_values
+
+def split_valid_columns(chunk, first_chunk = False):
+    '''
+    Splits the lines of a chunk like split_columns and parses them with parse_columns.
+    Only if the chunk contains an invalid line, its lines are checked one by one
+    and the lines, whose fields are not finite numbers, are dropped.
+
+    Returns:
+        A tuple of the timestamp fields, the meter power value fields, the timestamps array,
+        the meter power values array and a list of the indices of the dropped lines in the chunk.
+    '''
+    timestamp_fields, meter_power_fields = split_columns(chunk, first_chunk)
+    try:
+        timestamps, meter_power_values = parse_columns(timestamp_fields, meter_power_fields)
+        return timestamp_fields, meter_power_fields, timestamps, meter_power_values, []
+    except ValueError:
+        pass
+
+    timestamp_fields = []
+    meter_power_fields = []
+    invalid_line_indices = []
+    for index, timestamp_field, meter_power_field in _iterate_rows(chunk, first_chunk):
+        try:
+            parse_columns([timestamp_field], [meter_power_field])
+        except ValueError:
+            invalid_line_indices.append(index)
+            continue
+        timestamp_fields.append(timestamp_field)
+        meter_power_fields.append(meter_power_field)
+    timestamps, meter_power_values = parse_columns(timestamp_fields, meter_power_fields)
+    return timestamp_fields, meter_power_fields, timestamps, meter_power_values, invalid_line_indices
+
+def construct_json_messages(timestamp_fields, meter_power_fields):
+    '''
+    Constructs the JSON message bodies directly from the raw fields, without formatting the numbers.
+    The fields have to be validated before, see split_valid_columns.
+    '''
+    return [
+        JSON_MESSAGE_TEMPLATE % fields
+        for fields in zip(timestamp_fields, meter_power_fields)
+    ]
+
+def replay(
+        paths, speedup = 0, batch_size = 1000, encoding = 'json', samples_per_message = 1,
+        confirm = False, quiet = False, chunk_bytes = CHUNK_BYTES
+    ):
+    '''
+    Publishes the meter values of csv files into the queue.
+    The files have the layout of the Photovoltaic output: 'timestamp,meter_power_value,...'.
+    They are read in chunks through a memory map, so they do not have to fit into memory.
+    Lines, whose values are not finite numbers, are skipped and reported with their file and line.
+    After all files, it will send the stop message.
+
+    Params:
+        paths: The csv files or directories of csv files to replay.
+        speedup: Replay the values this many times faster than their timestamps.
+            Disabled if 0, then the values are published as fast as possible.
+        batch_size: The maximum amount of messages, that are published at once.
+        encoding: The message encoding. Either 'json' or 'binary'.
+            The json messages are built from the text of the validated values.
+        samples_per_message: The amount of samples per message in the binary encoding.
+        confirm: If True, each batch is confirmed by the broker.
+        quiet: If True, the replayed files are not printed.
+        chunk_bytes: The amount of bytes, that are read from a file at once.
+
+    Returns:
+        The amount of published values.
+    '''
+    meter = QueueClient(
+        host = configuration.CONFIGURATION['host'],
+        username = configuration.CONFIGURATION['username'],
+        password = configuration.CONFIGURATION['password'],
+        queue_name = configuration.CONFIGURATION['queue_name'],
+        transport = configuration.CONFIGURATION['transport']
+    )
+    meter.connect()
+    meter.purge_queue()
+
+    # The values of a batch, that fit into batch_size messages
+    values_per_batch = batch_size * samples_per_message if encoding == 'binary' else batch_size
+    published_count = 0
+    first_timestamp = None
+    start_time = None
+    try:
+        for filepath in find_csv_files(paths):
+            if not quiet:
+                print("Replaying", filepath)
+            # The number of the first line of the current chunk in the file
+            line_number = 1
+            for chunk_index, chunk in enumerate(iterate_chunks(filepath, chunk_bytes)):
+                timestamp_fields, meter_power_fields, timestamps, meter_power_values, invalid_line_indices = \
+                    split_valid_columns(chunk, chunk_index == 0)
+                for index in invalid_line_indices:
+                    print(
+                        "Skipped line", line_number + index, "of",
+                        filepath + ", since its values are not finite numbers"
+                    )
+                line_number += chunk.count(b'\n')
+                if not timestamp_fields:
+                    continue
+                if speedup and first_timestamp is None:
+                    first_timestamp = timestamps[0]
+                    start_time = time.monotonic()
+
+                batch_start = 0
+                while batch_start < len(timestamp_fields):
+                    batch_stop = min(batch_start + values_per_batch, len(timestamp_fields))
+                    if speedup:
+                        batch_stop = _wait_until_due(
+                            timestamps, batch_start, batch_stop,
+                            (first_timestamp, start_time, speedup)
+                        )
+                    _publish_values(
+                        meter, encoding, samples_per_message, confirm,
+                        timestamp_fields[batch_start:batch_stop],
+                        meter_power_fields[batch_start:batch_stop],
+                        timestamps[batch_start:batch_stop],
+                        meter_power_values[batch_start:batch_stop]
+                    )
+                    published_count += batch_stop - batch_start
+                    batch_start = batch_stop
+    finally:
+        meter.publish_message("STOP_SIMULATION")
+    if not quiet:
+        print("Replayed", published_count, "values")
+    return published_count
+
+def _wait_until_due(timestamps, batch_start, batch_stop, schedule):
+    '''
+    Waits until the first value of the batch is due and shortens the batch
+    to the values, that are due by then.
+
+    Params:
+        schedule: A tuple of the first replayed timestamp, the monotonic time, when it was replayed,
+            and the speedup.
+
+    Returns:
+        The new end of the batch.
+    '''
+    first_timestamp, start_time, speedup = schedule
+    delay = start_time + (timestamps[batch_start] - first_timestamp) / speedup - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    due_timestamp = first_timestamp + (time.monotonic() - start_time) * speedup
+    due_stop = batch_start + int(numpy.searchsorted(
+        timestamps[batch_start:batch_stop], due_timestamp, side = 'right'
+    ))
+    return max(due_stop, batch_start + 1)
+
+def _publish_values(
+        meter, encoding, samples_per_message, confirm,
+        timestamp_fields, meter_power_fields, timestamps, meter_power_values
+    ):
+    '''
+    Publishes a batch of values as one batch of messages.
+    The binary messages are built from the parsed values, the json messages from the raw fields.
+    '''
+    if encoding == 'binary':
+        message_bodies = construct_binary_messages(
+            timestamps.astype(numpy.int64),
+            meter_power_values,
+            samples_per_message
+        )
+    else:
+        message_bodies = construct_json_messages(timestamp_fields, meter_power_fields)
+    meter.publish_batch(
+        message_bodies,
+        confirm = confirm,
+        content_type = codec.CONTENT_TYPES[encoding]
+    )
+
+@click.command()
+@click.option(
+    '--input', '-i', 'inputs', required=True, multiple=True, type=click.STRING,
+    help='A csv file or a directory of csv files to replay. Can be given multiple times.'
+)
+@click.option(
+    '--speedup', default=0, type=click.FLOAT,
+    help='Replay the values this many times faster than their timestamps. (default: \'0\' = as fast as possible)'
+)
+@click.option(
+    '--batch-size', '-b', default=1000, type=click.INT,
+    help='The maximum amount of messages, that are published at once. (default: \'1000\')'
+)
+@click.option(
+    '--encoding', '-e', default='json', type=click.Choice(['json', 'binary']),
+    help='The encoding of the published messages. (default: \'json\')'
+)
+@click.option(
+    '--samples-per-message', '-s', default=1, type=click.INT,
+    help='The amount of samples per message in the binary encoding. (default: \'1\')'
+)
+@click.option(
+    '--confirm', is_flag=True,
+    help='Let the broker confirm each published batch.'
+)
+@click.option(
+    '--quiet', '-q', is_flag=True,
+    help='Do not print the replayed files.'
+)
+@click.option(
+    '--config', '-c', default=None, type=click.STRING,
+    help='The filepath to an optional configuration file. (default: \'None\')'
+)
+def main(inputs, speedup, batch_size, encoding, samples_per_message, confirm, quiet, config):
+    if config:
+        configuration.read_config_file(config)
+
+    try:
+        replay(inputs, speedup, batch_size, encoding, samples_per_message, confirm, quiet)
+    except KeyboardInterrupt:
+        print("Execution was cancelled by user!")
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    sys.exit(main())
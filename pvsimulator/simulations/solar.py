@@ -0,0 +1,121 @@
+import collections
+
+import numpy
+
+from pvsimulator.simulations import configuration
+
+# The irradiance in W/m² at standard test conditions, at which a PV system delivers its peak power
+STC_IRRADIANCE = 1000.0
+# The direct normal irradiance in W/m² at the top of the atmosphere, as used by the Meinel model
+SOLAR_CONSTANT = 1353.0
+# The share of the diffuse to the direct irradiance under a clear sky
+DIFFUSE_FRACTION = 0.1
+# The share of the irradiance, that is reflected by the ground
+GROUND_ALBEDO = 0.2
+
+# The location and orientation of a PV system.
+# Angles are in degrees, the azimuth is measured clockwise from north (180 = facing south).
+Site = collections.namedtuple(
+    'Site',
+    ['latitude', 'longitude', 'tilt', 'azimuth']
+)
+
+
+def get_site():
+    '''
+    Returns the Site of the configuration.
+
+    Raises:
+        ValueError if a value of the site is not a number.
+    '''
+    values = []
+    for name in Site._fields:
+        try:
+            values.append(float(configuration.CONFIGURATION[name]))
+        except ValueError:
+            raise ValueError(
+                "The configured " + name + " '" + str(configuration.CONFIGURATION[name]) + "' is not a number!"
+            )
+    return Site(*values)
+
+def get_solar_position(timestamps, latitude, longitude):
+    '''
+    Computes the position of the sun with the low precision formulas of the Astronomical Almanac,
+    which are accurate to about 0.01 degrees between 1950 and 2050.
+
+    Params:
+        timestamps: An array of seconds since epoch timestamps (UTC).
+        latitude: The latitude of the site in degrees.
+        longitude: The longitude of the site in degrees, east is positive.
+
+    Returns:
+        A tuple of the arrays of the cosine of the zenith angle
+        and of the azimuth of the sun in radians, measured clockwise from north.
+    '''
+    # Days since the epoch J2000.0
+    n = numpy.asarray(timestamps, dtype = numpy.float64) / 86400.0 - 10957.5
+
+    mean_longitude = numpy.radians((280.460 + 0.9856474 * n) % 360)
+    mean_anomaly = numpy.radians((357.528 + 0.9856003 * n) % 360)
+    ecliptic_longitude = mean_longitude \
+        + numpy.radians(1.915) * numpy.sin(mean_anomaly) \
+        + numpy.radians(0.020) * numpy.sin(2 * mean_anomaly)
+    obliquity = numpy.radians(23.439 - 0.0000004 * n)
+
+    declination = numpy.arcsin(numpy.sin(obliquity) * numpy.sin(ecliptic_longitude))
+    right_ascension = numpy.arctan2(
+        numpy.cos(obliquity) * numpy.sin(ecliptic_longitude),
+        numpy.cos(ecliptic_longitude)
+    )
+    sidereal_time = numpy.radians((280.46061837 + 360.98564736629 * n) % 360)
+    hour_angle = sidereal_time + numpy.radians(longitude) - right_ascension
+
+    latitude = numpy.radians(latitude)
+    cos_zenith = numpy.sin(latitude) * numpy.sin(declination) \
+        + numpy.cos(latitude) * numpy.cos(declination) * numpy.cos(hour_angle)
+    azimuth = numpy.arctan2(
+        -numpy.cos(declination) * numpy.sin(hour_angle),
+        numpy.sin(declination) * numpy.cos(latitude)
+        - numpy.cos(declination) * numpy.sin(latitude) * numpy.cos(hour_angle)
+    )
+    return numpy.clip(cos_zenith, -1.0, 1.0), azimuth % (2 * numpy.pi)
+
+def get_clear_sky_irradiance(timestamps, site):
+    '''
+    Computes the irradiance on the plane of the PV modules under a clear sky.
+    The direct irradiance follows the Meinel model with the air mass of Kasten and Young,
+    the diffuse irradiance is a fixed share of it and both are transposed to the tilted plane
+    with an isotropic sky and ground.
+
+    Params:
+        timestamps: An array of seconds since epoch timestamps (UTC).
+        site: The Site of the PV system.
+
+    Returns:
+        An array with the irradiance in W/m².
+    '''
+    cos_zenith, solar_azimuth = get_solar_position(timestamps, site.latitude, site.longitude)
+    daylight = cos_zenith > 0
+    zenith_degrees = numpy.degrees(numpy.arccos(cos_zenith))
+
+    air_mass = numpy.ones_like(cos_zenith)
+    air_mass[daylight] = 1.0 / (
+        cos_zenith[daylight] + 0.50572 * (96.07995 - zenith_degrees[daylight]) ** -1.6364
+    )
+    direct_normal = numpy.where(daylight, SOLAR_CONSTANT * 0.7 ** (air_mass ** 0.678), 0.0)
+    diffuse_horizontal = DIFFUSE_FRACTION * direct_normal
+    global_horizontal = direct_normal * numpy.maximum(cos_zenith, 0) + diffuse_horizontal
+
+    tilt = numpy.radians(site.tilt)
+    cos_incidence = cos_zenith * numpy.cos(tilt) \
+        + numpy.sqrt(1 - cos_zenith ** 2) * numpy.sin(tilt) * numpy.cos(solar_azimuth - numpy.radians(site.azimuth))
+    return direct_normal * numpy.maximum(cos_incidence, 0) \
+        + diffuse_horizontal * (1 + numpy.cos(tilt)) / 2 \
+        + global_horizontal * GROUND_ALBEDO * (1 - numpy.cos(tilt)) / 2
+
+def get_normalized_pv_values(timestamps, site):
+    '''
+    Returns the output of the PV system relative to its peak power,
+    which is 1 at the irradiance of the standard test conditions.
+    '''
+    return get_clear_sky_irradiance(timestamps, site) / STC_IRRADIANCE
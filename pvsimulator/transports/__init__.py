@@ -0,0 +1,50 @@
+"""
+Transports move the messages of the QueueClients through a broker.
+"""
+from pvsimulator.transports.base import Delivery, Transport
+from pvsimulator.transports.memory import DEFAULT_BROKER, InMemoryBroker, InMemoryTransport
+
+TRANSPORTS = ('amqp', 'memory', 'shm')
+
+def create_transport(name, host = 'localhost', username = 'guest', password = 'guest'):
+    """
+    Creates a new transport by its name.
+
+    Params:
+        name: Either 'amqp' for a RabbitMQ instance, 'memory' for the in-process broker
+            or 'shm' for a shared memory ring between two processes on the same host.
+        host: The hostname of the RabbitMQ instance.
+        username: The username, which will be used to login to the RabbitMQ instance.
+        password: The password for the user.
+    """
+    if name == 'amqp':
+        # Only require amqpstorm, if RabbitMQ is actually used
+        from pvsimulator.transports.amqp import AMQPTransport
+        return AMQPTransport(host, username, password)
+    if name == 'memory':
+        return InMemoryTransport()
+    if name == 'shm':
+        from pvsimulator.transports.shm import SharedMemoryTransport
+        return SharedMemoryTransport()
+    raise ValueError(
+        "Unknown transport: '" + str(name) + "'!"
+    )
+
+def create_async_transport(name, host = 'localhost', username = 'guest', password = 'guest'):
+    """
+    Creates a new AsyncTransport by its name, for the use with an AsyncQueueClient.
+
+    Params:
+        name: Either 'amqp' for a RabbitMQ instance or 'memory' for the in-process broker.
+        host: The hostname of the RabbitMQ instance.
+        username: The username, which will be used to login to the RabbitMQ instance.
+        password: The password for the user.
+    """
+    from pvsimulator.transports import aio
+    if name == 'amqp':
+        return aio.AsyncAMQPTransport(host, username, password)
+    if name == 'memory':
+        return aio.AsyncInMemoryTransport()
+    raise ValueError(
+        "Unknown transport: '" + str(name) + "'!"
+    )
@@ -0,0 +1,268 @@
+import asyncio
+import concurrent.futures
+import threading
+
+from pvsimulator.transports.memory import IDLE_WAIT, InMemoryTransport
+
+# The time in seconds, after which an idle AMQP consumer checks its channel for errors
+ERROR_CHECK_INTERVAL = 1.0
+
+class AsyncTransport(object):
+    """
+    The AsyncTransport is the asyncio counterpart of the Transport.
+    All of its methods are coroutines, which never block the event loop while waiting for messages,
+    so many AsyncQueueClients can share one event loop.
+    """
+    async def connect(self):
+        """
+        Connect to the broker.
+
+        Raises:
+            PVConnectionError if the connection to the broker failed.
+        """
+        raise NotImplementedError("connect not implemented!")
+
+    async def declare_queue(self, queue_name):
+        """
+        Create the queue, if it does not exist yet.
+
+        Raises:
+            PVQueueConnectionError if the queue could not be declared.
+        """
+        raise NotImplementedError("declare_queue not implemented!")
+
+    async def publish(self, queue_name, message_body, content_type):
+        """
+        Publish a single message to the queue.
+        """
+        raise NotImplementedError("publish not implemented!")
+
+    async def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        """
+        Publish multiple messages to the queue at once.
+        If confirm is True, the broker has to confirm the whole batch before this coroutine returns.
+        """
+        raise NotImplementedError("publish_batch not implemented!")
+
+    async def get(self, queue_name):
+        """
+        Fetch a single message from the queue.
+
+        Returns:
+            A Delivery or None, if the queue is empty.
+        """
+        raise NotImplementedError("get not implemented!")
+
+    def consume(self, queue_name, prefetch_count):
+        """
+        Subscribe to the queue.
+
+        Returns:
+            An asynchronous iterator over the delivered messages as Deliveries.
+            The subscription is cancelled, once the iterator is closed.
+        """
+        raise NotImplementedError("consume not implemented!")
+
+    async def ack(self, delivery_tag, multiple = False):
+        """
+        Acknowledge a message.
+        If multiple is True, all unacknowledged messages up to the delivery tag are acknowledged as well.
+        """
+        raise NotImplementedError("ack not implemented!")
+
+    async def nack(self, delivery_tag, multiple = False, requeue = True):
+        """
+        Reject a message and requeue it, if requeue is True.
+        """
+        raise NotImplementedError("nack not implemented!")
+
+    async def purge(self, queue_name):
+        """
+        Delete all messages in the queue.
+        """
+        raise NotImplementedError("purge not implemented!")
+
+    async def close(self):
+        """
+        Close the connection to the broker.
+        """
+        raise NotImplementedError("close not implemented!")
+
+class AsyncInMemoryTransport(AsyncTransport):
+    """
+    The AsyncInMemoryTransport moves messages through an InMemoryBroker.
+    Consumers are woken up by the broker, instead of polling it.
+    It shares the broker with the blocking InMemoryTransport, so both kinds of clients can be mixed.
+    """
+    def __init__(self, broker = None):
+        """
+        Params:
+            broker: The InMemoryBroker to use. Defaults to the process wide DEFAULT_BROKER.
+        """
+        self._transport = InMemoryTransport(broker)
+        self._broker = self._transport._broker
+
+    async def connect(self):
+        self._transport.connect()
+
+    async def declare_queue(self, queue_name):
+        self._transport.declare_queue(queue_name)
+
+    async def publish(self, queue_name, message_body, content_type):
+        self._transport.publish(queue_name, message_body, content_type)
+
+    async def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        self._transport.publish_batch(queue_name, message_bodies, content_type, confirm)
+
+    async def get(self, queue_name):
+        return self._transport.get(queue_name)
+
+    async def consume(self, queue_name, prefetch_count):
+        loop = asyncio.get_running_loop()
+        messages_available = asyncio.Event()
+
+        def on_messages_put():
+            # Called by the broker, possibly from another thread
+            loop.call_soon_threadsafe(messages_available.set)
+
+        self._broker.add_listener(on_messages_put)
+        try:
+            while True:
+                messages_available.clear()
+                capacity = prefetch_count - self._transport.unacknowledged_count()
+                deliveries = self._transport.take_deliveries(queue_name, max(capacity, 0))
+                if not deliveries:
+                    if capacity > 0:
+                        await messages_available.wait()
+                    else:
+                        # Wait for the consumer to acknowledge messages
+                        await asyncio.sleep(IDLE_WAIT)
+                    continue
+                for delivery in deliveries:
+                    yield delivery
+        finally:
+            self._broker.remove_listener(on_messages_put)
+            self._transport.cancel(None)
+
+    async def ack(self, delivery_tag, multiple = False):
+        self._transport.ack(delivery_tag, multiple)
+
+    async def nack(self, delivery_tag, multiple = False, requeue = True):
+        self._transport.nack(delivery_tag, multiple, requeue)
+
+    async def purge(self, queue_name):
+        self._transport.purge(queue_name)
+
+    async def close(self):
+        self._transport.close()
+
+class AsyncAMQPTransport(AsyncTransport):
+    """
+    The AsyncAMQPTransport moves messages through a RabbitMQ instance.
+    It adapts the AMQPTransport to asyncio: All transports share one connection of the connection pool
+    and each opens its own channel on it. Remote procedure calls, like declaring or purging a queue,
+    wait for the broker in the default executor of the event loop. Publishing and acknowledging
+    never wait for the broker. A consumer subscribes with basic.consume and the delivered messages
+    are processed by process_data_events on a single executor thread of the transport,
+    which hands them to the event loop.
+    """
+    def __init__(self, host = 'localhost', username = 'guest', password = 'guest', connection_pool = None):
+        """
+        Params:
+            host: The hostname of the RabbitMQ instance.
+            username: The username, which will be used to login to the RabbitMQ instance.
+            password: The password for the user.
+            connection_pool: The AMQPConnectionPool to use. Defaults to the process wide DEFAULT_CONNECTION_POOL.
+        """
+        # Only require amqpstorm, if RabbitMQ is actually used
+        from pvsimulator.transports import amqp
+        self._transport = amqp.AMQPTransport(
+            host, username, password,
+            connection_pool = connection_pool or amqp.DEFAULT_CONNECTION_POOL
+        )
+        # The thread, which processes the delivered messages, once the transport consumes
+        self._events_executor = None
+
+    async def _run_in_executor(self, function, *args):
+        """
+        Runs a function, that waits for the broker, without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function, *args)
+
+    async def connect(self):
+        await self._run_in_executor(self._transport.connect)
+
+    async def declare_queue(self, queue_name):
+        await self._run_in_executor(self._transport.declare_queue, queue_name)
+
+    async def publish(self, queue_name, message_body, content_type):
+        self._transport.publish(queue_name, message_body, content_type)
+
+    async def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        if confirm:
+            await self._run_in_executor(
+                self._transport.publish_batch, queue_name, message_bodies, content_type, confirm
+            )
+        else:
+            self._transport.publish_batch(queue_name, message_bodies, content_type)
+
+    async def get(self, queue_name):
+        return await self._run_in_executor(self._transport.get, queue_name)
+
+    async def consume(self, queue_name, prefetch_count):
+        loop = asyncio.get_running_loop()
+        deliveries = asyncio.Queue()
+
+        def on_delivery(delivery):
+            # Called by process_data_events on the events thread
+            loop.call_soon_threadsafe(deliveries.put_nowait, delivery)
+
+        consumer_tag = await self._run_in_executor(
+            self._transport.consume, queue_name, on_delivery, prefetch_count
+        )
+        if self._events_executor is None:
+            self._events_executor = concurrent.futures.ThreadPoolExecutor(
+                1, thread_name_prefix = 'amqp-events'
+            )
+        stop_processing = threading.Event()
+
+        def process_events():
+            # Returns, once all delivered messages were processed and idles for a short time, if there were none
+            while not stop_processing.is_set():
+                self._transport.process_events()
+
+        processing = loop.run_in_executor(self._events_executor, process_events)
+        try:
+            while True:
+                try:
+                    delivery = await asyncio.wait_for(deliveries.get(), ERROR_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    if processing.done():
+                        # Raises, if the broker closed the channel or the connection in the meantime
+                        processing.result()
+                        return
+                    continue
+                yield delivery
+        finally:
+            stop_processing.set()
+            await asyncio.wait([processing])
+            # A failed channel has no consumer left to cancel
+            if processing.exception() is None:
+                # The deliveries, that were not yielded yet, are requeued as well
+                await self._run_in_executor(self._transport.cancel, consumer_tag)
+
+    async def ack(self, delivery_tag, multiple = False):
+        self._transport.ack(delivery_tag, multiple)
+
+    async def nack(self, delivery_tag, multiple = False, requeue = True):
+        self._transport.nack(delivery_tag, multiple, requeue)
+
+    async def purge(self, queue_name):
+        await self._run_in_executor(self._transport.purge, queue_name)
+
+    async def close(self):
+        if self._events_executor:
+            self._events_executor.shutdown(wait = True)
+            self._events_executor = None
+        await self._run_in_executor(self._transport.close)
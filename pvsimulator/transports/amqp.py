@@ -0,0 +1,263 @@
+import threading
+
+import amqpstorm
+
+from pvsimulator.exceptions import *
+from pvsimulator.transports.base import Delivery, Transport
+
+class AMQPConnectionPool(object):
+    """
+    The AMQPConnectionPool shares one connection per RabbitMQ instance and user between the transports,
+    that each open their own channel on it. All channels of a connection are served
+    by the single IO thread of the connection, instead of one per transport.
+    It only uses the public API of amqpstorm and is tested with the version pinned in requirements.txt (2.8.4).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The connection and the amount of transports using it, by the host and the login
+        self._connections = {}
+
+    def acquire(self, host, username, password):
+        """
+        Returns the shared connection to the RabbitMQ instance and connects it, if it is not yet connected.
+        Each acquired connection has to be released again.
+        """
+        key = (host, username, password)
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is None or entry[0].is_closed:
+                entry = [amqpstorm.Connection(host, username, password), 0]
+                self._connections[key] = entry
+            entry[1] += 1
+            return entry[0]
+
+    def open_channel(self, connection, rpc_timeout = 60):
+        """
+        Opens a new channel on the connection.
+
+        Raises:
+            AMQPConnectionError if the connection has no channel left.
+        """
+        return connection.channel(rpc_timeout = rpc_timeout)
+
+    def release(self, connection):
+        """
+        Releases an acquired connection and closes it, once no transport uses it anymore.
+        """
+        with self._lock:
+            for key, entry in list(self._connections.items()):
+                if entry[0] is not connection:
+                    continue
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return
+                del self._connections[key]
+        connection.close()
+
+# The pool of the process, which the AsyncAMQPTransports share by default
+DEFAULT_CONNECTION_POOL = AMQPConnectionPool()
+
+class AMQPTransport(Transport):
+    """
+    The AMQPTransport moves messages through a RabbitMQ instance.
+    """
+    def __init__(self, host = 'localhost', username = 'guest', password = 'guest', connection_pool = None):
+        """
+        Params:
+            host: The hostname of the RabbitMQ instance.
+            username: The username, which will be used to login to the RabbitMQ instance.
+            password: The password for the user.
+            connection_pool: An optional AMQPConnectionPool.
+                If given, the transport only opens its own channel on the shared connection
+                to the RabbitMQ instance, instead of its own connection.
+        """
+        self._host = host
+        self._username = username
+        self._password = password
+        self._connection_pool = connection_pool
+
+        self._connection = None
+        self._channel = None
+        # The channel of the confirmed batches, which is opened on the first one
+        self._confirm_channel = None
+
+    def connect(self):
+        try:
+            if self._connection_pool:
+                self._connection = self._connection_pool.acquire(
+                    self._host,
+                    self._username,
+                    self._password
+                )
+            else:
+                self._connection = amqpstorm.Connection(
+                    self._host,
+                    self._username,
+                    self._password
+                )
+            self._channel = self._open_channel()
+        except amqpstorm.AMQPConnectionError as e:
+            print(e)
+            raise PVConnectionError(
+                "Could not connect to RabbitMQ Service"
+            )
+
+    def _open_channel(self):
+        """
+        Opens a new channel on the connection of the transport.
+        """
+        if self._connection_pool:
+            return self._connection_pool.open_channel(self._connection)
+        return self._connection.channel()
+
+    def declare_queue(self, queue_name):
+        try:
+            self._channel.queue.declare(
+                queue_name
+            )
+        except amqpstorm.AMQPConnectionError as e:
+            print(e)
+            raise PVQueueConnectionError(
+                "Could not connect to Queue: ", queue_name
+            )
+
+    def publish(self, queue_name, message_body, content_type):
+        message = amqpstorm.Message.create(
+            self._channel,
+            message_body,
+            properties = {
+                'content_type': content_type
+            }
+        )
+        try:
+            message.publish(queue_name)
+        except amqpstorm.exception.AMQPInvalidArgument as e:
+            print(e)
+            raise PVMessagePublishingError(
+                "Could not publish message: '", message_body, "'!"
+            )
+
+    def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        properties = {
+            'content_type': content_type
+        }
+        try:
+            channel = self._channel
+            if confirm:
+                # The publisher confirms of amqpstorm wait for each message on its own.
+                # A transaction lets the broker confirm the whole batch at once instead.
+                # It lives on its own channel, since a channel can not leave the transaction mode
+                # and every other message on it would have to be committed as well.
+                if self._confirm_channel is None:
+                    self._confirm_channel = self._open_channel()
+                    self._confirm_channel.tx.select()
+                channel = self._confirm_channel
+
+            for message_body in message_bodies:
+                channel.basic.publish(
+                    message_body,
+                    queue_name,
+                    properties = properties
+                )
+
+            if confirm:
+                channel.tx.commit()
+        except (amqpstorm.AMQPInvalidArgument, amqpstorm.AMQPChannelError) as e:
+            print(e)
+            raise PVMessagePublishingError(
+                "Could not publish batch of", len(message_bodies), "messages!"
+            )
+
+    def get(self, queue_name):
+        message = self._channel.basic.get(
+            queue = queue_name,
+            no_ack = False,
+            auto_decode = False
+        )
+        if not message:
+            return None
+        return self._to_delivery(message)
+
+    def consume(self, queue_name, callback, prefetch_count):
+        self._channel.basic.qos(prefetch_count = prefetch_count)
+        return self._channel.basic.consume(
+            lambda message: callback(self._to_delivery(message)),
+            queue = queue_name,
+            no_ack = False
+        )
+
+    def process_events(self):
+        # Returns, once all delivered messages were processed.
+        # Idles for a short time, if there were none.
+        self._channel.process_data_events(auto_decode = False)
+
+    def cancel(self, consumer_tag):
+        self._channel.basic.cancel(consumer_tag)
+        # Hand prefetched but unprocessed messages back to the queue
+        self._channel.basic.recover(requeue = True)
+
+    def ack(self, delivery_tag, multiple = False):
+        self._channel.basic.ack(
+            delivery_tag,
+            multiple = multiple
+        )
+
+    def nack(self, delivery_tag, multiple = False, requeue = True):
+        self._channel.basic.nack(
+            delivery_tag,
+            multiple = multiple,
+            requeue = requeue
+        )
+
+    def purge(self, queue_name):
+        self._channel.queue.purge(queue_name)
+
+    def queue_depth(self, queue_name):
+        # A passive declare only reads the state of the existing queue
+        try:
+            result = self._channel.queue.declare(
+                queue_name,
+                passive = True
+            )
+        except amqpstorm.AMQPError as e:
+            print(e)
+            raise PVQueueConnectionError(
+                "Could not check the depth of the Queue: ", queue_name
+            )
+        return result['message_count']
+
+    def close(self):
+        if self._connection_pool:
+            if self._connection:
+                try:
+                    for channel in (self._confirm_channel, self._channel):
+                        if channel:
+                            channel.close()
+                finally:
+                    self._connection_pool.release(self._connection)
+                self._connection = None
+        elif self._connection:
+            self._connection.close()
+
+    def _to_delivery(self, message):
+        """
+        Converts an amqpstorm message to a Delivery.
+        """
+        return _build_delivery(
+            message.body,
+            message.properties,
+            message.method['delivery_tag']
+        )
+
+def _build_delivery(body, properties, delivery_tag):
+    """
+    Creates a Delivery from the body, the properties and the delivery tag of a message.
+    """
+    content_type = properties.get('content_type')
+    if isinstance(content_type, bytes):
+        content_type = content_type.decode('utf-8')
+    return Delivery(
+        body,
+        content_type,
+        delivery_tag
+    )
@@ -0,0 +1,120 @@
+import collections
+
+# A message received from a transport.
+# The body is either bytes or a string, the content type tells how to interpret it.
+Delivery = collections.namedtuple(
+    'Delivery',
+    ['body', 'content_type', 'delivery_tag']
+)
+
+class Transport(object):
+    """
+    The Transport moves messages between QueueClients.
+    It hides, which kind of broker is used to do so.
+
+    Child-classes implement the methods below for a specific broker.
+    A Transport is used by one QueueClient at a time.
+    """
+    def connect(self):
+        """
+        Connect to the broker.
+
+        Raises:
+            PVConnectionError if the connection to the broker failed.
+        """
+        raise NotImplementedError("connect not implemented!")
+
+    def declare_queue(self, queue_name):
+        """
+        Create the queue, if it does not exist yet.
+
+        Raises:
+            PVQueueConnectionError if the queue could not be declared.
+        """
+        raise NotImplementedError("declare_queue not implemented!")
+
+    def publish(self, queue_name, message_body, content_type):
+        """
+        Publish a single message to the queue.
+
+        Raises:
+            PVMessagePublishingError if the message could not be published.
+        """
+        raise NotImplementedError("publish not implemented!")
+
+    def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        """
+        Publish multiple messages to the queue at once.
+        If confirm is True, the broker has to confirm the whole batch before this method returns.
+
+        Raises:
+            PVMessagePublishingError if the batch could not be published.
+        """
+        raise NotImplementedError("publish_batch not implemented!")
+
+    def get(self, queue_name):
+        """
+        Fetch a single message from the queue.
+
+        Returns:
+            A Delivery or None, if the queue is empty.
+        """
+        raise NotImplementedError("get not implemented!")
+
+    def consume(self, queue_name, callback, prefetch_count):
+        """
+        Subscribe to the queue.
+        Delivered messages are passed to the callback as Delivery by process_events.
+
+        Returns:
+            The consumer tag of the subscription.
+        """
+        raise NotImplementedError("consume not implemented!")
+
+    def process_events(self):
+        """
+        Pass all delivered messages to the consumer callbacks.
+        Idles for a short time, if there were none.
+        """
+        raise NotImplementedError("process_events not implemented!")
+
+    def cancel(self, consumer_tag):
+        """
+        Cancel a subscription and hand all delivered, but unacknowledged messages back to the queue.
+        """
+        raise NotImplementedError("cancel not implemented!")
+
+    def ack(self, delivery_tag, multiple = False):
+        """
+        Acknowledge a message.
+        If multiple is True, all unacknowledged messages up to the delivery tag are acknowledged as well.
+        """
+        raise NotImplementedError("ack not implemented!")
+
+    def nack(self, delivery_tag, multiple = False, requeue = True):
+        """
+        Reject a message and requeue it, if requeue is True.
+        If multiple is True, all unacknowledged messages up to the delivery tag are rejected as well.
+        """
+        raise NotImplementedError("nack not implemented!")
+
+    def purge(self, queue_name):
+        """
+        Delete all messages in the queue.
+        """
+        raise NotImplementedError("purge not implemented!")
+
+    def queue_depth(self, queue_name):
+        """
+        Returns the amount of messages, that are waiting in the queue to be delivered.
+
+        Raises:
+            PVQueueConnectionError if the depth could not be checked.
+        """
+        raise NotImplementedError("queue_depth not implemented!")
+
+    def close(self):
+        """
+        Close the connection to the broker.
+        """
+        raise NotImplementedError("close not implemented!")
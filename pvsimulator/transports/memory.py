@@ -0,0 +1,234 @@
+import collections
+import itertools
+import threading
+
+from pvsimulator.transports.base import Delivery, Transport
+
+# The time in seconds to wait for new messages in process_events
+IDLE_WAIT = 0.01
+
+class InMemoryBroker(object):
+    """
+    The InMemoryBroker holds named message queues inside of the current process.
+    It is thread-safe, so publishers and consumers can run on different threads.
+    """
+    def __init__(self):
+        self._queues = collections.defaultdict(collections.deque)
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        Registers a function, that is called without arguments whenever messages are put into a queue.
+        It is called while the broker is locked, so it should return quickly.
+        """
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregisters a function, that was registered with add_listener.
+        """
+        with self._condition:
+            self._listeners.remove(listener)
+
+    def declare(self, queue_name):
+        """
+        Create the queue, if it does not exist yet.
+        """
+        with self._condition:
+            self._queues[queue_name]
+
+    def put(self, queue_name, messages):
+        """
+        Append (body, content_type) tuples to the end of the queue.
+        """
+        with self._condition:
+            self._queues[queue_name].extend(messages)
+            self._condition.notify_all()
+            for listener in self._listeners:
+                listener()
+
+    def requeue(self, queue_name, messages):
+        """
+        Put (body, content_type) tuples back to the front of the queue, keeping their order.
+        """
+        with self._condition:
+            self._queues[queue_name].extendleft(reversed(messages))
+            self._condition.notify_all()
+            for listener in self._listeners:
+                listener()
+
+    def take(self, queue_name, max_count):
+        """
+        Remove up to max_count messages from the front of the queue.
+
+        Returns:
+            A list of (body, content_type) tuples.
+        """
+        with self._condition:
+            queue = self._queues[queue_name]
+            return [queue.popleft() for _ in range(min(max_count, len(queue)))]
+
+    def wait(self, queue_names, timeout):
+        """
+        Waits up to timeout seconds, until one of the queues contains a message.
+        """
+        with self._condition:
+            if not any(self._queues[queue_name] for queue_name in queue_names):
+                self._condition.wait(timeout)
+
+    def purge(self, queue_name):
+        """
+        Delete all messages in the queue.
+        """
+        with self._condition:
+            self._queues[queue_name].clear()
+
+    def depth(self, queue_name):
+        """
+        Returns the amount of messages waiting in the queue.
+        """
+        with self._condition:
+            return len(self._queues[queue_name])
+
+# The broker, that is used by all InMemoryTransports without an explicit broker
+DEFAULT_BROKER = InMemoryBroker()
+
+class InMemoryTransport(Transport):
+    """
+    The InMemoryTransport moves messages through an InMemoryBroker.
+    This allows to run publishers and consumers inside of a single process,
+    without any network hop or running RabbitMQ instance.
+    """
+    def __init__(self, broker = None):
+        """
+        Params:
+            broker: The InMemoryBroker to use. Defaults to the process wide DEFAULT_BROKER.
+        """
+        self._broker = broker or DEFAULT_BROKER
+        self._delivery_tags = itertools.count(1)
+        # Delivered, but not yet acknowledged messages by delivery tag
+        self._unacknowledged = collections.OrderedDict()
+        self._consumers = {}
+        self._consumer_tags = itertools.count(1)
+
+    def connect(self):
+        pass
+
+    def declare_queue(self, queue_name):
+        self._broker.declare(queue_name)
+
+    def publish(self, queue_name, message_body, content_type):
+        self._broker.put(queue_name, [(message_body, content_type)])
+
+    def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        # The broker holds the messages as soon as put returns, there is nothing to confirm
+        self._broker.put(
+            queue_name,
+            [(message_body, content_type) for message_body in message_bodies]
+        )
+
+    def get(self, queue_name):
+        messages = self._broker.take(queue_name, 1)
+        if not messages:
+            return None
+        return self._deliver(queue_name, messages[0])
+
+    def consume(self, queue_name, callback, prefetch_count):
+        consumer_tag = 'consumer-' + str(next(self._consumer_tags))
+        self._consumers[consumer_tag] = (queue_name, callback, prefetch_count)
+        return consumer_tag
+
+    def process_events(self):
+        delivered_count = 0
+        for queue_name, callback, prefetch_count in list(self._consumers.values()):
+            capacity = prefetch_count - len(self._unacknowledged)
+            if capacity <= 0:
+                continue
+            deliveries = self.take_deliveries(queue_name, capacity)
+            for delivery in deliveries:
+                callback(delivery)
+            delivered_count += len(deliveries)
+
+        if delivered_count == 0:
+            # Wait for new messages instead of spinning
+            self._broker.wait(
+                [queue_name for queue_name, _, _ in self._consumers.values()],
+                IDLE_WAIT
+            )
+
+    def cancel(self, consumer_tag):
+        self._consumers.pop(consumer_tag, None)
+        self._requeue(list(self._unacknowledged))
+
+    def ack(self, delivery_tag, multiple = False):
+        for tag in self._settled_tags(delivery_tag, multiple):
+            del self._unacknowledged[tag]
+
+    def nack(self, delivery_tag, multiple = False, requeue = True):
+        tags = self._settled_tags(delivery_tag, multiple)
+        if requeue:
+            self._requeue(tags)
+        else:
+            for tag in tags:
+                del self._unacknowledged[tag]
+
+    def purge(self, queue_name):
+        self._broker.purge(queue_name)
+
+    def queue_depth(self, queue_name):
+        return self._broker.depth(queue_name)
+
+    def close(self):
+        self._consumers.clear()
+        self._requeue(list(self._unacknowledged))
+
+    def unacknowledged_count(self):
+        """
+        Returns the amount of delivered, but not yet acknowledged messages.
+        """
+        return len(self._unacknowledged)
+
+    def take_deliveries(self, queue_name, max_count):
+        """
+        Removes up to max_count messages from the queue without waiting
+        and registers them as unacknowledged.
+
+        Returns:
+            A list of Deliveries.
+        """
+        return [
+            self._deliver(queue_name, message)
+            for message in self._broker.take(queue_name, max_count)
+        ]
+
+    def _deliver(self, queue_name, message):
+        """
+        Registers a message as unacknowledged and wraps it in a Delivery.
+        """
+        delivery_tag = next(self._delivery_tags)
+        self._unacknowledged[delivery_tag] = (queue_name, message)
+        message_body, content_type = message
+        return Delivery(message_body, content_type, delivery_tag)
+
+    def _settled_tags(self, delivery_tag, multiple):
+        """
+        Returns the unacknowledged delivery tags, that are settled by an ack or nack.
+        """
+        if multiple:
+            return [tag for tag in self._unacknowledged if tag <= delivery_tag]
+        if delivery_tag in self._unacknowledged:
+            return [delivery_tag]
+        return []
+
+    def _requeue(self, delivery_tags):
+        """
+        Hands unacknowledged messages back to the front of their queues.
+        """
+        messages_by_queue = collections.defaultdict(list)
+        for tag in delivery_tags:
+            queue_name, message = self._unacknowledged.pop(tag)
+            messages_by_queue[queue_name].append(message)
+        for queue_name, messages in messages_by_queue.items():
+            self._broker.requeue(queue_name, messages)
@@ -0,0 +1,501 @@
+import errno
+import fcntl
+import os
+import platform
+import select
+import struct
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+from pvsimulator import codec
+from pvsimulator.exceptions import *
+from pvsimulator.transports.base import Delivery, Transport
+
+# The time in seconds to wait for new messages in process_events.
+# Also bounds the wait, if a wake-up got lost.
+IDLE_WAIT = 0.01
+
+# The default geometry of a ring: 1024 slots of 16 KiB, which fit binary messages of up to 1023 samples
+SLOT_COUNT = 1024
+SLOT_SIZE = 16 * 1024
+
+RING_MAGIC = 0x5056524e47  # 'PVRNG'
+RING_VERSION = 1
+
+# The ring starts with three cache lines of uint64 fields, so the fields of the producer
+# and the consumer never share a cache line
+HEADER_SIZE = 192
+MAGIC, VERSION, SLOTS, SLOT_BYTES = 0, 1, 2, 3
+# Written by the producer
+HEAD, PURGE_POSITION, PRODUCER_WAITING = 8, 9, 10
+# Written by the consumer
+TAIL, CONSUMER_WAITING, CONSUMER_PID = 16, 17, 18
+
+# Each slot starts with the length of the body and the code of its content type
+SLOT_HEADER = struct.Struct('<II')
+CONTENT_TYPE_CODES = {
+    codec.JSON_CONTENT_TYPE: 0,
+    codec.BINARY_CONTENT_TYPE: 1
+}
+CONTENT_TYPES = {code: content_type for content_type, code in CONTENT_TYPE_CODES.items()}
+
+# The values of platform.machine() of the CPUs with the total store order, that the ring relies on
+X86_MACHINES = ('x86_64', 'amd64', 'i386', 'i486', 'i586', 'i686', 'x86')
+
+
+class SharedRing(object):
+    """
+    The SharedRing is a single-producer/single-consumer ring of fixed-size message slots
+    in a named shared memory segment, so two processes on the same host can exchange messages
+    without a broker. The producer only writes the head and the consumer only writes the tail,
+    so no lock is needed. Both are 8 byte aligned counters, which are never reset.
+
+    The counters are shared through plain numpy stores and loads without memory barriers.
+    This relies on the total store order of x86 (x86-64) CPUs, on which the stores to a slot
+    become visible to the other process before the store to the head, that publishes it.
+    On CPUs with a weaker memory ordering, like ARM or POWER, the consumer may see the new head
+    before the body of the message, so the ring refuses to open on other CPUs.
+
+    A side, that has to wait (for messages or for free slots), marks itself as waiting
+    and sleeps on a named pipe, which the other side writes to after it made progress.
+    Even x86 may order the store of the waiting flag after the following load of the head or tail,
+    so the handshake runs under a file lock of the queue, whose system calls act as full barriers:
+    The waiting side sets its flag and checks the head or tail again under the lock,
+    the other side moves the head or tail first and then checks the flag under the lock.
+    So either the waiting side sees the progress or the other side sees the flag and rings.
+    The segment and the pipes are named after the queue and outlive the processes,
+    like a queue of a broker. remove_ring deletes them.
+    """
+    def __init__(self, queue_name, slot_count = SLOT_COUNT, slot_size = SLOT_SIZE):
+        """
+        Opens the ring of the queue or creates it, if it does not exist yet.
+        An existing ring keeps the slot_count and slot_size, it was created with.
+
+        Raises:
+            PVQueueConnectionError if the CPU is not x86 or the shared memory of the queue
+                is not a ring of this version.
+        """
+        if platform.machine().lower() not in X86_MACHINES:
+            raise PVQueueConnectionError(
+                "The shared memory transport relies on the store order of x86 CPUs and does not support '"
+                + platform.machine() + "', use the amqp transport instead!"
+            )
+        self.queue_name = queue_name
+        self._memory, created = _open_shared_memory(
+            _segment_name(queue_name), HEADER_SIZE + slot_count * slot_size
+        )
+        self._header = numpy.ndarray((HEADER_SIZE // 8,), dtype = numpy.uint64, buffer = self._memory.buf)
+        if created:
+            self._header[SLOTS] = slot_count
+            self._header[SLOT_BYTES] = slot_size
+            self._header[VERSION] = RING_VERSION
+            self._header[MAGIC] = RING_MAGIC
+        else:
+            self._check_version()
+        self.slot_count = int(self._header[SLOTS])
+        self.slot_size = int(self._header[SLOT_BYTES])
+        self._message_doorbell = _open_doorbell(queue_name, 'messages')
+        self._space_doorbell = _open_doorbell(queue_name, 'space')
+        self._handshake_lock = os.open(_doorbell_path(queue_name, 'lock'), os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _check_version(self):
+        # The creator writes the magic value last
+        deadline = time.monotonic() + 1.0
+        while int(self._header[MAGIC]) != RING_MAGIC and time.monotonic() < deadline:
+            time.sleep(IDLE_WAIT)
+        if int(self._header[MAGIC]) != RING_MAGIC or int(self._header[VERSION]) != RING_VERSION:
+            self.close()
+            raise PVQueueConnectionError(
+                "The shared memory of the queue '" + self.queue_name + "' is not a ring of version "
+                + str(RING_VERSION) + "!"
+            )
+
+    @property
+    def head(self):
+        return int(self._header[HEAD])
+
+    @property
+    def tail(self):
+        return int(self._header[TAIL])
+
+    @property
+    def purge_position(self):
+        return int(self._header[PURGE_POSITION])
+
+    def put(self, messages):
+        """
+        Appends (body, content_type) tuples. Blocks, while the ring is full.
+        Must only be called by the producer.
+
+        Raises:
+            PVMessagePublishingError if a message does not fit into a slot or has an unknown content type.
+        """
+        head = self.head
+        for message_body, content_type in messages:
+            if isinstance(message_body, str):
+                message_body = message_body.encode('utf-8')
+            if content_type not in CONTENT_TYPE_CODES:
+                raise PVMessagePublishingError(
+                    "The shared memory transport does not support the content type '" + str(content_type) + "'!"
+                )
+            if SLOT_HEADER.size + len(message_body) > self.slot_size:
+                raise PVMessagePublishingError(
+                    "The message of " + str(len(message_body)) + " bytes does not fit into a slot of "
+                    + str(self.slot_size) + " bytes!"
+                )
+            while head - self.tail >= self.slot_count:
+                self._ring(self._message_doorbell, CONSUMER_WAITING)
+                self._wait(self._space_doorbell, PRODUCER_WAITING, lambda: head - self.tail < self.slot_count)
+
+            offset = self._slot_offset(head)
+            SLOT_HEADER.pack_into(self._memory.buf, offset, len(message_body), CONTENT_TYPE_CODES[content_type])
+            self._memory.buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(message_body)] = message_body
+            # The message is complete, before the head is moved past it.
+            # Only the store order of x86 makes it visible in this order to the consumer, see the class docstring.
+            head += 1
+            self._header[HEAD] = head
+        self._ring(self._message_doorbell, CONSUMER_WAITING)
+
+    def read(self, position):
+        """
+        Returns the message at the position as a (body, content_type) tuple.
+        Must only be called by the consumer for a position between the tail and the head.
+        """
+        offset = self._slot_offset(position)
+        length, content_type_code = SLOT_HEADER.unpack_from(self._memory.buf, offset)
+        body = bytes(self._memory.buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+        return body, CONTENT_TYPES[content_type_code]
+
+    def release(self, position):
+        """
+        Moves the tail to the position, so the producer can reuse the slots before it.
+        Must only be called by the consumer.
+        """
+        if position > self.tail:
+            self._header[TAIL] = position
+            self._ring(self._space_doorbell, PRODUCER_WAITING)
+
+    def wait_for_messages(self, position, timeout):
+        """
+        Waits up to timeout seconds, until there is a message at the position.
+        """
+        self._wait(self._message_doorbell, CONSUMER_WAITING, lambda: self.head > position, timeout)
+
+    def purge(self):
+        """
+        Discards all messages, which were not delivered to the consumer yet.
+        The consumer owns the tail, so it skips the messages itself. Without a consumer,
+        the producer moves the tail right away.
+        """
+        head = self.head
+        self._header[PURGE_POSITION] = head
+        if not self.consumer_attached():
+            self._header[TAIL] = head
+            self._ring(self._space_doorbell, PRODUCER_WAITING)
+
+    def claim_consumer(self):
+        """
+        Registers the current process as the consumer of the ring.
+
+        Raises:
+            PVQueueConnectionError if another living process consumes the ring.
+        """
+        if self.consumer_attached() and int(self._header[CONSUMER_PID]) != os.getpid():
+            raise PVQueueConnectionError(
+                "The queue '" + self.queue_name + "' is already consumed by the process "
+                + str(int(self._header[CONSUMER_PID])) + ", the shared memory transport allows one consumer!"
+            )
+        self._header[CONSUMER_PID] = os.getpid()
+
+    def release_consumer(self):
+        if int(self._header[CONSUMER_PID]) == os.getpid():
+            self._header[CONSUMER_PID] = 0
+
+    def consumer_attached(self):
+        """
+        Returns True, if a living process is registered as the consumer.
+        """
+        return _process_alive(int(self._header[CONSUMER_PID]))
+
+    def close(self):
+        """
+        Unmaps the ring. The segment itself is kept, see remove_ring.
+        """
+        # The segment can only be unmapped without views into it
+        self._header = None
+        self._memory.close()
+        for descriptor in (
+                getattr(self, '_message_doorbell', None),
+                getattr(self, '_space_doorbell', None),
+                getattr(self, '_handshake_lock', None)
+            ):
+            if descriptor is not None:
+                os.close(descriptor)
+
+    def _slot_offset(self, position):
+        return HEADER_SIZE + (position % self.slot_count) * self.slot_size
+
+    def _wait(self, doorbell, waiting_flag, is_ready, timeout = IDLE_WAIT):
+        """
+        Sleeps on the doorbell until the other side rings it or the timeout passed,
+        unless is_ready is already True after announcing the wait.
+        """
+        try:
+            # Announced and checked under the lock, see the class docstring
+            fcntl.flock(self._handshake_lock, fcntl.LOCK_EX)
+            try:
+                self._header[waiting_flag] = 1
+                ready = is_ready()
+            finally:
+                fcntl.flock(self._handshake_lock, fcntl.LOCK_UN)
+            if ready:
+                return
+            select.select([doorbell], [], [], timeout)
+            try:
+                os.read(doorbell, 4096)
+            except BlockingIOError:
+                pass
+        finally:
+            self._header[waiting_flag] = 0
+
+    def _ring(self, doorbell, waiting_flag):
+        """
+        Wakes up the other side, if it waits.
+        Must be called after the head or tail was moved.
+        """
+        fcntl.flock(self._handshake_lock, fcntl.LOCK_EX)
+        try:
+            waiting = self._header[waiting_flag]
+        finally:
+            fcntl.flock(self._handshake_lock, fcntl.LOCK_UN)
+        if waiting:
+            try:
+                os.write(doorbell, b'\0')
+            except BlockingIOError:
+                # The pipe is full of wake-ups already
+                pass
+
+class SharedMemoryTransport(Transport):
+    """
+    The SharedMemoryTransport moves messages through a SharedRing, for a meter and a photovoltaic
+    simulation on the same host. The message bodies are copied into the slots as they are,
+    so a hand-off costs two memory copies instead of two network hops through a broker.
+
+    Each queue has exactly one publishing and one consuming process.
+    Delivered messages keep their slot until they are acknowledged. Acknowledgements
+    are cumulative, since the consumer processes the messages in order.
+    A transport serves one queue, like the QueueClient, that uses it.
+    """
+    def __init__(self, slot_count = SLOT_COUNT, slot_size = SLOT_SIZE):
+        """
+        Params:
+            slot_count: The amount of messages, the ring of a new queue can hold.
+            slot_size: The maximum size of a message in bytes, including an 8 byte slot header.
+                Both only apply, if the ring of the queue does not exist yet.
+        """
+        self._slot_count = slot_count
+        self._slot_size = slot_size
+        self._ring = None
+        # The position of the next message, that is delivered to the consumer
+        self._read_position = None
+        # The position, from which the tail skips to the last purge position,
+        # once all messages before it are acknowledged
+        self._purge_skip = None
+        self._consumers = {}
+        self._consumer_tags = 0
+
+    def connect(self):
+        pass
+
+    def declare_queue(self, queue_name):
+        if self._ring is not None:
+            if self._ring.queue_name != queue_name:
+                raise PVQueueConnectionError(
+                    "A SharedMemoryTransport can only serve one queue!"
+                )
+            return
+        try:
+            self._ring = SharedRing(queue_name, self._slot_count, self._slot_size)
+        except OSError as e:
+            raise PVQueueConnectionError(
+                "Could not open the shared memory of the queue '" + queue_name + "': " + str(e)
+            )
+
+    def publish(self, queue_name, message_body, content_type):
+        self._ring.put([(message_body, content_type)])
+
+    def publish_batch(self, queue_name, message_bodies, content_type, confirm = False):
+        # The ring holds the messages as soon as put returns, there is nothing to confirm
+        self._ring.put((message_body, content_type) for message_body in message_bodies)
+
+    def get(self, queue_name):
+        deliveries = self.take_deliveries(queue_name, 1)
+        return deliveries[0] if deliveries else None
+
+    def consume(self, queue_name, callback, prefetch_count):
+        self._consumer_tags += 1
+        consumer_tag = 'consumer-' + str(self._consumer_tags)
+        self._consumers[consumer_tag] = (queue_name, callback, prefetch_count)
+        return consumer_tag
+
+    def process_events(self):
+        delivered_count = 0
+        for queue_name, callback, prefetch_count in list(self._consumers.values()):
+            capacity = prefetch_count - self.unacknowledged_count()
+            if capacity <= 0:
+                continue
+            deliveries = self.take_deliveries(queue_name, capacity)
+            for delivery in deliveries:
+                callback(delivery)
+            delivered_count += len(deliveries)
+
+        if delivered_count == 0 and self._consumers:
+            self._ring.wait_for_messages(self._consumer_position(), IDLE_WAIT)
+
+    def cancel(self, consumer_tag):
+        self._consumers.pop(consumer_tag, None)
+        self._requeue_unacknowledged()
+
+    def ack(self, delivery_tag, multiple = False):
+        # The delivery tag is the position after the message, so the tail can move to it
+        self._ring.release(min(delivery_tag, self._consumer_position()))
+        if self._purge_skip is not None and self._ring.tail >= self._purge_skip[0]:
+            self._ring.release(self._purge_skip[1])
+            self._purge_skip = None
+
+    def nack(self, delivery_tag, multiple = False, requeue = True):
+        if not requeue:
+            self.ack(delivery_tag, multiple)
+            return
+        # The message and all delivered after it are delivered again
+        position = self._ring.tail if multiple else delivery_tag - 1
+        self._read_position = max(min(self._consumer_position(), position), self._ring.tail)
+
+    def purge(self, queue_name):
+        self._ring.purge()
+
+    def queue_depth(self, queue_name):
+        # The read position of the consumer is private to its process,
+        # so delivered, but unacknowledged messages are counted as well
+        return self._ring.head - max(self._ring.tail, self._ring.purge_position)
+
+    def close(self):
+        if self._ring is None:
+            return
+        self._consumers.clear()
+        if self._read_position is not None:
+            self._requeue_unacknowledged()
+            self._ring.release_consumer()
+        self._ring.close()
+        self._ring = None
+
+    def unacknowledged_count(self):
+        """
+        Returns the amount of delivered, but not yet acknowledged messages.
+        """
+        if self._read_position is None:
+            return 0
+        return self._read_position - self._ring.tail
+
+    def take_deliveries(self, queue_name, max_count):
+        """
+        Reads up to max_count messages from the ring without waiting.
+        Their slots are kept, until they are acknowledged.
+
+        Returns:
+            A list of Deliveries.
+        """
+        position = self._consumer_position()
+        purge_position = self._ring.purge_position
+        if purge_position > position:
+            # Skip the purged messages
+            if self._ring.tail == position:
+                self._ring.release(purge_position)
+            else:
+                self._purge_skip = (position, purge_position)
+            position = purge_position
+        stop = min(self._ring.head, position + max_count)
+        deliveries = []
+        while position < stop:
+            message_body, content_type = self._ring.read(position)
+            position += 1
+            deliveries.append(Delivery(message_body, content_type, position))
+        self._read_position = position
+        return deliveries
+
+    def _consumer_position(self):
+        """
+        Returns the read position of the consumer and registers it as the consumer on its first call.
+        """
+        if self._read_position is None:
+            self._ring.claim_consumer()
+            self._read_position = self._ring.tail
+        return self._read_position
+
+    def _requeue_unacknowledged(self):
+        if self._read_position is not None:
+            self._read_position = self._ring.tail
+            self._purge_skip = None
+
+def remove_ring(queue_name):
+    """
+    Deletes the shared memory segment and the pipes of the ring of a queue, if they exist.
+    """
+    try:
+        # Opened tracked, since unlink stops the tracking
+        memory = shared_memory.SharedMemory(_segment_name(queue_name))
+        memory.close()
+        memory.unlink()
+    except FileNotFoundError:
+        pass
+    for kind in ('messages', 'space', 'lock'):
+        try:
+            os.remove(_doorbell_path(queue_name, kind))
+        except FileNotFoundError:
+            pass
+
+def _segment_name(queue_name):
+    return 'pvsimulator-' + queue_name
+
+def _doorbell_path(queue_name, kind):
+    return os.path.join(tempfile.gettempdir(), 'pvsimulator-' + queue_name + '.' + kind)
+
+def _open_shared_memory(name, size, create = True):
+    """
+    Opens the shared memory segment with the name or creates it with the size.
+    The segment is not tracked, so it is not removed, when the process, that opened it, exits.
+
+    Returns:
+        A tuple of the SharedMemory and True, if it was created.
+    """
+    try:
+        memory = shared_memory.SharedMemory(name, create = create, size = size)
+    except FileExistsError:
+        memory = shared_memory.SharedMemory(name)
+        create = False
+    # The resource tracker registered the POSIX name of the segment, which starts with a slash
+    resource_tracker.unregister('/' + memory.name, 'shared_memory')
+    return memory, create
+
+def _open_doorbell(queue_name, kind):
+    """
+    Opens the named pipe, on which a side of the ring sleeps, without blocking.
+    """
+    path = _doorbell_path(queue_name, kind)
+    try:
+        os.mkfifo(path)
+    except FileExistsError:
+        pass
+    return os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+def _process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
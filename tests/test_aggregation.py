@@ -0,0 +1,96 @@
+from pvsimulator import aggregation
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.simulations import configuration, meter, photovoltaic
+from pvsimulator.simulations.photovoltaic import PV_Simulator
+from pvsimulator.transports import InMemoryBroker, InMemoryTransport
+import numpy
+import os
+
+def read_aggregates(filepath):
+    return numpy.loadtxt(filepath, delimiter = ',', ndmin = 2)
+
+def test_windows_sum_the_energy_of_unordered_batches(tmp_path):
+    output_filepath = str(tmp_path / "output.csv")
+    timestamps = numpy.arange(1247097600, 1247097600 + 7200, 10)
+    consumption_values = numpy.full(len(timestamps), 3600.0)
+    generation_values = numpy.linspace(0, 1000, len(timestamps))
+
+    stage = aggregation.AggregationStage(output_filepath, [60, 900])
+    # The batches arrive in order, but the samples within a batch do not
+    rng = numpy.random.default_rng(1)
+    for batch in numpy.array_split(numpy.arange(len(timestamps)), 7):
+        batch = rng.permutation(batch)
+        stage.add(timestamps[batch], consumption_values[batch], generation_values[batch])
+    stage.close()
+
+    minutes = read_aggregates(str(tmp_path / "output-1min.csv"))
+    quarters = read_aggregates(str(tmp_path / "output-15min.csv"))
+    assert len(minutes) == 120
+    assert len(quarters) == 8
+    assert minutes[:, 1].sum() == len(timestamps)
+    # 3600 Watt for 60 seconds are 0.06 kWh
+    assert numpy.allclose(minutes[:, 2], 0.06)
+    assert numpy.isclose(quarters[:, 3].sum(), generation_values.sum() * 10 / 3600000)
+    assert numpy.allclose(quarters[:, 4], quarters[:, 2] - quarters[:, 3])
+    assert quarters[-1, 6] == generation_values.max()
+
+def test_pv_simulator_can_drop_the_raw_rows(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'test_queue')
+    meter.simulate_one_day(60, batch_size = 100, quiet = True)
+
+    output_filepath = str(tmp_path / "output.csv")
+    pv = PV_Simulator(
+        queue_name = 'test_queue',
+        output_filepath = output_filepath,
+        consuming_batch_size = 100,
+        quiet = True,
+        transport = 'memory',
+        aggregate_windows = [3600],
+        drop_raw_rows = True
+    )
+    pv.connect()
+    pv.start_consuming_blocking()
+    pv.close_output()
+
+    hours = read_aggregates(str(tmp_path / "output-60min.csv"))
+    assert not os.path.exists(output_filepath)
+    assert len(hours) == 24
+    assert numpy.all(hours[:, 1] == 60)
+
+def test_consumer_group_aggregates_the_merged_samples(tmp_path, monkeypatch):
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 3600)
+    messages = meter.construct_messages(timestamps, numpy.full(len(timestamps), 3600.0))
+
+    run_pv_simulator = photovoltaic._run_pv_simulator
+    def run_worker(pv_arguments, stop_group = None, **metrics_settings):
+        # Both workers consume every other batch, as if they shared one queue
+        worker = int(pv_arguments['output_filepath'].rsplit('-', 1)[1])
+        broker = InMemoryBroker()
+        publisher = QueueClient(queue_name = 'test_queue', transport = InMemoryTransport(broker))
+        publisher.connect()
+        for start in range(worker * 100, len(messages), 200):
+            publisher.publish_batch(messages[start:start + 100])
+        publisher.publish_message("STOP_SIMULATION")
+        run_pv_simulator(dict(pv_arguments, transport = InMemoryTransport(broker)), stop_group, **metrics_settings)
+    # The forked workers run the patched function
+    monkeypatch.setattr(photovoltaic, '_run_pv_simulator', run_worker)
+
+    output_filepath = str(tmp_path / "output.csv")
+    photovoltaic.simulate_photovoltaic_consumer_group(output_filepath, 2, dict(
+        queue_name = 'test_queue',
+        consuming_timeout = 0,
+        consuming_batch_size = 100,
+        quiet = True,
+        seed = 1,
+        aggregate_windows = [3600],
+        drop_raw_rows = True
+    ))
+
+    hours = read_aggregates(str(tmp_path / "output-60min.csv"))
+    assert not os.path.exists(output_filepath)
+    assert os.listdir(str(tmp_path)) == ["output-60min.csv"]
+    assert hours[:, 1].tolist() == [3600]
+    # 3600 Watt for one hour are 3.6 kWh, like with a single consumer
+    assert numpy.isclose(hours[0, 2], 3.6)
@@ -0,0 +1,151 @@
+from pvsimulator.asyncqueueclient import AsyncQueueClient
+from pvsimulator.transports import InMemoryBroker, aio
+from pvsimulator.transports.aio import AsyncAMQPTransport, AsyncInMemoryTransport
+from pvsimulator.transports.base import Delivery
+import amqpstorm
+import asyncio
+import pytest
+import threading
+import time
+
+def test_many_clients_on_one_event_loop():
+    broker = InMemoryBroker()
+    producer_count = 50
+    message_count = 20
+
+    async def produce(producer_index):
+        producer = AsyncQueueClient(
+            queue_name = "test_queue",
+            transport = AsyncInMemoryTransport(broker)
+        )
+        await producer.connect()
+        for i in range(message_count):
+            await producer.publish_message(str(producer_index) + ":" + str(i))
+            await asyncio.sleep(0)
+        await producer.close()
+
+    async def run():
+        received_messages = []
+        consumers = []
+        for _ in range(4):
+            consumer = AsyncQueueClient(
+                queue_name = "test_queue",
+                prefetch_count = 10,
+                transport = AsyncInMemoryTransport(broker)
+            )
+            await consumer.connect()
+            consumers.append(consumer)
+
+        async def on_message(message_body):
+            received_messages.append(message_body)
+            if len(received_messages) == producer_count * message_count:
+                for consumer in consumers:
+                    consumer.stop_consuming()
+
+        consuming = [
+            asyncio.ensure_future(consumer.start_consuming(on_message))
+            for consumer in consumers
+        ]
+        await asyncio.gather(*[produce(i) for i in range(producer_count)])
+        await asyncio.wait_for(asyncio.gather(*consuming), 5)
+        return received_messages
+
+    received_messages = asyncio.run(run())
+
+    assert sorted(received_messages) == sorted(
+        str(p) + ":" + str(i) for p in range(producer_count) for i in range(message_count)
+    )
+    assert broker.depth("test_queue") == 0
+
+def test_iterate_messages_requeues_unprocessed_messages():
+    broker = InMemoryBroker()
+
+    async def run():
+        client = AsyncQueueClient(
+            queue_name = "test_queue",
+            transport = AsyncInMemoryTransport(broker)
+        )
+        await client.connect()
+        await client.publish_batch([str(i) for i in range(10)])
+
+        received_messages = []
+        messages = client.iterate_messages()
+        async for message_body in messages:
+            received_messages.append(message_body)
+            if len(received_messages) == 3:
+                break
+        await messages.aclose()
+        await client.close()
+        return received_messages
+
+    assert asyncio.run(run()) == ["0", "1", "2"]
+    assert broker.depth("test_queue") == 7
+
+class FakeAMQPTransport(object):
+    """
+    Stands in for the AMQPTransport of an AsyncAMQPTransport, without a RabbitMQ instance.
+    """
+    def __init__(self, message_bodies, error = None):
+        self.pending = [
+            Delivery(message_body, 'text/plain', delivery_tag)
+            for delivery_tag, message_body in enumerate(message_bodies, 1)
+        ]
+        self.error = error
+        self.threads = set()
+        self.calls = []
+        self._callback = None
+
+    def consume(self, queue_name, callback, prefetch_count):
+        self._callback = callback
+        return 'consumer-1'
+
+    def process_events(self):
+        self.threads.add(threading.get_ident())
+        if self.pending:
+            self._callback(self.pending.pop(0))
+        elif self.error:
+            raise self.error
+        else:
+            time.sleep(0.001)
+
+    def cancel(self, consumer_tag):
+        self.calls.append(('cancel', consumer_tag))
+
+    def close(self):
+        self.calls.append(('close',))
+
+def test_amqp_deliveries_are_processed_on_one_thread_and_handed_to_the_event_loop():
+    transport = AsyncAMQPTransport()
+    transport._transport = FakeAMQPTransport([b"A", b"B", b"C", b"D"])
+
+    async def run():
+        deliveries = transport.consume("test_queue", 10)
+        bodies = []
+        async for delivery in deliveries:
+            bodies.append(delivery.body)
+            if len(bodies) == 3:
+                break
+        await deliveries.aclose()
+        await transport.close()
+        return bodies
+
+    assert asyncio.run(run()) == [b"A", b"B", b"C"]
+    assert len(transport._transport.threads) == 1
+    assert threading.get_ident() not in transport._transport.threads
+    # Cancelling the consumer requeues the delivered, but not yielded message as well
+    assert transport._transport.calls == [('cancel', 'consumer-1'), ('close',)]
+
+def test_amqp_channel_errors_end_the_consumption(monkeypatch):
+    monkeypatch.setattr(aio, 'ERROR_CHECK_INTERVAL', 0.05)
+    transport = AsyncAMQPTransport()
+    transport._transport = FakeAMQPTransport([b"A"], amqpstorm.AMQPChannelError("Channel was closed!"))
+
+    async def run(bodies):
+        async for delivery in transport.consume("test_queue", 10):
+            bodies.append(delivery.body)
+
+    bodies = []
+    with pytest.raises(amqpstorm.AMQPChannelError):
+        asyncio.run(run(bodies))
+    assert bodies == [b"A"]
+    assert transport._transport.calls == []
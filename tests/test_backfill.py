@@ -0,0 +1,116 @@
+from pvsimulator.simulations import backfill, configuration, pipeline
+import concurrent.futures
+import multiprocessing
+import os
+import pytest
+
+def test_backfill_workers_use_the_passed_profile_settings(tmp_path, monkeypatch):
+    t0 = 1245542400 + 10 * 3600
+    monkeypatch.setitem(configuration.CONFIGURATION, 'pv_model', 'solar')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'latitude', '-33.87')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'longitude', '151.21')
+    expected_filepath = str(tmp_path / "expected.csv")
+    pipeline.run_pipeline(t0, t0 + 3600, 60, expected_filepath, seed = 5)
+
+    # A spawned worker does not inherit the configuration of this process
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers = 1, mp_context = context) as executor:
+        filepath, row_count = executor.submit(
+            backfill.backfill_chunk, t0, t0 + 3600, t0, 60, str(tmp_path), 5,
+            'csv', configuration.get_profile_settings()
+        ).result()
+
+    assert row_count == 60
+    with open(filepath) as f, open(expected_filepath) as expected_file:
+        assert f.read() == expected_file.read()
+
+def test_split_into_days_keeps_partial_days_and_the_timestep_grid(tmp_path):
+    start = 1247097600 + 6 * 3600 + 5
+    stop = 1247097600 + 2 * 86400 + 3600
+
+    assert backfill.split_into_days(start, stop) == [
+        (start, 1247097600 + 86400),
+        (1247097600 + 86400, 1247097600 + 2 * 86400),
+        (1247097600 + 2 * 86400, stop)
+    ]
+    assert backfill.split_into_days(start, start + 10) == [(start, start + 10)]
+    assert backfill.split_into_days(start, start) == []
+
+    results = backfill.backfill(start, stop, 7, str(tmp_path), workers = 2, quiet = True, seed = 3)
+
+    assert [os.path.basename(filepath) for filepath, _ in results] == [
+        "2009-07-09T060005-235959.csv", "2009-07-10.csv", "2009-07-11T000000-005959.csv"
+    ]
+    timestamps = []
+    for filepath, row_count in results:
+        with open(filepath) as f:
+            rows = f.read().splitlines()
+        assert row_count == len(rows)
+        timestamps.extend(int(row.split(",")[0]) for row in rows)
+    # The samples continue across the day boundaries, as if the range was computed at once
+    assert timestamps == list(range(start, stop, 7))
+
+def test_restarted_backfill_skips_existing_partitions(tmp_path):
+    start = 1247097600
+    stop = start + 3 * 86400
+    results = backfill.backfill(start, stop, 600, str(tmp_path), workers = 2, quiet = True, seed = 3)
+    with open(results[1][0]) as f:
+        second_day = f.read()
+
+    # The restart finds the first day complete, the second one missing and only a .part file of the third one
+    with open(results[0][0], "w") as f:
+        f.write("kept\n")
+    os.remove(results[2][0])
+    with open(results[2][0] + ".part", "w") as f:
+        f.write("incomplete\n")
+    os.remove(results[1][0])
+
+    restarted_results = backfill.backfill(start, stop, 600, str(tmp_path), workers = 2, quiet = True, seed = 3)
+
+    assert [row_count for _, row_count in restarted_results] == [None, 144, 144]
+    with open(results[0][0]) as f:
+        assert f.read() == "kept\n"
+    with open(results[1][0]) as f:
+        assert f.read() == second_day
+    assert sorted(os.listdir(str(tmp_path))) == ["2009-07-09.csv", "2009-07-10.csv", "2009-07-11.csv", "seed"]
+
+def test_partition_is_written_to_a_part_file_and_then_replaced(tmp_path, monkeypatch):
+    replaced = []
+    def replace(source, destination):
+        # The partition only appears complete, once the temporary file is renamed
+        assert not os.path.exists(destination)
+        with open(source) as f:
+            replaced.append((source, destination, len(f.read().splitlines())))
+        os.rename(source, destination)
+    monkeypatch.setattr(backfill.os, 'replace', replace)
+
+    filepath, row_count = backfill.backfill_chunk(
+        1247097600, 1247097600 + 86400, 1247097600, 60, str(tmp_path), 3
+    )
+
+    assert replaced == [(filepath + ".part", filepath, 1440)]
+    assert row_count == 1440
+    assert os.listdir(str(tmp_path)) == ["2009-07-09.csv"]
+
+def test_restarted_backfill_keeps_the_seed_of_the_output_directory(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'seed', '')
+    start = 1247097600
+    results = backfill.backfill(start, start + 2 * 86400, 600, str(tmp_path), workers = 1, quiet = True)
+    with open(str(tmp_path / "seed")) as f:
+        seed = int(f.read())
+    with open(results[1][0]) as f:
+        second_day = f.read()
+    os.remove(results[1][0])
+
+    # Without a seed, the restart continues with the stored one instead of a new random seed
+    monkeypatch.setitem(configuration.CONFIGURATION, 'seed', '')
+    backfill.backfill(start, start + 2 * 86400, 600, str(tmp_path), workers = 1, quiet = True)
+    with open(results[1][0]) as f:
+        assert f.read() == second_day
+
+    with pytest.raises(ValueError):
+        backfill.backfill(start, start + 2 * 86400, 600, str(tmp_path), quiet = True, seed = seed + 1)
+    monkeypatch.setitem(configuration.CONFIGURATION, 'seed', str(seed + 1))
+    with pytest.raises(ValueError):
+        backfill.resolve_seed(str(tmp_path))
+    assert backfill.resolve_seed(str(tmp_path), seed) == seed
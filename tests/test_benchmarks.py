@@ -0,0 +1,51 @@
+import importlib.util
+import os
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    'run_benchmarks',
+    os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'run_benchmarks.py')
+)
+run_benchmarks = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(run_benchmarks)
+
+def report(quick, **values):
+    return {
+        'quick': quick,
+        'results': {
+            name: run_benchmarks.result(value, unit, higher_is_better)
+            for name, (value, unit, higher_is_better) in values.items()
+        }
+    }
+
+def test_comparison_flags_regressions_beyond_the_tolerance():
+    baseline = report(
+        False,
+        throughput = (1000.0, 'msg/s', True),
+        latency = (10.0, 'ms', False),
+        peak_rss = (100.0, 'MiB', False),
+        removed = (1.0, 'ms', False)
+    )
+    current = report(
+        False,
+        # 19% slower is tolerated, 21% more latency is not
+        throughput = (810.0, 'msg/s', True),
+        latency = (12.1, 'ms', False),
+        # Improvements never regress
+        peak_rss = (50.0, 'MiB', False),
+        added = (1.0, 'ms', False)
+    )
+
+    comparisons = run_benchmarks.compare_to_baseline(current, baseline, 0.2)
+
+    assert [(name, regressed) for name, _, _, _, regressed in comparisons] == [
+        ('throughput', False), ('latency', True), ('peak_rss', False)
+    ]
+    assert comparisons[1][3] == pytest.approx(0.21)
+
+def test_comparison_refuses_a_quick_run_against_a_full_baseline():
+    baseline = report(False, throughput = (1000.0, 'msg/s', True))
+
+    with pytest.raises(ValueError):
+        run_benchmarks.compare_to_baseline(report(True, throughput = (100.0, 'msg/s', True)), baseline, 0.2)
+    assert run_benchmarks.compare_to_baseline(report(True), report(True), 0.2) == []
@@ -0,0 +1,29 @@
+from pvsimulator import codec
+from pvsimulator.exceptions import PVMessageDecodingError
+import numpy
+import pytest
+
+def test_binary_samples_roundtrip():
+    timestamps = numpy.arange(1247097600, 1247097600 + 100)
+    meter_power_values = numpy.linspace(1000.0, 2000.0, 100)
+
+    message_body = codec.encode_binary_samples(timestamps, meter_power_values)
+    decoded_timestamps, decoded_meter_power_values = codec.decode_binary_samples(message_body)
+
+    assert len(message_body) == codec.FRAME_HEADER.size + 100 * 16
+    assert numpy.array_equal(decoded_timestamps, timestamps)
+    assert numpy.array_equal(decoded_meter_power_values, meter_power_values)
+
+def test_decode_samples_of_both_encodings():
+    json_body = codec.encode_json_sample(1247097600, 1805.0)
+    binary_body = codec.encode_binary_samples([1247097600], [1805.0])
+
+    for timestamps, meter_power_values in [codec.decode_samples(json_body), codec.decode_samples(binary_body)]:
+        assert isinstance(timestamps, numpy.ndarray)
+        assert isinstance(meter_power_values, numpy.ndarray)
+        assert timestamps.tolist() == [1247097600]
+        assert meter_power_values.tolist() == [1805.0]
+
+def test_decoding_invalid_binary_message_fails():
+    with pytest.raises(PVMessageDecodingError):
+        codec.decode_binary_samples(b"PVS1\x02\x00\x00\x00")
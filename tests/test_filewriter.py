@@ -0,0 +1,127 @@
+from pvsimulator import filewriter
+import numpy
+import os
+import pytest
+
+def test_buffered_writer_flushes_after_flush_rows(tmp_path):
+    filepath = str(tmp_path / "output.csv")
+    writer = filewriter.BufferedFileWriter(
+        filepath, flush_rows = 2, flush_interval = None
+    )
+
+    writer.write_row([1, 2.0])
+    with open(filepath) as f:
+        assert f.read() == ""
+
+    writer.write_row([2, 3.0])
+    with open(filepath) as f:
+        assert len(f.read().splitlines()) == 2
+
+    writer.close()
+
+def test_buffered_writer_flushes_on_close(tmp_path):
+    filepath = str(tmp_path / "output.csv")
+    with filewriter.BufferedFileWriter(filepath, flush_rows = None, flush_interval = None) as writer:
+        writer.write_rows([[1, 2.0], [2, 3.0], [3, 4.0]])
+
+    with open(filepath) as f:
+        assert f.read().splitlines() == ["1,2.0", "2,3.0", "3,4.0"]
+
+def test_binary_writer_round_trip_through_memory_map(tmp_path):
+    filepath = str(tmp_path / "output.bin")
+    timestamps = numpy.arange(1000, 1010)
+    with filewriter.create_writer(filepath, 'binary', flush_rows = None, flush_interval = None) as writer:
+        writer.write_columns(timestamps[:5], timestamps[:5] * 2.0, timestamps[:5] * 3.0, timestamps[:5] * 4.0)
+    # Appending to an existing file keeps its header
+    with filewriter.create_writer(filepath, 'binary', flush_rows = None, flush_interval = None) as writer:
+        writer.write_rows(zip(timestamps[5:].tolist(), [0.0] * 5, [0.0] * 5, [0.0] * 5))
+
+    records = filewriter.read_binary_output(filepath)
+
+    assert isinstance(records, numpy.memmap)
+    assert records['timestamp'].tolist() == timestamps.tolist()
+    assert records['pv_power_value_watt'][:5].tolist() == (timestamps[:5] * 3.0).tolist()
+    assert filewriter.slice_by_time(records, 1003, 1007)['timestamp'].tolist() == [1003, 1004, 1005, 1006]
+
+    # Records are appended as they are, for example the records of another file
+    copy_filepath = str(tmp_path / "copy.bin")
+    with filewriter.BinaryRecordWriter(copy_filepath, flush_rows = None, flush_interval = None) as writer:
+        writer.write_records(records[:3])
+        writer.write_records(records[3:])
+    assert numpy.array_equal(filewriter.read_binary_output(copy_filepath), records)
+
+def test_binary_writer_rejects_a_csv_file(tmp_path):
+    filepath = str(tmp_path / "output.csv")
+    with open(filepath, "w") as f:
+        f.write("1,2.0,3.0,5.0\n")
+
+    with pytest.raises(ValueError):
+        filewriter.BinaryRecordWriter(filepath)
+    with pytest.raises(ValueError):
+        filewriter.read_binary_output(filepath)
+
+def test_binary_merge_streams_the_files_in_chunks(tmp_path):
+    rng = numpy.random.default_rng(1)
+    filepaths = []
+    all_timestamps = []
+    for index, count in enumerate((1000, 10, 0, 357)):
+        filepath = str(tmp_path / ("segment-" + str(index) + ".bin"))
+        # Including equal timestamps across the files
+        timestamps = numpy.sort(rng.integers(0, 500, count))
+        with filewriter.create_writer(filepath, 'binary') as writer:
+            writer.write_columns(timestamps, timestamps * 1.0, timestamps * 2.0, timestamps * 3.0)
+        filepaths.append(filepath)
+        all_timestamps.append(timestamps)
+
+    chunks = list(filewriter.iterate_merged_records(filepaths, chunk_records = 64))
+    assert max(len(chunk) for chunk in chunks) <= 64 * len(filepaths)
+    merged_records = numpy.concatenate(chunks)
+    assert merged_records['timestamp'].tolist() == sorted(numpy.concatenate(all_timestamps).tolist())
+    assert numpy.array_equal(merged_records['pv_power_value_watt'], merged_records['timestamp'] * 2.0)
+
+    output_filepath = str(tmp_path / "output.bin")
+    filewriter.merge_binary_files_by_timestamp(filepaths, output_filepath)
+    assert numpy.array_equal(filewriter.read_binary_output(output_filepath), merged_records)
+
+def test_csv_merge_orders_the_rows_of_all_files(tmp_path):
+    filepaths = []
+    for index, timestamps in enumerate(([0, 2, 4, 6], [1, 2, 3], [], [5, 7, 8])):
+        filepath = str(tmp_path / ("segment-" + str(index) + ".csv"))
+        filewriter.file_append_rows(filepath, [[t, index, 0.0, 0.0] for t in timestamps])
+        filepaths.append(filepath)
+    output_filepath = str(tmp_path / "output.csv")
+    filewriter.file_append(output_filepath, [-1, -1, 0.0, 0.0])
+
+    filewriter.merge_files_by_timestamp(filepaths, output_filepath)
+
+    with open(output_filepath) as f:
+        rows = [line.split(",")[:2] for line in f.read().splitlines()]
+    # Appended after the existing rows, equal timestamps keep the order of the files
+    assert rows == [
+        ["-1", "-1"], ["0", "0"], ["1", "1"], ["2", "0"], ["2", "1"], ["3", "1"],
+        ["4", "0"], ["5", "3"], ["6", "0"], ["7", "3"], ["8", "3"]
+    ]
+
+def test_unordered_files_are_sorted_before_the_merge(tmp_path):
+    csv_filepath = str(tmp_path / "segment.csv")
+    filewriter.file_append_rows(csv_filepath, [[t, index, 0.0, 0.0] for index, t in enumerate([0, 3, 4, 1, 2, 5, 1])])
+    binary_filepath = str(tmp_path / "segment.bin")
+    with filewriter.BinaryRecordWriter(binary_filepath) as writer:
+        writer.write_columns([0, 3, 4, 1, 2, 5, 1], range(7), [0.0] * 7, [0.0] * 7)
+    ordered_filepath = str(tmp_path / "ordered.csv")
+    filewriter.file_append_rows(ordered_filepath, [[t, 0, 0.0, 0.0] for t in range(5)])
+    modified_time = os.stat(ordered_filepath).st_mtime_ns
+
+    assert filewriter.sort_file_by_timestamp(csv_filepath)
+    assert filewriter.sort_file_by_timestamp(binary_filepath, 'binary')
+    assert not filewriter.sort_file_by_timestamp(ordered_filepath)
+
+    with open(csv_filepath) as f:
+        rows = [line.split(",")[:2] for line in f.read().splitlines()]
+    # Equal timestamps keep the order, in which they were written
+    assert rows == [["0", "0"], ["1", "3"], ["1", "6"], ["2", "4"], ["3", "1"], ["4", "2"], ["5", "5"]]
+    records = filewriter.read_binary_output(binary_filepath)
+    assert records['timestamp'].tolist() == [0, 1, 1, 2, 3, 4, 5]
+    assert records['meter_power_value_watt'].tolist() == [0, 3, 6, 4, 1, 2, 5]
+    assert os.stat(ordered_filepath).st_mtime_ns == modified_time
+    assert sorted(os.listdir(str(tmp_path))) == ["ordered.csv", "segment.bin", "segment.csv"]
@@ -0,0 +1,89 @@
+import threading
+
+from pvsimulator.flowcontrol import FlowController, LagReporter
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.transports import InMemoryBroker, InMemoryTransport
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_flow_controller_keeps_the_queue_between_the_watermarks():
+    clock = FakeClock()
+    queue = {'published': 0, 'checks': 0}
+    def get_depth():
+        # The consumer drains 1000 messages per second
+        queue['checks'] += 1
+        return queue['published'] - min(queue['published'], int(clock.now * 1000))
+    flow_controller = FlowController(
+        get_depth, 1000, 400, check_interval = 0.1, clock = clock, sleep = clock.sleep
+    )
+
+    max_depth = 0
+    for _ in range(2000):
+        flow_controller.wait(50)
+        queue['published'] += 50
+        max_depth = max(max_depth, queue['published'] - int(clock.now * 1000))
+        clock.now += 0.001
+
+    # Publishing never overshoots the high watermark by more than one batch
+    assert max_depth <= 1000 + 50
+    assert flow_controller.pause_count > 0
+    # The publisher is slowed down to the rate of the consumer
+    assert abs(queue['published'] / clock.now - 1000) < 100
+    # The depth is only checked, when the queue could have reached the high watermark
+    assert queue['checks'] < 2000
+
+def test_queue_client_pauses_publishing_until_the_consumer_catches_up():
+    broker = InMemoryBroker()
+    publisher = QueueClient(
+        queue_name = 'flow', transport = InMemoryTransport(broker),
+        high_watermark = 100, low_watermark = 20, depth_check_interval = 0.001
+    )
+    publisher.connect()
+    consumer = InMemoryTransport(broker)
+    consumer.connect()
+    consumer.declare_queue('flow')
+
+    def publish():
+        for index in range(2000):
+            publisher.publish_message(str(index))
+        publisher.publish_message("STOP_SIMULATION")
+    publisher_thread = threading.Thread(target = publish)
+    publisher_thread.start()
+
+    received = []
+    max_depth = 0
+    while not received or received[-1] != "STOP_SIMULATION":
+        max_depth = max(max_depth, broker.depth('flow'))
+        delivery = consumer.get('flow')
+        if delivery is None:
+            continue
+        consumer.ack(delivery.delivery_tag)
+        received.append(delivery.body)
+    publisher_thread.join()
+
+    assert received[:-1] == [str(index) for index in range(2000)]
+    assert max_depth <= 101
+    assert publisher.flow_controller.pause_count > 0
+
+def test_lag_reporter_reports_the_drain_time():
+    clock = FakeClock()
+    lines = []
+    lag_reporter = LagReporter(lambda: 500, interval = 10.0, clock = clock, log = lines.append)
+
+    lag_reporter.report_if_due()
+    lag_reporter.observe(1000)
+    clock.now += 5.0
+    lag_reporter.report_if_due()
+    assert lines == []
+    clock.now += 5.0
+    lag_reporter.report_if_due()
+
+    assert lines == ["Consumer lag: 500 messages queued | consumed: 100.0 msg/s | drained in 5.0 s"]
@@ -0,0 +1,117 @@
+from click.testing import CliRunner
+from pvsimulator import codec
+from pvsimulator.simulations import configuration, meter
+from pvsimulator.timemath import get_normalized_daytime
+from pvsimulator.transports import InMemoryTransport
+import itertools
+import numpy
+
+def test_vectorized_meter_values_match_scalar_values():
+    timestamps = numpy.arange(1247097600, 1247097600 + 86400, 60)
+    normalized_daytimes = get_normalized_daytime(timestamps)
+
+    vectorized_values = meter.get_normalized_meter_values(normalized_daytimes)
+    scalar_values = [
+        meter.get_normalized_meter_value(t) for t in normalized_daytimes.tolist()
+    ]
+
+    assert numpy.allclose(vectorized_values, scalar_values)
+
+def test_generated_meter_noise_is_bounded():
+    timestamps, meter_power_values = meter.generate_meter_range(
+        1247097600, 1247097600 + 86400, 1
+    )
+    base_values = meter.get_normalized_meter_values(
+        get_normalized_daytime(timestamps)
+    ) * 8500
+
+    assert len(timestamps) == 86400
+    assert numpy.all(numpy.abs(meter_power_values - base_values) <= 50 + 1e-6)
+
+def test_fleet_message_contains_one_sample_per_household():
+    fleet = meter.Fleet(
+        1000, scale_variation = 0.2, phase_variation = 0, seed = 1
+    )
+    timestamps, meter_power_values = codec.decode_binary_samples(
+        fleet.construct_message_at_time(1247140800)
+    )
+    base_value = meter.get_normalized_meter_value(0.5) * 8500
+
+    assert len(timestamps) == 1000
+    assert numpy.all(timestamps == 1247140800)
+    assert numpy.all(meter_power_values >= base_value * 0.8 - 50 - 1e-6)
+    assert numpy.all(meter_power_values <= base_value * 1.2 + 50 + 1e-6)
+    assert numpy.std(meter_power_values) > 100
+
+def test_load_mode_publishes_fleet_ticks_in_confirmed_batches(monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'load_fleet_queue')
+    published_batches = []
+    publish_batch = meter.QueueClient.publish_batch
+    def record_batch(self, message_bodies, confirm = False, content_type = codec.JSON_CONTENT_TYPE):
+        published_batches.append((len(message_bodies), confirm))
+        publish_batch(self, message_bodies, confirm, content_type)
+    monkeypatch.setattr(meter.QueueClient, 'publish_batch', record_batch)
+
+    # 144 ticks, one every 600 simulated seconds, all overdue at once
+    meter.simulate_load(
+        1e6, 6e8, quiet = True, report_interval = 60, max_batch_size = 50,
+        confirm = True, fleet = meter.Fleet(10, seed = 1)
+    )
+
+    consumer = InMemoryTransport()
+    consumer.connect()
+    timestamps = []
+    while True:
+        delivery = consumer.get('load_fleet_queue')
+        consumer.ack(delivery.delivery_tag)
+        if delivery.body == "STOP_SIMULATION":
+            break
+        assert delivery.content_type == codec.BINARY_CONTENT_TYPE
+        tick_timestamps, _ = codec.decode_binary_samples(delivery.body)
+        assert len(tick_timestamps) == 10
+        timestamps.append(int(tick_timestamps[0]))
+
+    assert timestamps == list(range(1247097600, 1247097600 + 86400, 600))
+    assert all(confirm and 0 < size <= 50 for size, confirm in published_batches)
+    assert sum(size for size, _ in published_batches) == 144
+
+def test_endless_mode_stamps_samples_on_the_schedule(monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'endless_queue')
+    class FourTicks(meter.RateController):
+        def wait(self):
+            if self.released_count == 4:
+                raise KeyboardInterrupt()
+            self.released_count += 1
+            return 1
+    monkeypatch.setattr(meter, 'RateController', FourTicks)
+    # The clock jumps, as if the publishing fell behind after the first tick
+    clock = itertools.chain([1247097600.7, 1247097645.2, 1247097699.9], itertools.repeat(1247097712.1))
+    monkeypatch.setattr(meter.time, 'time', lambda: next(clock))
+
+    meter.simulate_normal_operation(10, quiet = True, encoding = 'binary')
+
+    consumer = InMemoryTransport()
+    consumer.connect()
+    timestamps = []
+    while True:
+        delivery = consumer.get('endless_queue')
+        consumer.ack(delivery.delivery_tag)
+        if delivery.body == "STOP_SIMULATION":
+            break
+        tick_timestamps, _ = codec.decode_binary_samples(delivery.body)
+        timestamps.extend(tick_timestamps.tolist())
+
+    assert timestamps == [1247097600, 1247097610, 1247097620, 1247097630]
+
+def test_options_a_mode_cannot_honor_are_rejected():
+    runner = CliRunner()
+
+    result = runner.invoke(meter.main, ['--mode', 'endless', '--batch-size', '10'])
+    assert result.exit_code == 2
+    assert "--batch-size is not supported by the endless mode" in result.output
+
+    result = runner.invoke(meter.main, ['--mode', 'load', '--samples-per-message', '4'])
+    assert result.exit_code == 2
+    assert "--samples-per-message is only supported by the oneday mode" in result.output
@@ -0,0 +1,39 @@
+from pvsimulator import metrics
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.transports import InMemoryBroker, InMemoryTransport
+
+def test_disabled_metrics_record_nothing():
+    registry = metrics.DisabledMetricsRegistry()
+    client = QueueClient(
+        queue_name = "test_queue",
+        transport = InMemoryTransport(InMemoryBroker()),
+        metrics_registry = registry
+    )
+    client.connect()
+    client.publish_message("A")
+
+    assert registry.start_timer() is None
+
+def test_queue_client_reports_prometheus_metrics(tmp_path):
+    registry = metrics.MetricsRegistry()
+    broker = InMemoryBroker()
+    client = QueueClient(
+        queue_name = "test_queue",
+        transport = InMemoryTransport(broker),
+        metrics_registry = registry
+    )
+    client.connect()
+    client.publish_batch(["A", "B", "C"])
+    client.publish_message("D")
+    registry.observe_many('lag_seconds', [0.02, 0.2, 20.0])
+
+    textfile_path = str(tmp_path / "metrics.prom")
+    registry.write_textfile(textfile_path)
+    with open(textfile_path) as f:
+        lines = f.read().splitlines()
+
+    assert "pvsimulator_messages_published_total 4" in lines
+    assert "pvsimulator_publish_seconds_count 2" in lines
+    assert 'pvsimulator_lag_seconds_bucket{le="0.25"} 2' in lines
+    assert 'pvsimulator_lag_seconds_bucket{le="+Inf"} 3' in lines
+    assert "messages_published=4" in metrics.format_stats_line(*registry.snapshot())
@@ -0,0 +1,72 @@
+from pvsimulator.simulations import meter, noise, pipeline
+import numpy
+
+def test_noise_only_depends_on_its_key():
+    timestamps = numpy.arange(1247097600, 1247097600 + 1000)
+    values = noise.integers(42, noise.METER_STREAM, 0, timestamps, -50, 50)
+    shuffled = numpy.random.default_rng().permutation(1000)
+
+    assert numpy.array_equal(
+        noise.integers(42, noise.METER_STREAM, 0, timestamps[shuffled], -50, 50),
+        values[shuffled]
+    )
+    assert int(noise.integers(42, noise.METER_STREAM, 0, timestamps[7], -50, 50)) == values[7]
+    assert values.min() == -50 and values.max() == 50
+    assert not numpy.array_equal(
+        noise.integers(43, noise.METER_STREAM, 0, timestamps, -50, 50), values
+    )
+    assert not numpy.array_equal(
+        noise.integers(42, noise.METER_STREAM, 1, timestamps, -50, 50), values
+    )
+
+def test_samples_within_one_second_get_their_own_noise():
+    timestamps = 1247097600 + numpy.arange(0, 100, 0.125)
+    bits = noise.random_bits(42, noise.METER_STREAM, 0, timestamps)
+
+    assert len(numpy.unique(bits)) == len(timestamps)
+    # Whole seconds keep the bits of the integer timestamps
+    assert numpy.array_equal(
+        bits[::8], noise.random_bits(42, noise.METER_STREAM, 0, numpy.arange(1247097600, 1247097700))
+    )
+
+def test_pipeline_output_is_independent_of_chunks(tmp_path):
+    outputs = []
+    for chunk_size in (86400, 777):
+        output_filepath = str(tmp_path / ("output-" + str(chunk_size) + ".csv"))
+        pipeline.run_pipeline(
+            1247097600, 1247097600 + 86400, 10, output_filepath, chunk_size = chunk_size, seed = 7
+        )
+        with open(output_filepath) as f:
+            outputs.append(f.read())
+
+    assert outputs[0] == outputs[1]
+
+def test_fleet_household_keeps_its_values_in_any_fleet_size():
+    small_fleet = meter.Fleet(10, seed = 3)
+    large_fleet = meter.Fleet(1000, seed = 3)
+
+    assert numpy.array_equal(
+        small_fleet.values_at(1247140800), large_fleet.values_at(1247140800)[:10]
+    )
+
+def test_single_keys_draw_the_same_bits_as_arrays():
+    rng = numpy.random.default_rng(5)
+    timestamps = numpy.concatenate([
+        rng.integers(-2 ** 40, 2 ** 40, 200), numpy.array([0, -1, 1247097600])
+    ]).astype(numpy.float64) + rng.choice([0.0, 0.25, 0.999], 203)
+    households = rng.integers(-5, 2 ** 31, 203)
+
+    for seed in (0, 42, 2 ** 64 - 1, noise.get_seed(None)):
+        for stream in (noise.METER_STREAM, noise.PV_STREAM):
+            bits = noise.random_bits(seed, stream, households, timestamps)
+            integers = noise.integers(seed, stream, households, timestamps, -50, 50)
+            uniform = noise.uniform(seed, stream, households, timestamps, 0.5, 2.0)
+            for index in range(len(timestamps)):
+                # Python and NumPy scalars take the integer path
+                for household, timestamp in (
+                    (int(households[index]), float(timestamps[index])),
+                    (households[index], timestamps[index])
+                ):
+                    assert noise.random_bits(seed, stream, household, timestamp) == int(bits[index])
+                    assert noise.integers(seed, stream, household, timestamp, -50, 50) == int(integers[index])
+                    assert noise.uniform(seed, stream, household, timestamp, 0.5, 2.0) == float(uniform[index])
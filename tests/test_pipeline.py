@@ -0,0 +1,16 @@
+from pvsimulator.simulations import pipeline
+
+def test_pipeline_writes_all_rows_in_chunks(tmp_path):
+    output_filepath = str(tmp_path / "output.csv")
+    row_count = pipeline.run_pipeline(
+        1247097600, 1247097600 + 86400, 10, output_filepath, chunk_size = 1000
+    )
+
+    with open(output_filepath) as f:
+        rows = [line.split(",") for line in f.read().splitlines()]
+
+    assert row_count == len(rows) == 8640
+    assert rows[0][0] == "1247097600"
+    assert rows[-1][0] == str(1247097600 + 86400 - 10)
+    for timestamp, meter_power, pv_power, combined_power in rows[:100]:
+        assert abs(float(meter_power) + float(pv_power) - float(combined_power)) < 1e-6
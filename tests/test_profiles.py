@@ -0,0 +1,30 @@
+from pvsimulator.simulations import meter, profiles
+import numpy
+import os
+
+def test_profile_table_matches_curve_function():
+    table = profiles.ProfileTable.from_function(meter.get_normalized_meter_values)
+    timestamps = numpy.arange(1247097600, 1247097600 + 86400, 37)
+
+    expected_values = meter.get_normalized_meter_values((timestamps % 86400) / 86400)
+
+    assert numpy.array_equal(table.lookup(timestamps), expected_values)
+    assert table.value_at(1247097637) == expected_values[1]
+
+def test_profile_table_interpolates_sub_second_timestamps():
+    table = profiles.ProfileTable.from_function(meter.get_normalized_meter_values)
+
+    lower, upper = table.value_at(100), table.value_at(101)
+
+    assert table.value_at(100.5) == lower + (upper - lower) * 0.5
+    assert table.lookup(numpy.array([100.5]))[0] == table.value_at(100.5)
+    assert table.lookup(numpy.array([100.5]), interpolate = False)[0] == lower
+
+def test_profile_table_is_cached_on_disk(tmp_path):
+    cache_directory = str(tmp_path)
+    built_table = profiles.load_or_build('meter', meter.get_normalized_meter_values, cache_directory)
+    cache_files = os.listdir(cache_directory)
+    loaded_table = profiles.load_or_build('meter', meter.get_normalized_meter_values, cache_directory)
+
+    assert len(cache_files) == 1
+    assert numpy.array_equal(built_table.values, loaded_table.values)
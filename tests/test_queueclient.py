@@ -61,3 +61,46 @@ def test_consumption():
     test_consumer.stop_consuming()
     
     assert test_consumer.message_received
+
+def test_push_consumption():
+    configuration.read_config_file("tests/test.conf")
+    qc = QueueClient(
+        host = configuration.CONFIGURATION['host'],
+        username = configuration.CONFIGURATION['username'],
+        password = configuration.CONFIGURATION['password'],
+        queue_name = configuration.CONFIGURATION['queue_name']
+    )
+    qc.connect()
+
+    test_consumer = ConsumerTest(
+        host = configuration.CONFIGURATION['host'],
+        username = configuration.CONFIGURATION['username'],
+        password = configuration.CONFIGURATION['password'],
+        queue_name = configuration.CONFIGURATION['queue_name'],
+        consuming_mode = 'push',
+        prefetch_count = 10
+    )
+    test_consumer.connect()
+
+    # Purge the queue to have a clean state
+    qc.purge_queue()
+    qc.publish_message("TEST")
+
+    test_consumer.start_consuming_async()
+    time.sleep(1)
+    test_consumer.stop_consuming()
+    
+    assert test_consumer.message_received
+
+def test_batch_publishing():
+    configuration.read_config_file("tests/test.conf")
+    qc = QueueClient(
+        host = configuration.CONFIGURATION['host'],
+        username = configuration.CONFIGURATION['username'],
+        password = configuration.CONFIGURATION['password'],
+        queue_name = configuration.CONFIGURATION['queue_name']
+    )
+    qc.connect()
+    # This raises an error if something goes wrong
+    qc.publish_batch(["TEST"] * 10, confirm = True)
+    qc.purge_queue()
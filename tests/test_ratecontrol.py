@@ -0,0 +1,35 @@
+from pvsimulator.ratecontrol import RateController
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_rate_controller_does_not_drift():
+    clock = FakeClock()
+    rate_controller = RateController(2500.0, clock = clock, sleep = clock.sleep)
+
+    for _ in range(10000):
+        rate_controller.wait()
+        # The work between two messages does not delay the following deadlines
+        clock.now += 0.0001
+
+    assert rate_controller.released_count == 10000
+    assert abs(clock.now - 10000 / 2500.0) < 0.001
+
+def test_rate_controller_releases_overdue_messages_at_once():
+    clock = FakeClock()
+    rate_controller = RateController(100.0, max_burst = 50, clock = clock, sleep = clock.sleep)
+
+    assert rate_controller.wait() == 1
+    clock.now += 1.0
+    assert rate_controller.wait() == 50
+    assert rate_controller.wait() == 50
+    assert rate_controller.backlog() == 0
+    assert rate_controller.wait() == 1
+    assert abs(clock.now - 1.01) < 1e-9
@@ -0,0 +1,119 @@
+from click.testing import CliRunner
+from pvsimulator.simulations import configuration, pipeline, replay
+from pvsimulator.simulations.photovoltaic import PV_Simulator
+from pvsimulator.transports import DEFAULT_BROKER, InMemoryTransport
+import json
+
+def test_chunks_end_at_line_breaks(tmp_path):
+    filepath = str(tmp_path / "input.csv")
+    pipeline.run_pipeline(1247097600, 1247097600 + 86400, 60, filepath, seed = 1)
+    with open(filepath, 'rb') as f:
+        content = f.read()
+
+    chunks = list(replay.iterate_chunks(filepath, chunk_bytes = 1000))
+
+    assert len(chunks) > 1
+    assert b''.join(chunks) == content
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+
+def test_replay_through_photovoltaic(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'replay_queue')
+    input_directory = tmp_path / "history"
+    input_directory.mkdir()
+    pipeline.run_pipeline(
+        1247097600, 1247097600 + 86400, 60, str(input_directory / "2009-07-09.csv"), seed = 1
+    )
+    pipeline.run_pipeline(
+        1247184000, 1247184000 + 86400, 60, str(input_directory / "2009-07-10.csv"), seed = 1
+    )
+
+    for encoding in ('json', 'binary'):
+        published_count = replay.replay(
+            [str(input_directory)], batch_size = 100, encoding = encoding,
+            samples_per_message = 10, quiet = True, chunk_bytes = 4096
+        )
+        output_filepath = str(tmp_path / ("output-" + encoding + ".csv"))
+        pv = PV_Simulator(
+            queue_name = 'replay_queue',
+            output_filepath = output_filepath,
+            consuming_batch_size = 100,
+            quiet = True,
+            transport = 'memory'
+        )
+        pv.connect()
+        pv.start_consuming_blocking()
+        pv.close_output()
+
+        with open(output_filepath) as f:
+            rows = [line.split(",") for line in f.read().splitlines()]
+        assert published_count == len(rows) == 2 * 86400 // 60
+        assert rows[0][0] == "1247097600"
+        assert rows[-1][0] == str(1247184000 + 86400 - 60)
+        assert DEFAULT_BROKER.depth('replay_queue') == 0
+
+def test_only_the_first_line_of_a_file_can_be_a_header(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'replay_header_queue')
+    lines = [b"timestamp,meter_power_value_watt,pv_power_value_watt,combined_power_value_watt"]
+    lines += [b"%d,%d.5,0.0,0.0" % (timestamp, timestamp) for timestamp in range(-300, 300, 10)]
+    filepath = str(tmp_path / "input.csv")
+    with open(filepath, 'wb') as f:
+        f.write(b"\n".join(lines) + b"\n")
+
+    assert replay.split_columns(b"-20,1.5\n-10,2.5\n", first_chunk = True) == (
+        [b"-20", b"-10"], [b"1.5", b"2.5"]
+    )
+    assert replay.split_columns(b"time,value\n-10,2.5\n", first_chunk = True) == ([b"-10"], [b"2.5"])
+
+    published_count = replay.replay([filepath], batch_size = 7, quiet = True, chunk_bytes = 64)
+
+    consumer = InMemoryTransport()
+    consumer.connect()
+    bodies = []
+    while True:
+        delivery = consumer.get('replay_header_queue')
+        consumer.ack(delivery.delivery_tag)
+        if delivery.body == "STOP_SIMULATION":
+            break
+        bodies.append(delivery.body)
+    # Negative timestamps in any chunk are replayed as they were written
+    assert published_count == len(bodies) == 60
+    assert bodies[0] == b'{"timestamp": -300, "meter_power_value_watt": -300.5}'
+    assert bodies[-1] == b'{"timestamp": 290, "meter_power_value_watt": 290.5}'
+
+def test_invalid_lines_are_skipped_and_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'replay_invalid_queue')
+    lines = [b"%d,%d.5" % (timestamp, timestamp) for timestamp in range(0, 100, 10)]
+    lines[3] = b"30,1.5 watt"
+    lines[7] = b"}, \"x\": {,2.5"
+    lines[8] = b"80,nan"
+    filepath = str(tmp_path / "input.csv")
+    with open(filepath, 'wb') as f:
+        f.write(b"\n".join(lines) + b"\n")
+
+    published_count = replay.replay([filepath], quiet = True, chunk_bytes = 32)
+
+    consumer = InMemoryTransport()
+    consumer.connect()
+    bodies = []
+    while True:
+        delivery = consumer.get('replay_invalid_queue')
+        consumer.ack(delivery.delivery_tag)
+        if delivery.body == "STOP_SIMULATION":
+            break
+        bodies.append(delivery.body)
+    assert published_count == len(bodies) == 7
+    assert [json.loads(body)["timestamp"] for body in bodies] == [0, 10, 20, 40, 50, 60, 90]
+    assert capsys.readouterr().out.splitlines() == [
+        "Skipped line " + str(number) + " of " + filepath + ", since its values are not finite numbers"
+        for number in (4, 8, 9)
+    ]
+
+def test_failed_replay_exits_with_an_error(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'unknown')
+
+    result = CliRunner().invoke(replay.main, ['--input', str(tmp_path)])
+
+    assert result.exit_code == 1
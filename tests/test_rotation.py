@@ -0,0 +1,121 @@
+from pvsimulator import filewriter, rotation
+import gzip
+import json
+import lzma
+import numpy
+import os
+import pytest
+
+def test_daily_segments_are_compressed_and_listed_in_the_manifest(tmp_path):
+    output_filepath = str(tmp_path / "output.csv")
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 3 * 86400, 60)
+    values = numpy.arange(len(timestamps), dtype = numpy.float64)
+
+    with rotation.RotatingWriter(output_filepath, rotate_seconds = 86400, compression = 'gzip') as writer:
+        # Batches cross the day boundaries
+        for batch in numpy.array_split(numpy.arange(len(timestamps)), 7):
+            writer.write_columns(timestamps[batch], values[batch], values[batch], values[batch])
+        # A late sample goes to the current segment
+        writer.write_row([t0 + 30, 1.0, 2.0, 3.0])
+
+    assert sorted(os.listdir(str(tmp_path))) == [
+        "output-20090709.csv.gz", "output-20090710.csv.gz", "output-20090711.csv.gz", "output-manifest.json"
+    ]
+    segments = rotation.read_manifest(output_filepath)
+    assert [segment['row_count'] for segment in segments] == [1440, 1440, 1441]
+    assert segments[1]['first_timestamp'] == t0 + 86400
+    assert segments[1]['last_timestamp'] == t0 + 2 * 86400 - 60
+    assert segments[2]['first_timestamp'] == t0 + 30
+    assert all(segment['closed'] and segment['compression'] == 'gzip' for segment in segments)
+
+    with gzip.open(str(tmp_path / "output-20090710.csv.gz"), 'rt') as f:
+        rows = numpy.loadtxt(f, delimiter = ',', ndmin = 2)
+    assert numpy.array_equal(rows[:, 0], timestamps[1440:2880])
+    assert rotation.find_segments(output_filepath, t0 + 86400, t0 + 86401) == [
+        str(tmp_path / "output-20090710.csv.gz"), str(tmp_path / "output-20090711.csv.gz")
+    ]
+
+def test_segments_left_open_are_recovered_on_restart(tmp_path):
+    output_filepath = str(tmp_path / "output.bin")
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 1000)
+    values = numpy.ones(len(timestamps))
+
+    # The first run stops without closing its segment
+    writer = rotation.RotatingWriter(output_filepath, 'binary', rotate_bytes = 16 * 1024, compression = 'lzma')
+    writer.write_columns(timestamps[:600], values[:600], values[:600], values[:600])
+    writer.write_columns(timestamps[600:800], values[:200], values[:200], values[:200])
+    writer.flush()
+    writer._compressor.shutdown(wait = True)
+
+    with rotation.RotatingWriter(output_filepath, 'binary', rotate_bytes = 16 * 1024, compression = 'lzma') as writer:
+        writer.write_columns(timestamps[800:], values[800:], values[800:], values[800:])
+
+    segments = rotation.read_manifest(output_filepath)
+    assert [segment['row_count'] for segment in segments] == [600, 200, 200]
+    assert segments[1]['last_timestamp'] == t0 + 799
+    # The restart continues with a new segment instead of reusing the label of the recovered one
+    assert [segment['filepath'] for segment in segments] == [
+        "output-20090709T000000.bin.xz", "output-20090709T001000.bin.xz", "output-20090709T001320.bin.xz"
+    ]
+    records = []
+    for segment_filepath in rotation.find_segments(output_filepath, t0, t0 + 1000):
+        with lzma.open(segment_filepath) as f:
+            records.append(numpy.frombuffer(f.read()[filewriter.FILE_HEADER.size:], dtype = filewriter.RECORD_DTYPE))
+    assert numpy.array_equal(numpy.concatenate(records)['timestamp'], timestamps)
+
+def test_failed_compressions_are_raised_on_close(tmp_path, monkeypatch):
+    output_filepath = str(tmp_path / "output.csv")
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 2 * 86400, 3600)
+    def compress_file(filepath, compression, remove_original = True):
+        raise RuntimeError("Cannot compress " + os.path.basename(filepath))
+    monkeypatch.setattr(rotation, 'compress_file', compress_file)
+
+    writer = rotation.RotatingWriter(output_filepath, rotate_seconds = 86400, compression = 'gzip')
+    writer.write_columns(timestamps, timestamps, timestamps, timestamps)
+    with pytest.raises(RuntimeError, match = "Cannot compress output-20090709.csv"):
+        writer.close()
+
+    # The segments stay uncompressed
+    segments = rotation.read_manifest(output_filepath)
+    assert [(segment['filepath'], segment['compression']) for segment in segments] == [
+        ("output-20090709.csv", None), ("output-20090710.csv", None)
+    ]
+    assert sorted(os.listdir(str(tmp_path))) == ["output-20090709.csv", "output-20090710.csv", "output-manifest.json"]
+
+def test_interrupted_compressions_are_resolved_on_restart(tmp_path):
+    output_filepath = str(tmp_path / "output.csv")
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 2 * 86400, 3600)
+    with rotation.RotatingWriter(output_filepath, rotate_seconds = 86400, compression = 'gzip') as writer:
+        writer.write_columns(timestamps, timestamps, timestamps, timestamps)
+    with gzip.open(str(tmp_path / "output-20090709.csv.gz"), 'rb') as f:
+        first_segment = f.read()
+
+    # The run stopped after the manifest listed the first compressed segment, but before its original was removed
+    with open(str(tmp_path / "output-20090709.csv"), 'wb') as f:
+        f.write(first_segment)
+    # And in the middle of compressing the second segment, which is uncompressed again
+    segments = rotation.read_manifest(output_filepath)
+    with gzip.open(str(tmp_path / "output-20090710.csv.gz"), 'rb') as f, \
+            open(str(tmp_path / "output-20090710.csv"), 'wb') as target:
+        target.write(f.read())
+    os.rename(str(tmp_path / "output-20090710.csv.gz"), str(tmp_path / "output-20090710.csv.gz.tmp"))
+    segments[1]['filepath'] = "output-20090710.csv"
+    segments[1]['compression'] = None
+    with open(rotation.manifest_filepath(output_filepath), 'w') as f:
+        json.dump({'output_format': 'csv', 'segments': segments}, f)
+
+    rotation.RotatingWriter(output_filepath, rotate_seconds = 86400, compression = 'gzip').close()
+
+    assert sorted(os.listdir(str(tmp_path))) == [
+        "output-20090709.csv.gz", "output-20090710.csv.gz", "output-manifest.json"
+    ]
+    segments = rotation.read_manifest(output_filepath)
+    assert [(segment['filepath'], segment['compression']) for segment in segments] == [
+        ("output-20090709.csv.gz", 'gzip'), ("output-20090710.csv.gz", 'gzip')
+    ]
+    with gzip.open(str(tmp_path / "output-20090709.csv.gz"), 'rb') as f:
+        assert f.read() == first_segment
@@ -0,0 +1,32 @@
+from pvsimulator.simulations import configuration, profiles, solar
+from pvsimulator.simulations.photovoltaic import generate_pv_values
+import numpy
+
+SITE = solar.Site(latitude = 48.14, longitude = 11.58, tilt = 30, azimuth = 180)
+SUMMER_SOLSTICE = 1245542400
+WINTER_SOLSTICE = 1261353600
+
+def test_solar_model_follows_the_seasons():
+    summer = solar.get_normalized_pv_values(numpy.arange(SUMMER_SOLSTICE, SUMMER_SOLSTICE + 86400), SITE)
+    winter = solar.get_normalized_pv_values(numpy.arange(WINTER_SOLSTICE, WINTER_SOLSTICE + 86400), SITE)
+    cos_zenith, _ = solar.get_solar_position(SUMMER_SOLSTICE + 11 * 3600 + 15 * 60, SITE.latitude, SITE.longitude)
+
+    # At solar noon of the summer solstice, the sun is 90 - 48.14 + 23.44 degrees high
+    assert abs(numpy.degrees(numpy.arccos(cos_zenith)) - (48.14 - 23.44)) < 0.5
+    assert summer[0] == 0 and winter[0] == 0
+    assert 0.9 < summer.max() < 1.1
+    assert summer.sum() > 2.5 * winter.sum()
+
+def test_daily_profile_matches_the_model_across_days(monkeypatch):
+    for name, value in zip(solar.Site._fields, SITE):
+        monkeypatch.setitem(configuration.CONFIGURATION, name, str(value))
+    monkeypatch.setitem(configuration.CONFIGURATION, 'pv_model', 'solar')
+    timestamps = numpy.arange(SUMMER_SOLSTICE - 3600, SUMMER_SOLSTICE + 2 * 86400, 7.5)
+
+    profile = profiles.get_pv_profile()
+    values = profile.lookup(timestamps)
+
+    assert isinstance(profile, profiles.DailyProfile)
+    assert numpy.allclose(values, solar.get_normalized_pv_values(timestamps, SITE), atol = 1e-4)
+    assert profile.value_at(float(timestamps[5000])) == values[5000]
+    assert numpy.all(generate_pv_values(timestamps, seed = 1) >= 0)
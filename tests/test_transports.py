@@ -0,0 +1,482 @@
+from pvsimulator import filewriter
+from pvsimulator.exceptions import PVQueueConnectionError
+from pvsimulator.queueclient import QueueClient
+from pvsimulator.simulations import configuration, meter, photovoltaic
+from pvsimulator.simulations.photovoltaic import PV_Simulator
+from pvsimulator.transports import InMemoryBroker, InMemoryTransport, shm
+import multiprocessing
+import numpy
+import os
+import pytest
+import threading
+import time
+import uuid
+
+def test_memory_transport_requeues_unacknowledged_messages():
+    broker = InMemoryBroker()
+    transport = InMemoryTransport(broker)
+    transport.declare_queue("test_queue")
+    transport.publish_batch("test_queue", ["A", "B", "C"], "text/plain")
+
+    first = transport.get("test_queue")
+    second = transport.get("test_queue")
+    transport.ack(first.delivery_tag)
+    transport.nack(second.delivery_tag, requeue = True)
+
+    assert broker.depth("test_queue") == 2
+    assert transport.get("test_queue").body == "B"
+
+class ConsumerTest(QueueClient):
+    received_messages = None
+
+    def _on_message_received_callback(self, message_body):
+        self.received_messages.append(message_body)
+
+def test_push_consumption_on_memory_transport():
+    broker = InMemoryBroker()
+    publisher = QueueClient(
+        queue_name = "test_queue",
+        transport = InMemoryTransport(broker)
+    )
+    publisher.connect()
+
+    test_consumer = ConsumerTest(
+        queue_name = "test_queue",
+        consuming_mode = 'push',
+        consuming_batch_size = 10,
+        transport = InMemoryTransport(broker)
+    )
+    test_consumer.received_messages = []
+    test_consumer.connect()
+
+    publisher.publish_batch([str(i) for i in range(25)])
+    test_consumer.start_consuming_async()
+    time.sleep(0.5)
+    test_consumer.stop_consuming()
+
+    assert test_consumer.received_messages == [str(i) for i in range(25)]
+    assert broker.depth("test_queue") == 0
+
+def test_push_consumption_of_single_messages_on_memory_transport():
+    broker = InMemoryBroker()
+    publisher = QueueClient(queue_name = "test_queue", transport = InMemoryTransport(broker))
+    publisher.connect()
+
+    test_consumer = ConsumerTest(
+        queue_name = "test_queue",
+        consuming_mode = 'push',
+        prefetch_count = 10,
+        transport = InMemoryTransport(broker)
+    )
+    test_consumer.received_messages = []
+    test_consumer.connect()
+
+    publisher.purge_queue()
+    publisher.publish_message("TEST")
+    test_consumer.start_consuming_async()
+    deadline = time.monotonic() + 5
+    while not test_consumer.received_messages and time.monotonic() < deadline:
+        time.sleep(0.01)
+    test_consumer.stop_consuming()
+
+    assert test_consumer.received_messages == ["TEST"]
+    assert broker.depth("test_queue") == 0
+
+@pytest.mark.parametrize('confirm', [False, True])
+def test_batch_publishing_on_memory_transport(confirm):
+    broker = InMemoryBroker()
+    publisher = QueueClient(queue_name = "test_queue", transport = InMemoryTransport(broker))
+    publisher.connect()
+
+    publisher.publish_batch(["TEST"] * 10, confirm = confirm)
+
+    assert publisher.queue_depth() == 10
+    consumer = InMemoryTransport(broker)
+    deliveries = consumer.take_deliveries("test_queue", 20)
+    assert [(delivery.body, delivery.content_type) for delivery in deliveries] == [("TEST", "text/plain")] * 10
+    consumer.nack(deliveries[-1].delivery_tag, multiple = True, requeue = True)
+    publisher.purge_queue()
+    assert broker.depth("test_queue") == 0
+
+def test_poll_consumption_hands_back_the_pending_batch_on_errors():
+    broker = InMemoryBroker()
+    class DisconnectingTransport(InMemoryTransport):
+        def get(self, queue_name):
+            # The connection is lost in the middle of a batch
+            if broker.depth(queue_name) == 20:
+                raise PVQueueConnectionError("Lost the connection!")
+            return super().get(queue_name)
+    class StoppingConsumerTest(ConsumerTest):
+        stop_count = 0
+
+        def _on_consuming_stopped(self):
+            self.stop_count += 1
+
+    test_consumer = StoppingConsumerTest(
+        queue_name = "test_queue",
+        consuming_batch_size = 10,
+        transport = DisconnectingTransport(broker)
+    )
+    test_consumer.received_messages = []
+    test_consumer.connect()
+    test_consumer.publish_batch([str(i) for i in range(25)])
+
+    with pytest.raises(PVQueueConnectionError):
+        test_consumer.start_consuming_blocking()
+
+    assert test_consumer.stop_count == 1
+    assert test_consumer.received_messages == []
+    assert broker.depth("test_queue") == 25
+
+def test_one_day_simulation_on_memory_transport(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'memory')
+    monkeypatch.setitem(configuration.CONFIGURATION, 'queue_name', 'test_queue')
+    meter.simulate_one_day(60, batch_size = 100, quiet = True)
+
+    output_filepath = str(tmp_path / "output.csv")
+    pv = PV_Simulator(
+        queue_name = 'test_queue',
+        output_filepath = output_filepath,
+        consuming_batch_size = 100,
+        quiet = True,
+        transport = 'memory'
+    )
+    pv.connect()
+    pv.start_consuming_blocking()
+    pv.close_output()
+
+    with open(output_filepath) as f:
+        assert len(f.read().splitlines()) == 86400 // 60
+
+class BatchRecordingSimulator(PV_Simulator):
+    batch_sizes = None
+
+    def _on_message_batch_received_callback(self, message_bodies, delivery_tags):
+        self.batch_sizes.append(len(message_bodies))
+        super()._on_message_batch_received_callback(message_bodies, delivery_tags)
+
+def create_batch_recording_simulator(broker, output_filepath, consuming_mode):
+    pv = BatchRecordingSimulator(
+        queue_name = "batch_queue",
+        output_filepath = output_filepath,
+        consuming_timeout = 0,
+        consuming_mode = consuming_mode,
+        consuming_batch_size = 10,
+        quiet = True,
+        transport = InMemoryTransport(broker),
+        seed = 1
+    )
+    pv.batch_sizes = []
+    pv.connect()
+    return pv
+
+def read_output_timestamps(output_filepath):
+    with open(output_filepath) as f:
+        return [int(line.split(",")[0]) for line in f.read().splitlines()]
+
+@pytest.mark.parametrize('consuming_mode', ['poll', 'push'])
+def test_batches_are_flushed_once_they_are_full(tmp_path, consuming_mode):
+    broker = InMemoryBroker()
+    output_filepath = str(tmp_path / "output.csv")
+    pv = create_batch_recording_simulator(broker, output_filepath, consuming_mode)
+    timestamps = numpy.arange(1247097600, 1247097600 + 25)
+    pv.publish_batch(meter.construct_messages(timestamps, numpy.ones(25)))
+    pv.publish_message("STOP_SIMULATION")
+
+    pv.start_consuming_blocking()
+    pv.close_output()
+
+    # Two full batches, the rest is flushed with the stop message
+    assert pv.batch_sizes == [10, 10, 6]
+    assert read_output_timestamps(output_filepath) == timestamps.tolist()
+    assert broker.depth("batch_queue") == 0
+
+@pytest.mark.parametrize('consuming_mode', ['poll', 'push'])
+def test_incomplete_batches_are_flushed_once_the_queue_is_idle(tmp_path, consuming_mode):
+    broker = InMemoryBroker()
+    output_filepath = str(tmp_path / "output.csv")
+    pv = create_batch_recording_simulator(broker, output_filepath, consuming_mode)
+    timestamps = numpy.arange(1247097600, 1247097600 + 7)
+
+    def wait_for_batches(batch_sizes):
+        deadline = time.monotonic() + 5
+        while pv.batch_sizes != batch_sizes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pv.batch_sizes == batch_sizes
+
+    pv.start_consuming_async()
+    try:
+        # Neither batch is full, they are processed, as soon as no more messages arrive
+        pv.publish_batch(meter.construct_messages(timestamps[:3], numpy.ones(3)))
+        wait_for_batches([3])
+        pv.publish_batch(meter.construct_messages(timestamps[3:], numpy.ones(4)))
+        wait_for_batches([3, 4])
+    finally:
+        pv.stop_consuming()
+    pv.close_output()
+
+    assert read_output_timestamps(output_filepath) == timestamps.tolist()
+    assert broker.depth("batch_queue") == 0
+
+@pytest.mark.parametrize('consuming_mode', ['poll', 'push'])
+def test_stop_in_the_middle_of_a_batch_processes_the_samples_in_front_of_it(tmp_path, consuming_mode):
+    broker = InMemoryBroker()
+    output_filepath = str(tmp_path / "output.csv")
+    pv = create_batch_recording_simulator(broker, output_filepath, consuming_mode)
+    timestamps = numpy.arange(1247097600, 1247097600 + 7)
+    pv.publish_batch(meter.construct_messages(timestamps[:4], numpy.ones(4)))
+    pv.publish_message("STOP_SIMULATION")
+    pv.publish_batch(meter.construct_messages(timestamps[4:], numpy.ones(3)))
+
+    pv.start_consuming_blocking()
+    pv.close_output()
+
+    # The stop message arrives within one batch with the samples around it
+    assert pv.batch_sizes == [8]
+    assert read_output_timestamps(output_filepath) == timestamps[:4].tolist()
+    # The samples behind the stop message are handed back to the queue
+    assert broker.depth("batch_queue") == 3
+
+def test_group_commit_acknowledges_after_flush(tmp_path):
+    broker = InMemoryBroker()
+    transport = InMemoryTransport(broker)
+    publisher = QueueClient(queue_name = "test_queue", transport = InMemoryTransport(broker))
+    publisher.connect()
+    publisher.publish_batch(
+        meter.construct_messages(*meter.generate_meter_range(1247097600, 1247097600 + 86400, 60))
+    )
+    publisher.publish_message("STOP_SIMULATION")
+
+    pv = PV_Simulator(
+        queue_name = "test_queue",
+        output_filepath = str(tmp_path / "output.csv"),
+        prefetch_count = 50,
+        consuming_batch_size = 10,
+        quiet = True,
+        flush_rows = None,
+        flush_interval = None,
+        transport = transport,
+        group_commit = True
+    )
+    pv.connect()
+    pv._on_message_batch_received_callback(
+        [pv._decode_message_body(transport.get("test_queue")) for _ in range(10)],
+        list(range(1, 11))
+    )
+    # Processed, but not yet on disk
+    assert transport.unacknowledged_count() == 10
+
+    pv._output_writer.flush()
+    assert transport.unacknowledged_count() == 0
+
+    # The prefetch window is committed, once it is full
+    pv.start_consuming_blocking()
+    pv.close_output()
+
+    assert broker.depth("test_queue") == 0
+    assert transport.unacknowledged_count() == 0
+    with open(str(tmp_path / "output.csv")) as f:
+        assert len(f.read().splitlines()) == 86400 // 60
+
+def publish_one_day(queue_name):
+    publisher = QueueClient(queue_name = queue_name, transport = 'shm')
+    publisher.connect()
+    timestamps, meter_power_values = meter.generate_meter_range(1247097600, 1247097600 + 86400, 60)
+    publisher.publish_batch(meter.construct_messages(timestamps, meter_power_values))
+    publisher.publish_message("STOP_SIMULATION")
+    publisher.close()
+
+def test_one_day_simulation_on_shared_memory_transport(tmp_path):
+    queue_name = 'test-' + uuid.uuid4().hex
+    pv = PV_Simulator(
+        queue_name = queue_name,
+        output_filepath = str(tmp_path / "output.csv"),
+        consuming_batch_size = 100,
+        quiet = True,
+        transport = shm.SharedMemoryTransport(slot_count = 64)
+    )
+    try:
+        pv.connect()
+        publisher_process = multiprocessing.Process(target = publish_one_day, args = (queue_name,))
+        publisher_process.start()
+        # The ring holds 64 messages, so the publisher has to wait for the consumer
+        pv.start_consuming_blocking()
+        pv.close_output()
+        publisher_process.join()
+        pv.close()
+    finally:
+        shm.remove_ring(queue_name)
+
+    assert publisher_process.exitcode == 0
+    with open(str(tmp_path / "output.csv")) as f:
+        assert len(f.read().splitlines()) == 86400 // 60
+
+def test_shared_memory_transport_requeues_and_purges():
+    queue_name = 'test-' + uuid.uuid4().hex
+    producer = shm.SharedMemoryTransport(slot_count = 8)
+    consumer = shm.SharedMemoryTransport(slot_count = 8)
+    try:
+        producer.declare_queue(queue_name)
+        consumer.declare_queue(queue_name)
+        producer.publish_batch(queue_name, ["A", "B", "C"], "text/plain")
+
+        first = consumer.get(queue_name)
+        second = consumer.get(queue_name)
+        consumer.ack(first.delivery_tag)
+        consumer.nack(second.delivery_tag, requeue = True)
+        assert consumer.get(queue_name).body == b"B"
+
+        # Delivered messages survive a purge, the others are discarded
+        producer.purge(queue_name)
+        producer.publish(queue_name, "D", "text/plain")
+        assert consumer.get(queue_name).body == b"D"
+        consumer.ack(3)
+        consumer.ack(4)
+        assert consumer.get(queue_name) is None
+        assert consumer.unacknowledged_count() == 0
+    finally:
+        producer.close()
+        consumer.close()
+        shm.remove_ring(queue_name)
+
+def test_shared_memory_transport_rejects_a_consumer_group(tmp_path, monkeypatch):
+    monkeypatch.setitem(configuration.CONFIGURATION, 'transport', 'shm')
+
+    with pytest.raises(ValueError, match = "only allows one consumer"):
+        photovoltaic.simulate_photovoltaic_consumer(str(tmp_path / "output.csv"), 0, workers = 2)
+    assert list(tmp_path.iterdir()) == []
+
+def test_stop_group_stops_all_consumers_of_a_queue(tmp_path):
+    broker = InMemoryBroker()
+    publisher = QueueClient(queue_name = "group_queue", transport = InMemoryTransport(broker))
+    publisher.connect()
+    timestamps = numpy.arange(1247097600, 1247097600 + 1000)
+    publisher.publish_batch(meter.construct_messages(timestamps, numpy.ones(len(timestamps))))
+    # The meter only publishes a single stop message for the whole group
+    publisher.publish_message("STOP_SIMULATION")
+
+    stop_group = photovoltaic.StopGroup(3)
+    segment_filepaths = [str(tmp_path / ("output.csv.segment-" + str(worker))) for worker in range(3)]
+    consumers = []
+    for segment_filepath in segment_filepaths:
+        consumer = PV_Simulator(
+            queue_name = "group_queue",
+            output_filepath = segment_filepath,
+            consuming_batch_size = 10,
+            quiet = True,
+            transport = InMemoryTransport(broker),
+            stop_group = stop_group,
+            seed = 1
+        )
+        consumer.connect()
+        consumers.append(consumer)
+    threads = [threading.Thread(target = consumer.start_consuming_blocking) for consumer in consumers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout = 10)
+    for consumer in consumers:
+        consumer.close_output()
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert broker.depth("group_queue") == 0
+    output_filepath = str(tmp_path / "output.csv")
+    filewriter.merge_files_by_timestamp(
+        [filepath for filepath in segment_filepaths if os.path.exists(filepath)], output_filepath
+    )
+    with open(output_filepath) as f:
+        assert [int(line.split(",")[0]) for line in f.read().splitlines()] == timestamps.tolist()
+
+def test_consumer_group_merges_the_segments_in_timestamp_order(tmp_path, monkeypatch):
+    t0 = 1247097600
+    timestamps = numpy.arange(t0, t0 + 600)
+    messages = meter.construct_messages(timestamps, numpy.ones(len(timestamps)))
+
+    run_pv_simulator = photovoltaic._run_pv_simulator
+    def run_worker(pv_arguments, stop_group = None, **metrics_settings):
+        # Each worker consumes every third batch, as if they shared one queue
+        worker = int(pv_arguments['output_filepath'].rsplit('-', 1)[1])
+        broker = InMemoryBroker()
+        publisher = QueueClient(queue_name = 'test_queue', transport = InMemoryTransport(broker))
+        publisher.connect()
+        for start in range(worker * 50, len(messages), 150):
+            publisher.publish_batch(messages[start:start + 50])
+        publisher.publish_message("STOP_SIMULATION")
+        # Another consumer holds the first batch and drops out, once the worker acknowledged its second batch
+        crashed_consumer = InMemoryTransport(broker)
+        crashed_consumer.take_deliveries('test_queue', 50)
+        class RedeliveringTransport(InMemoryTransport):
+            def ack(self, delivery_tag, multiple = False):
+                super().ack(delivery_tag, multiple)
+                crashed_consumer.close()
+        run_pv_simulator(dict(pv_arguments, transport = RedeliveringTransport(broker)), None, **metrics_settings)
+    # The forked workers run the patched function
+    monkeypatch.setattr(photovoltaic, '_run_pv_simulator', run_worker)
+
+    for output_format in ('csv', 'binary'):
+        output_filepath = str(tmp_path / ("output." + output_format))
+        photovoltaic.simulate_photovoltaic_consumer_group(output_filepath, 3, dict(
+            queue_name = 'test_queue',
+            consuming_timeout = 0,
+            consuming_batch_size = 50,
+            quiet = True,
+            seed = 1,
+            output_format = output_format
+        ))
+
+        if output_format == 'binary':
+            merged_timestamps = filewriter.read_binary_output(output_filepath)['timestamp'].tolist()
+        else:
+            with open(output_filepath) as f:
+                merged_timestamps = [int(line.split(",")[0]) for line in f.read().splitlines()]
+        assert merged_timestamps == timestamps.tolist()
+    # The segments are removed after the merge
+    assert sorted(os.listdir(str(tmp_path))) == ["output.binary", "output.csv"]
+
+def test_only_confirmed_batches_wait_for_a_commit():
+    from pvsimulator.transports.amqp import AMQPTransport
+
+    class FakeChannel(object):
+        def __init__(self, calls, name):
+            self.basic = self
+            self.tx = self
+            self._calls = calls
+            self._name = name
+
+        def publish(self, body, routing_key, properties = None):
+            self._calls.append((self._name, 'publish', body))
+
+        def select(self):
+            self._calls.append((self._name, 'select'))
+
+        def commit(self):
+            self._calls.append((self._name, 'commit'))
+
+    class FakeConnection(object):
+        def __init__(self):
+            self.calls = []
+            self.channel_count = 0
+
+        def channel(self):
+            self.channel_count += 1
+            return FakeChannel(self.calls, self.channel_count)
+
+    transport = AMQPTransport()
+    transport._connection = FakeConnection()
+    transport._channel = transport._open_channel()
+    transport.publish_batch('meter', ['A', 'B'], 'text/plain', confirm = True)
+    transport.publish_batch('meter', ['C'], 'text/plain')
+    transport.publish_batch('meter', ['D'], 'text/plain', confirm = True)
+
+    assert transport._connection.calls == [
+        (2, 'select'), (2, 'publish', 'A'), (2, 'publish', 'B'), (2, 'commit'),
+        (1, 'publish', 'C'),
+        (2, 'publish', 'D'), (2, 'commit')
+    ]
+
+def test_shared_memory_ring_refuses_cpus_without_x86_store_order(monkeypatch):
+    monkeypatch.setattr(shm.platform, 'machine', lambda: 'aarch64')
+    queue_name = 'test-' + uuid.uuid4().hex
+    with pytest.raises(PVQueueConnectionError):
+        shm.SharedRing(queue_name)
+    assert not os.path.exists(shm._doorbell_path(queue_name, 'messages'))